@@ -9,7 +9,8 @@ from accounts.models import (
 
 @admin.register(SubAccount)
 class AccountAdmin(admin.ModelAdmin):
-    pass
+    # Balances only move through transfers
+    readonly_fields = ("balance",)
 
 
 @admin.register(FundRequest)
@@ -19,4 +20,5 @@ class FundRequestAdmin(admin.ModelAdmin):
 
 @admin.register(FamilyAccount)
 class FamilyAccountAdmin(admin.ModelAdmin):
-    pass
+    # Balances only move through transfers
+    readonly_fields = ("balance",)
@@ -0,0 +1,215 @@
+"""
+This module defines the aggregates of family accounts: the total balance
+and the number of their sub accounts, and when their funds last moved.
+
+Aggregates are created with their family account, and updated in the
+database transaction of every change they follow: transfers and balance
+repairs (see `transactions.transfers`, `transactions.bulk` and
+`transactions.reconciliation`), and sub accounts being created, moved to
+another family account or deleted. Reading the totals of a family account
+then reads one row instead of every sub account.
+
+Family accounts created and sub accounts deleted in bulk (e.g. with their
+family group) are not followed. Run the `rebuild_family_account_aggregates`
+command to recompute the aggregates from the sub accounts and the ledger.
+
+Example usage:
+
+```python
+
+from accounts import aggregates
+
+aggregates.record(entries, at=timezone.now())
+aggregates.rebuild(chunk_size=500)
+```
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import TYPE_CHECKING, Iterable, NamedTuple
+
+from django.apps import apps
+from django.db import transaction as db_transaction
+from django.db.models import F, Max, Value
+from django.db.models.functions import Coalesce, Greatest
+
+import accounts.models as md
+
+if TYPE_CHECKING:
+    from transactions.transfers import Entry
+
+# A sub account's family account and balance
+SubAccountState = tuple[object, Decimal]
+
+
+class Change(NamedTuple):
+    balance: Decimal
+    count: int
+
+
+def create(family_account_id) -> None:
+    """Create the empty aggregate of a new family account."""
+    md.FamilyAccountAggregate.objects.bulk_create(
+        [md.FamilyAccountAggregate(family_account_id=family_account_id)],
+        ignore_conflicts=True,
+    )
+
+
+def add(changes: dict[object, Change], *, at: datetime | None = None):
+    """
+    Add changes to the aggregates of family accounts, keyed by primary key,
+    and record that their funds moved `at` if given. Rows are locked in key
+    order, so concurrent transactions can't deadlock on them.
+    """
+    keys = sorted(changes, key=str)
+    md.FamilyAccountAggregate.objects.bulk_create(
+        [md.FamilyAccountAggregate(family_account_id=pk) for pk in keys],
+        ignore_conflicts=True,
+    )
+    for pk in keys:
+        balance, count = changes[pk]
+        values = {}
+        if balance:
+            values["sub_account_balance"] = (
+                F("sub_account_balance") + balance
+            )
+        if count:
+            values["sub_account_count"] = F("sub_account_count") + count
+        if at is not None:
+            values["last_activity_at"] = Greatest(
+                Coalesce("last_activity_at", Value(at)), Value(at)
+            )
+        if values:
+            md.FamilyAccountAggregate.objects.filter(
+                family_account_id=pk
+            ).update(**values)
+
+
+def record(entries: Iterable[Entry], *, at: datetime | None) -> None:
+    """
+    Add the balance changes of transfer entries to the aggregates of the
+    family accounts they belong to. Must run in the database transaction
+    that changes the balances. `at` is when the funds moved, or `None` for
+    changes that don't move funds (e.g. repairs).
+    """
+    changes = defaultdict(lambda: Change(Decimal(0), 0))
+    sub_account_changes = defaultdict(Decimal)
+    for entry in entries:
+        if entry.model is md.SubAccount:
+            sub_account_changes[entry.pk] += entry.amount
+        elif entry.model is md.FamilyAccount:
+            # Funds moved from or to the family account itself
+            changes.setdefault(entry.pk, Change(Decimal(0), 0))
+
+    if sub_account_changes:
+        family_account_ids = md.SubAccount.objects.filter(
+            pk__in=sub_account_changes
+        ).values_list("pk", "family_account_id")
+        for pk, family_account_id in family_account_ids:
+            balance, count = changes[family_account_id]
+            changes[family_account_id] = Change(
+                balance + sub_account_changes[pk], count
+            )
+    add(changes, at=at)
+
+
+def move_sub_account(
+    previous: SubAccountState | None, current: SubAccountState | None
+) -> None:
+    """
+    Move a sub account between the aggregates of family accounts, given its
+    family account and balance before and after a change, where `None` is
+    before it is created or after it is deleted.
+    """
+    changes = defaultdict(lambda: Change(Decimal(0), 0))
+    for state, sign in ((previous, -1), (current, 1)):
+        if state is None:
+            continue
+        family_account_id, balance = state
+        total, count = changes[family_account_id]
+        changes[family_account_id] = Change(
+            total + sign * balance, count + sign
+        )
+    add({pk: change for pk, change in changes.items() if any(change)})
+
+
+def rebuild_family_accounts(pks: list) -> None:
+    """
+    Recompute the aggregates of family accounts from their sub accounts and
+    the ledger, atomically. The accounts are locked in the order transfers
+    lock them, so no funds move while they are read.
+    """
+    ledger_entry_model = apps.get_model("transactions", "LedgerEntry")
+    with db_transaction.atomic():
+        list(
+            md.FamilyAccount.objects.select_for_update()
+            .filter(pk__in=pks)
+            .order_by("pk")
+            .values_list("pk")
+        )
+        sub_accounts = list(
+            md.SubAccount.objects.select_for_update()
+            .filter(family_account__in=pks)
+            .order_by("pk")
+            .values_list("pk", "family_account_id", "balance")
+        )
+        last_activity = dict(
+            ledger_entry_model.objects.filter(
+                account_id__in=[*pks, *(pk for pk, _, _ in sub_accounts)]
+            )
+            .values_list("account_id")
+            .annotate(Max("created_at"))
+            .order_by()
+        )
+
+        aggregates = {
+            pk: md.FamilyAccountAggregate(
+                family_account_id=pk,
+                sub_account_balance=Decimal(0),
+                last_activity_at=last_activity.get(pk),
+            )
+            for pk in pks
+        }
+        for pk, family_account_id, balance in sub_accounts:
+            aggregate = aggregates[family_account_id]
+            aggregate.sub_account_balance += balance
+            aggregate.sub_account_count += 1
+            activity = last_activity.get(pk)
+            if activity is not None and (
+                aggregate.last_activity_at is None
+                or activity > aggregate.last_activity_at
+            ):
+                aggregate.last_activity_at = activity
+
+        md.FamilyAccountAggregate.objects.bulk_create(
+            aggregates.values(),
+            update_conflicts=True,
+            unique_fields=["family_account"],
+            update_fields=[
+                "sub_account_balance",
+                "sub_account_count",
+                "last_activity_at",
+            ],
+        )
+
+
+def rebuild(*, chunk_size: int) -> int:
+    """
+    Recompute the aggregates of every family account, `chunk_size` family
+    accounts at a time. Returns the number of family accounts.
+    """
+    rebuilt = 0
+    last_pk = None
+    while True:
+        family_accounts = md.FamilyAccount.objects.order_by("pk")
+        if last_pk is not None:
+            family_accounts = family_accounts.filter(pk__gt=last_pk)
+        pks = list(family_accounts.values_list("pk", flat=True)[:chunk_size])
+        if not pks:
+            return rebuilt
+        rebuild_family_accounts(pks)
+        rebuilt += len(pks)
+        last_pk = pks[-1]
@@ -0,0 +1,37 @@
+"""
+This module defines the `rebuild_family_account_aggregates` command, which
+recomputes the totals of the sub accounts of every family account from the
+sub accounts and the ledger. Run it after family accounts are created or
+sub accounts are deleted in bulk.
+
+Example usage:
+
+```bash
+
+python3 manage.py rebuild_family_account_aggregates --chunk-size 500
+```
+"""
+
+from django.core.management.base import BaseCommand
+
+from accounts import aggregates
+
+
+class Command(BaseCommand):
+    help = "Recompute the aggregates of family accounts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="The number of family accounts rebuilt at a time.",
+        )
+
+    def handle(self, *args, **options):
+        rebuilt = aggregates.rebuild(chunk_size=options["chunk_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt the aggregates of {rebuilt} family accounts"
+            )
+        )
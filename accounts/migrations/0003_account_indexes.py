@@ -0,0 +1,49 @@
+# Generated by Django 5.0.9 on 2026-10-17 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_alter_familyaccount_name"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="subaccount",
+            index=models.Index(
+                fields=["owner_id", "balance"],
+                name="sub_account_owner_balance_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="familyaccount",
+            index=models.Index(
+                fields=["family_group", "balance"],
+                name="family_account_group_bal_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="familyaccount",
+            index=models.Index(
+                fields=["created_by", "balance"],
+                name="family_account_creator_bal_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="fundrequest",
+            index=models.Index(
+                fields=["requested_by", "-created_at"],
+                name="fund_request_requester_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="fundrequest",
+            index=models.Index(
+                condition=models.Q(("request_status", "pending")),
+                fields=["family_account", "-created_at"],
+                name="fund_request_pending_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,128 @@
+# Generated by Django 5.0.9 on 2026-10-17 03:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def create_aggregates(apps, schema_editor):
+    """
+    Compute the aggregates of the family accounts that existed before them,
+    from their sub accounts and the ledger.
+    """
+    FamilyAccount = apps.get_model("accounts", "FamilyAccount")
+    FamilyAccountAggregate = apps.get_model(
+        "accounts", "FamilyAccountAggregate"
+    )
+    SubAccount = apps.get_model("accounts", "SubAccount")
+    LedgerEntry = apps.get_model("transactions", "LedgerEntry")
+
+    sub_accounts = (
+        SubAccount.objects.filter(family_account=OuterRef("pk"))
+        .values("family_account")
+        .order_by()
+    )
+    sub_account_balance = sub_accounts.annotate(total=Sum("balance"))
+    sub_account_count = sub_accounts.annotate(count=Count("pk"))
+    entries = LedgerEntry.objects.order_by("-created_at").values(
+        "created_at"
+    )
+    family_accounts = FamilyAccount.objects.annotate(
+        sub_account_balance=Coalesce(
+            Subquery(sub_account_balance.values("total")),
+            Value(0),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        ),
+        sub_account_count=Coalesce(
+            Subquery(sub_account_count.values("count")),
+            Value(0),
+        ),
+        own_activity=Subquery(
+            entries.filter(account_id=OuterRef("pk"))[:1]
+        ),
+        sub_account_activity=Subquery(
+            entries.filter(
+                account_id__in=SubAccount.objects.filter(
+                    family_account=OuterRef(OuterRef("pk"))
+                ).values("pk")
+            )[:1]
+        ),
+    )
+    FamilyAccountAggregate.objects.bulk_create(
+        (
+            FamilyAccountAggregate(
+                family_account_id=pk,
+                sub_account_balance=balance,
+                sub_account_count=count,
+                last_activity_at=max(
+                    (at for at in activity if at is not None), default=None
+                ),
+            )
+            for pk, balance, count, *activity in family_accounts.values_list(
+                "pk",
+                "sub_account_balance",
+                "sub_account_count",
+                "own_activity",
+                "sub_account_activity",
+            ).iterator()
+        ),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_account_indexes"),
+        ("transactions", "0002_ledger"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FamilyAccountAggregate",
+            fields=[
+                (
+                    "family_account",
+                    models.OneToOneField(
+                        db_comment="The family account the totals are of",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="aggregate",
+                        serialize=False,
+                        to="accounts.familyaccount",
+                    ),
+                ),
+                (
+                    "sub_account_balance",
+                    models.DecimalField(
+                        db_comment="The total balance of the sub accounts",
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                    ),
+                ),
+                (
+                    "sub_account_count",
+                    models.PositiveIntegerField(
+                        db_comment="The number of sub accounts", default=0
+                    ),
+                ),
+                (
+                    "last_activity_at",
+                    models.DateTimeField(
+                        db_comment=(
+                            "When funds last moved from or to the family "
+                            "account or one of its sub accounts"
+                        ),
+                        null=True,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "family_account_aggregates",
+            },
+        ),
+        migrations.RunPython(create_aggregates, migrations.RunPython.noop),
+    ]
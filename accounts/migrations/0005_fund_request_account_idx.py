@@ -0,0 +1,24 @@
+# Generated by Django 5.0.9 on 2026-10-17 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_family_account_aggregates"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="fundrequest",
+            name="fund_request_pending_idx",
+        ),
+        migrations.AddIndex(
+            model_name="fundrequest",
+            index=models.Index(
+                fields=["family_account", "-created_at", "-id"],
+                name="fund_request_account_idx",
+            ),
+        ),
+    ]
@@ -1,9 +1,10 @@
 from uuid import uuid4
 
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from accounts import aggregates
 from family_memberships import models as fm_models
 
 
@@ -75,6 +76,12 @@ class SubAccount(models.Model):
         db_table = "sub_accounts"
         ordering = ("balance",)
         unique_together = ("family_account", "name")
+        indexes = [
+            models.Index(
+                fields=["owner_id", "balance"],
+                name="sub_account_owner_balance_idx",
+            ),
+        ]
 
     def __str__(self):
         """Return the account type and name and the current balance."""
@@ -83,7 +90,12 @@ class SubAccount(models.Model):
     def save(self, *args, **kwargs):
         """
         Save the new SubAccount and set the `created_at` and `updated_at`
-        fields correctly.
+        fields correctly. The aggregates of the family accounts it is moved
+        from and to are updated in the same database transaction.
+
+        Balances only move through transfers, so saving an existing
+        SubAccount keeps the balance of its locked row, not the one loaded
+        with the instance.
         """
         if not self.created_at:
             current_time = timezone.now()
@@ -92,7 +104,40 @@ class SubAccount(models.Model):
         else:
             self.updated_at = timezone.now()
 
-        return super(SubAccount, self).save(*args, **kwargs)
+        with transaction.atomic():
+            previous = self.get_aggregate_state()
+            if previous is not None:
+                self.balance = previous[1]
+            result = super(SubAccount, self).save(*args, **kwargs)
+            aggregates.move_sub_account(
+                previous, (self.family_account_id, self.balance)
+            )
+        return result
+
+    def delete(self, *args, **kwargs):
+        """
+        Delete the SubAccount and remove it from the aggregate of its family
+        account in the same database transaction.
+        """
+        with transaction.atomic():
+            previous = self.get_aggregate_state()
+            result = super(SubAccount, self).delete(*args, **kwargs)
+            aggregates.move_sub_account(previous, None)
+        return result
+
+    def get_aggregate_state(self) -> aggregates.SubAccountState | None:
+        """
+        Lock the saved row of the SubAccount and return its family account
+        and balance, or `None` if it isn't saved yet.
+        """
+        if self._state.adding:
+            return None
+        return (
+            SubAccount.objects.select_for_update()
+            .filter(pk=self.pk)
+            .values_list("family_account_id", "balance")
+            .first()
+        )
 
 
 class FamilyAccount(models.Model):
@@ -124,11 +169,26 @@ class FamilyAccount(models.Model):
         db_table = "family_accounts"
         ordering = ("balance",)
         unique_together = ("name", "family_group")
+        indexes = [
+            models.Index(
+                fields=["family_group", "balance"],
+                name="family_account_group_bal_idx",
+            ),
+            models.Index(
+                fields=["created_by", "balance"],
+                name="family_account_creator_bal_idx",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         """
         Save the new FamilyAccount and set the `created_at` and
-        `updated_at` fields correctly.
+        `updated_at` fields correctly. A new FamilyAccount gets its empty
+        aggregate in the same database transaction.
+
+        Balances only move through transfers, so saving an existing
+        FamilyAccount keeps the balance of its locked row, not the one
+        loaded with the instance.
         """
         if not self.created_at:
             current_time = timezone.now()
@@ -137,13 +197,62 @@ class FamilyAccount(models.Model):
         else:
             self.updated_at = timezone.now()
 
-        return super(FamilyAccount, self).save(*args, **kwargs)
+        with transaction.atomic():
+            adding = self._state.adding
+            if not adding:
+                balance = (
+                    FamilyAccount.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("balance", flat=True)
+                    .first()
+                )
+                if balance is not None:
+                    self.balance = balance
+            result = super(FamilyAccount, self).save(*args, **kwargs)
+            if adding:
+                aggregates.create(self.pk)
+        return result
 
     def __str__(self):
         """Returns the family account name and the current balance."""
         return f"{self.name}: {self.balance}"
 
 
+class FamilyAccountAggregate(models.Model):
+    """
+    Model for the totals of the sub accounts of a family account, kept up to
+    date in the database transaction of every change of their balances (see
+    `accounts.aggregates`).
+    """
+
+    family_account = models.OneToOneField(
+        to="FamilyAccount",
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="aggregate",
+        db_comment=_("The family account the totals are of"),
+    )
+    sub_account_balance = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        db_comment=_("The total balance of the sub accounts"),
+    )
+    sub_account_count = models.PositiveIntegerField(
+        default=0, db_comment=_("The number of sub accounts")
+    )
+    last_activity_at = models.DateTimeField(
+        null=True,
+        db_comment=_(
+            "When funds last moved from or to the family account or one of "
+            "its sub accounts"
+        ),
+    )
+
+    class Meta:
+        db_table = "family_account_aggregates"
+
+
 class FundRequest(models.Model):
     """Model for representing a account fund request."""
 
@@ -202,6 +311,18 @@ class FundRequest(models.Model):
     class Meta:
         db_table = "fund_requests"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["requested_by", "-created_at"],
+                name="fund_request_requester_idx",
+            ),
+            # The fund requests of a family account are listed most recent
+            # first (see `FamilyAccountViewSet.fund_requests`)
+            models.Index(
+                fields=["family_account", "-created_at", "-id"],
+                name="fund_request_account_idx",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         """
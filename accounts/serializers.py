@@ -14,9 +14,16 @@ from accounts.models import (
 )
 from family_memberships.models import FamilyGroup
 from family_memberships.serializers import FamilyGroupSummarySerializer
+from famtrust.serializers import (
+    CappedListSerializer,
+    ExpandableFieldsMixin,
+    SparseFieldsMixin,
+)
 
 
-class FundRequestInFamilyAccountSerializer(serializers.ModelSerializer):
+class FundRequestInFamilyAccountSerializer(
+    SparseFieldsMixin, serializers.ModelSerializer
+):
     """Serializer for FundRequest object in FamilyAccount."""
 
     source_account_name = serializers.CharField(
@@ -45,18 +52,54 @@ class FundRequestInFamilyAccountSerializer(serializers.ModelSerializer):
         ]
 
 
-class FamilyAccountSummarySerializer(serializers.ModelSerializer):
-    """Serializer for FamilyAccount object in accounts summary."""
+class FamilyAccountSummarySerializer(
+    SparseFieldsMixin, serializers.ModelSerializer
+):
+    """
+    Serializer for FamilyAccount object in accounts summary, with the
+    totals of its sub accounts (see `accounts.aggregates`). The totals of
+    an account without an aggregate yet (e.g. created in bulk) are 0.
+    """
 
     family_group = FamilyGroupSummarySerializer(read_only=True)
+    sub_account_balance = serializers.DecimalField(
+        source="aggregate.sub_account_balance",
+        max_digits=14,
+        decimal_places=2,
+        read_only=True,
+    )
+    sub_account_count = serializers.IntegerField(
+        source="aggregate.sub_account_count", read_only=True
+    )
+    last_activity_at = serializers.DateTimeField(
+        source="aggregate.last_activity_at", read_only=True
+    )
 
     class Meta:
         model = FamilyAccount
-        fields = ("id", "name", "balance", "family_group")
+        fields = (
+            "id",
+            "name",
+            "balance",
+            "family_group",
+            "sub_account_balance",
+            "sub_account_count",
+            "last_activity_at",
+        )
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # The fields of a missing aggregate are rendered as `None`
+        for name in ("sub_account_balance", "sub_account_count"):
+            if name in data and data[name] is None:
+                data[name] = self.fields[name].to_representation(0)
+        return data
 
 
 class SubAccountSerializer(
-    validators.SubAccountValidatorMixin, serializers.ModelSerializer
+    validators.SubAccountValidatorMixin,
+    SparseFieldsMixin,
+    serializers.ModelSerializer,
 ):
     """Serializer for SubAccount object."""
 
@@ -96,7 +139,7 @@ class SubAccountInFundRequestSerializer(SubAccountSummarySerializer):
         fields = ("id", "name", "balance", "type")
 
 
-class FundRequestSerializer(serializers.ModelSerializer):
+class FundRequestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for FundRequest object."""
 
     source_account = SubAccountInFundRequestSerializer(read_only=True)
@@ -119,12 +162,23 @@ class FundRequestSerializer(serializers.ModelSerializer):
 
 
 class FamilyAccountSerializer(
-    validators.FamilyAccountValidatorMixin, serializers.ModelSerializer
+    validators.FamilyAccountValidatorMixin,
+    SparseFieldsMixin,
+    ExpandableFieldsMixin,
+    serializers.ModelSerializer,
 ):
-    """Serializer for FamilyAccount object."""
+    """
+    Serializer for FamilyAccount object.
 
-    fund_requests = FundRequestInFamilyAccountSerializer(
-        many=True, read_only=True
+    The fund requests and the family group of the account are only rendered
+    when requested with `?expand=fund_requests,family_group`; the family
+    group is otherwise rendered as its ID.
+    """
+
+    fund_requests = CappedListSerializer(
+        child=FundRequestInFamilyAccountSerializer(),
+        url_name="family-account-fund-requests",
+        read_only=True,
     )
 
     family_group = FamilyGroupSummarySerializer(read_only=True)
@@ -138,3 +192,4 @@ class FamilyAccountSerializer(
         model = FamilyAccount
         fields = "__all__"
         read_only_fields = ("balance", "created_by")
+        expandable_fields = ("fund_requests", "family_group")
@@ -1,3 +1,431 @@
-from django.test import TestCase
+import importlib
+import uuid
+from decimal import Decimal
 
-# Create your tests here.
+from django.apps import apps
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import (
+    FamilyAccount,
+    FamilyAccountAggregate,
+    FundRequest,
+    SubAccount,
+)
+from famtrust.testing import (
+    FamilyAccountMixin,
+    StubAuthServiceMixin,
+    create_family_account,
+    create_sub_account,
+)
+from transactions.models import (
+    Transaction,
+    TransactionDirectionEnum,
+    TransactionTypeEnum,
+)
+
+
+class ListQueryTests(StubAuthServiceMixin, TestCase):
+    """
+    The list endpoints load what they render with the objects they list, so
+    a page takes the same number of queries whatever its size.
+    """
+
+    objects = 12
+
+    def setUp(self):
+        super().setUp()
+        owner_id = self.user["id"]
+        self.family_accounts = [
+            create_family_account(
+                owner_id=owner_id, balance=100, name=f"Family {i}"
+            )
+            for i in range(self.objects)
+        ]
+        for i in range(self.objects):
+            sub_account = create_sub_account(
+                family_account=self.family_accounts[0],
+                owner_id=owner_id,
+                balance=1,
+                name=f"Sub {i}",
+            )
+            FundRequest.objects.create(
+                reason="Lunch",
+                requested_by=owner_id,
+                family_account=self.family_accounts[0],
+                source_account=sub_account,
+                amount=5,
+            )
+
+    def test_sub_accounts(self):
+        self.assert_list_queries(
+            "/api/v1/sub-accounts/", 2, key="sub_accounts"
+        )
+
+    def test_family_accounts(self):
+        self.assert_list_queries(
+            "/api/v1/family-accounts/", 2, key="family_accounts"
+        )
+
+    def test_fund_requests(self):
+        self.assert_list_queries(
+            "/api/v1/fund-requests/", 2, key="fund_requests"
+        )
+
+    def test_fund_requests_of_a_family_account(self):
+        self.assert_list_queries(
+            f"/api/v1/family-accounts/{self.family_accounts[0].pk}"
+            "/fund-requests/",
+            3,
+            key="fund_requests",
+        )
+
+    def test_accounts(self):
+        for page_size in (2, 10):
+            with self.subTest(page_size=page_size):
+                with self.assertNumQueries(3):
+                    response = self.client.get(
+                        "/api/v1/accounts/", data={"page_size": page_size}
+                    )
+                accounts = response.json()["accounts"]
+                self.assertEqual(
+                    len(accounts["sub_accounts"])
+                    + len(accounts["family_accounts"]),
+                    page_size,
+                )
+
+
+@override_settings(EXPANDED_COLLECTION_LIMIT=2)
+class FamilyAccountExpandTests(StubAuthServiceMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        owner_id = self.user["id"]
+        self.family_account = create_family_account(
+            owner_id=owner_id, balance=100
+        )
+        sub_account = create_sub_account(
+            family_account=self.family_account, owner_id=owner_id, balance=1
+        )
+        self.fund_requests = [
+            FundRequest.objects.create(
+                reason=f"Request {i}",
+                requested_by=owner_id,
+                family_account=self.family_account,
+                source_account=sub_account,
+                amount=5,
+            )
+            for i in range(3)
+        ]
+        self.path = f"/api/v1/family-accounts/{self.family_account.pk}/"
+
+    def test_nested_fields_are_left_out_by_default(self):
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 200)
+        family_account = response.json()["family_account"]
+        self.assertNotIn("fund_requests", family_account)
+        self.assertEqual(
+            family_account["family_group"],
+            str(self.family_account.family_group_id),
+        )
+
+    def test_expand(self):
+        response = self.client.get(
+            self.path, data={"expand": "fund_requests,family_group"}
+        )
+        self.assertEqual(response.status_code, 200)
+        family_account = response.json()["family_account"]
+        self.assertEqual(
+            family_account["family_group"]["id"],
+            str(self.family_account.family_group_id),
+        )
+        fund_requests = family_account["fund_requests"]
+        self.assertEqual(
+            [fund_request["id"] for fund_request in fund_requests["results"]],
+            [str(fund_request.pk) for fund_request in self.fund_requests][
+                :0:-1
+            ],
+        )
+        self.assertEqual(
+            fund_requests["url"], f"http://testserver{self.path}fund-requests"
+        )
+
+    def test_expand_in_a_list(self):
+        response = self.client.get(
+            "/api/v1/family-accounts/", data={"expand": "fund_requests"}
+        )
+        self.assertEqual(response.status_code, 200)
+        (family_account,) = response.json()["family_accounts"]
+        self.assertEqual(len(family_account["fund_requests"]["results"]), 2)
+
+    def test_fund_requests_collection(self):
+        response = self.client.get(f"{self.path}fund-requests/")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(
+            body["message"], "Fund Requests retrieved successfully."
+        )
+        self.assertNotIn("family_account", body)
+        self.assertEqual(
+            [fund_request["id"] for fund_request in body["fund_requests"]],
+            [str(fund_request.pk) for fund_request in self.fund_requests][
+                ::-1
+            ],
+        )
+
+    def test_fund_requests_of_a_missing_family_account(self):
+        response = self.client.get(
+            "/api/v1/family-accounts/"
+            "00000000-0000-0000-0000-000000000000/fund-requests/"
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class AccountPaginationTests(StubAuthServiceMixin, TestCase):
+    """
+    Sub accounts and family accounts are paginated together, as one union,
+    by page number in order of balance or by cursor, newest first.
+    """
+
+    def setUp(self):
+        super().setUp()
+        owner_id = self.user["id"]
+        self.family_account = create_family_account(
+            owner_id=owner_id, balance=100, name="Home"
+        )
+        self.sub_accounts = [
+            create_sub_account(
+                family_account=self.family_account,
+                owner_id=owner_id,
+                balance=balance,
+                name=f"Sub {balance}",
+            )
+            for balance in (10, 20, 30)
+        ]
+        # Left with a balance of 40 by the sub accounts
+        self.other_family_account = create_family_account(
+            owner_id=owner_id, balance=50, name="Holidays"
+        )
+        # Someone else's accounts are never listed
+        create_family_account(owner_id=uuid.uuid4(), balance=1)
+
+    def get(self, url="/api/v1/accounts/", **params):
+        response = self.client.get(url, data=params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    @staticmethod
+    def get_ids(body) -> list[str]:
+        accounts = body["accounts"]
+        return [
+            account["id"]
+            for kind in ("sub_accounts", "family_accounts")
+            for account in accounts[kind]
+        ]
+
+    def test_page_numbers(self):
+        sub_10, sub_20, sub_30 = (str(sub.pk) for sub in self.sub_accounts)
+        pages = [self.get(page_size=2, page=page) for page in (1, 2, 3)]
+
+        self.assertEqual(
+            [self.get_ids(body) for body in pages],
+            [
+                [sub_10, sub_20],
+                [sub_30, str(self.family_account.pk)],
+                [str(self.other_family_account.pk)],
+            ],
+        )
+        self.assertEqual(
+            [
+                (body["metadata"]["count"], body["metadata"]["current_page"])
+                for body in pages
+            ],
+            [(2, 1), (2, 2), (1, 3)],
+        )
+        self.assertEqual(pages[0]["metadata"]["total_pages"], 3)
+        self.assertIsNone(pages[0]["metadata"]["previous"])
+        self.assertIsNone(pages[2]["metadata"]["next"])
+
+    def test_cursor(self):
+        accounts = [
+            self.family_account,
+            *self.sub_accounts,
+            self.other_family_account,
+        ]
+        newest_first = [
+            str(account.pk)
+            for account in sorted(
+                accounts,
+                key=lambda account: (account.created_at, account.pk),
+                reverse=True,
+            )
+        ]
+
+        pages = [self.get(page_size=2, pagination="cursor")]
+        while pages[-1]["metadata"]["next"]:
+            with CaptureQueriesContext(connection) as queries:
+                pages.append(self.get(pages[-1]["metadata"]["next"]))
+            # Cursor pages aren't counted
+            self.assertFalse(
+                any("COUNT(" in query["sql"] for query in queries)
+            )
+
+        self.assertEqual(
+            [sorted(self.get_ids(body)) for body in pages],
+            [
+                sorted(newest_first[:2]),
+                sorted(newest_first[2:4]),
+                sorted(newest_first[4:]),
+            ],
+        )
+        self.assertIsNone(pages[0]["metadata"]["previous"])
+        self.assertIsNone(pages[-1]["metadata"]["total_pages"])
+        self.assertEqual(
+            self.get_ids(self.get(pages[-1]["metadata"]["previous"])),
+            self.get_ids(pages[1]),
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            "/api/v1/accounts/", data={"cursor": "not-a-cursor"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class FamilyAccountAggregateTests(StubAuthServiceMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        owner_id = self.user["id"]
+        self.family_account = create_family_account(
+            owner_id=owner_id, balance=100
+        )
+        for balance in (10, 20):
+            create_sub_account(
+                family_account=self.family_account,
+                owner_id=owner_id,
+                balance=balance,
+                name=f"Sub {balance}",
+            )
+
+    def get_summary(self) -> dict:
+        """Return the summary of the family account in the accounts list."""
+        response = self.client.get("/api/v1/accounts/")
+        self.assertEqual(response.status_code, 200)
+        (family_account,) = (
+            family_account
+            for family_account in response.json()["accounts"][
+                "family_accounts"
+            ]
+            if family_account["id"] == str(self.family_account.pk)
+        )
+        return family_account
+
+    def test_new_family_account_has_an_aggregate(self):
+        family_account = FamilyAccount.objects.create(
+            name="New",
+            family_group=self.family_account.family_group,
+            created_by=self.user["id"],
+        )
+
+        aggregate = FamilyAccountAggregate.objects.get(
+            family_account=family_account
+        )
+        self.assertEqual(aggregate.sub_account_balance, 0)
+        self.assertEqual(aggregate.sub_account_count, 0)
+        self.assertIsNone(aggregate.last_activity_at)
+
+    def test_summary_without_an_aggregate(self):
+        FamilyAccountAggregate.objects.all().delete()
+
+        family_account = self.get_summary()
+        self.assertEqual(family_account["sub_account_balance"], "0.00")
+        self.assertEqual(family_account["sub_account_count"], 0)
+        self.assertIsNone(family_account["last_activity_at"])
+
+    def test_migration_creates_the_aggregates(self):
+        expected = self.get_summary()
+        FamilyAccountAggregate.objects.all().delete()
+        # An account without sub accounts or funds
+        FamilyAccount.objects.bulk_create(
+            [
+                FamilyAccount(
+                    name="Empty",
+                    family_group=self.family_account.family_group,
+                    created_by=self.user["id"],
+                    created_at=self.family_account.created_at,
+                    updated_at=self.family_account.created_at,
+                )
+            ]
+        )
+
+        migration = importlib.import_module(
+            "accounts.migrations.0004_family_account_aggregates"
+        )
+        migration.create_aggregates(apps, None)
+
+        self.assertEqual(self.get_summary(), expected)
+        self.assertEqual(expected["sub_account_balance"], "30.00")
+        self.assertEqual(expected["sub_account_count"], 2)
+        self.assertIsNotNone(expected["last_activity_at"])
+        empty = FamilyAccountAggregate.objects.get(
+            family_account__name="Empty"
+        )
+        self.assertEqual(
+            (empty.sub_account_balance, empty.sub_account_count),
+            (Decimal(0), 0),
+        )
+        self.assertIsNone(empty.last_activity_at)
+
+
+class AccountSaveTests(FamilyAccountMixin, TestCase):
+    """
+    Saving an account loaded before a transfer keeps the balance the
+    transfer left, instead of the one loaded with it.
+    """
+
+    sub_account_balance = 30
+
+    def setUp(self):
+        super().setUp()
+        self.stale_family_account = FamilyAccount.objects.get(
+            pk=self.family_account.pk
+        )
+        self.stale_sub_account = SubAccount.objects.get(
+            pk=self.sub_account.pk
+        )
+        Transaction.objects.create(
+            user_id=self.user_id,
+            amount=10,
+            transaction_type=TransactionTypeEnum.TRANSFERS,
+            transaction_direction=(
+                TransactionDirectionEnum.FAMILY_ACCOUNT_TO_SUB_ACCOUNT
+            ),
+            family_source_account=self.family_account,
+            sub_destination_account=self.sub_account,
+            details="Pocket money",
+        )
+
+    def test_sub_account(self):
+        self.stale_sub_account.name = "Renamed"
+        self.stale_sub_account.save()
+
+        self.sub_account.refresh_from_db()
+        self.assertEqual(
+            (self.sub_account.name, self.sub_account.balance),
+            ("Renamed", 40),
+        )
+        self.assertEqual(self.stale_sub_account.balance, 40)
+        aggregate = FamilyAccountAggregate.objects.get(
+            family_account=self.family_account
+        )
+        self.assertEqual(aggregate.sub_account_balance, 40)
+
+    def test_family_account(self):
+        self.stale_family_account.name = "Renamed"
+        self.stale_family_account.save()
+
+        self.family_account.refresh_from_db()
+        self.assertEqual(
+            (self.family_account.name, self.family_account.balance),
+            ("Renamed", 60),
+        )
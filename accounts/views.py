@@ -1,6 +1,6 @@
 """API views for accounts app."""
 
-from django.db.models import Q
+from django.db.models import Q, Value
 from django.utils.translation import gettext_lazy as _
 from drf_spectacular.utils import (
     OpenApiRequest,
@@ -11,6 +11,7 @@ from rest_framework import (
     status,
     viewsets,
 )
+from rest_framework.decorators import action
 
 from accounts import serializers
 from accounts.models import (
@@ -22,10 +23,14 @@ from famtrust import (
     permissions,
     utils,
 )
+from famtrust.query_plans import QueryPlanMixin, apply_query_plan
+from idempotency.mixins import IdempotentViewMixin
 
 
 @extend_schema(tags=["Sub Accounts"])
-class SubAccountViewSet(viewsets.ModelViewSet):
+class SubAccountViewSet(
+    IdempotentViewMixin, QueryPlanMixin, viewsets.ModelViewSet
+):
     """A collection of endpoints for SubAccount operations."""
 
     serializer_class = serializers.SubAccountSerializer
@@ -132,7 +137,9 @@ class SubAccountViewSet(viewsets.ModelViewSet):
 
 
 @extend_schema(tags=["Family Accounts"])
-class FamilyAccountViewSet(viewsets.ModelViewSet):
+class FamilyAccountViewSet(
+    IdempotentViewMixin, QueryPlanMixin, viewsets.ModelViewSet
+):
     """A collection of endpoints for FamilyAccount operations."""
 
     serializer_class = serializers.FamilyAccountSerializer
@@ -228,6 +235,43 @@ class FamilyAccountViewSet(viewsets.ModelViewSet):
         """Delete an existing family account."""
         return super().destroy(request, *args, **kwargs)
 
+    @extend_schema(
+        summary="Retrieve the fund requests of a family account",
+        responses=OpenApiResponse(
+            response=serializers.FundRequestInFamilyAccountSerializer(
+                many=True
+            ),
+            description="Fund Requests retrieved successfully",
+        ),
+    )
+    @action(methods=["GET"], detail=True, url_path="fund-requests")
+    def fund_requests(self, request, pk=None):
+        """
+        Retrieve the fund requests made against a family account, most
+        recent first.
+
+        This is the paginated collection linked from the fund requests
+        expanded in a family account with `?expand=fund_requests`.
+        """
+        serializer_class = serializers.FundRequestInFamilyAccountSerializer
+        family_account = self.get_object()
+        self.envelope_name = "fund-requests"
+        page = self.paginate_queryset(self.get_fund_requests(family_account))
+        serializer = serializer_class(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+    def get_fund_requests(self, family_account):
+        """Return the fund requests of a family account, most recent first."""
+        return apply_query_plan(
+            family_account.fund_requests.order_by("-created_at", "-id"),
+            serializers.FundRequestInFamilyAccountSerializer(
+                context=self.get_serializer_context()
+            ),
+            defer_unused=True,
+        )
+
 
 @extend_schema(tags=["Accounts"])
 class AccountViewSet(viewsets.GenericViewSet):
@@ -283,40 +327,57 @@ class AccountViewSet(viewsets.GenericViewSet):
         """
         Return a paginated response for both sub-accounts and family accounts.
 
-        Paginates both sub_accounts and family_accounts and returns a
-        paginated response.
+        Both kinds of accounts are paginated together, ordered by balance,
+        as one union of their keys, so a page costs a single count and a
+        single page query however many accounts the user has. The accounts
+        on the page are then loaded by primary key, one query per kind.
         """
         paginator = self.pagination_class()
-        paginated_sub_accounts = paginator.paginate_queryset(
-            sub_accounts, request
-        )
-        paginated_family_accounts = paginator.paginate_queryset(
-            family_accounts, request
-        )
-
-        sub_accounts_serializer = serializers.SubAccountSummarySerializer(
-            instance=paginated_sub_accounts,
-            many=True,
-            context={"request": request},
-        )
-        family_accounts_serializer = (
-            serializers.FamilyAccountSummarySerializer(
-                instance=paginated_family_accounts,
-                many=True,
-                context={"request": request},
-            )
-        )
-
-        data = {
-            "sub_accounts": sub_accounts_serializer.data,
-            "family_accounts": family_accounts_serializer.data,
+        context = {"request": request}
+        kinds = {
+            "sub_accounts": (
+                sub_accounts,
+                serializers.SubAccountSummarySerializer,
+            ),
+            "family_accounts": (
+                family_accounts,
+                serializers.FamilyAccountSummarySerializer,
+            ),
         }
+        keys = paginator.paginate_union(
+            [
+                queryset.values(
+                    "id", "balance", "created_at", kind=Value(kind)
+                )
+                for kind, (queryset, _) in kinds.items()
+            ],
+            request,
+            ordering=("balance", "id"),
+        )
 
-        return paginator.get_paginated_response(data)
+        data = {}
+        for kind, (queryset, serializer_class) in kinds.items():
+            ids = [key["id"] for key in keys if key["kind"] == kind]
+            accounts = {}
+            if ids:
+                accounts = apply_query_plan(
+                    queryset.model.objects.all(),
+                    serializer_class(context=context),
+                    defer_unused=True,
+                ).in_bulk(ids)
+            data[kind] = serializer_class(
+                [accounts[pk] for pk in ids], many=True, context=context
+            ).data
+
+        response = paginator.get_paginated_response(data)
+        response.data["metadata"]["count"] = len(keys)
+        return response
 
 
 @extend_schema(tags=["Fund Requests"])
-class FundRequestViewSet(viewsets.ModelViewSet):
+class FundRequestViewSet(
+    IdempotentViewMixin, QueryPlanMixin, viewsets.ModelViewSet
+):
     """A collection of endpoints for fund requests."""
 
     serializer_class = serializers.FundRequestSerializer
@@ -0,0 +1,19 @@
+"""
+Benchmarks of the hot paths of the API, run by hand with the environment of
+the server (see `env_file_template`). Every module prints its results and
+sets up Django itself, so run them from the repository root as modules.
+
+Example usage:
+
+```bash
+
+python -m benchmarks.asgi_auth
+```
+"""
+
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "famtrust.settings")
+django.setup()
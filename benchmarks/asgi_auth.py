@@ -0,0 +1,130 @@
+"""
+This module benchmarks authenticating concurrent requests under WSGI and
+ASGI, against a stub auth service that answers after a fixed latency.
+
+Every request carries a different token, so none of them is served from the
+token cache or coalesced with another one. Three setups are compared:
+
+- `wsgi`: the sync middleware chain on a pool of threads, as in a gunicorn
+  gthread worker;
+- `asgi, sync chain`: an ASGI worker whose middleware chain has a sync-only
+  middleware (WhiteNoise), so the whole chain runs in a single thread, as
+  it did before the middleware was async-capable;
+- `asgi`: an ASGI worker with an async middleware chain.
+
+Example usage:
+
+```bash
+
+python -m benchmarks.asgi_auth --requests 200 --latency 0.05 --threads 8
+```
+"""
+
+import argparse
+import asyncio
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.test import AsyncClient, Client, override_settings
+
+from famtrust.clients import async_auth_client, auth_client
+from famtrust.testing import StubAuthService, reset_auth_state
+
+PATH = "/api/v1/benchmark/"
+ASYNC_MIDDLEWARE = [
+    middleware
+    for middleware in settings.MIDDLEWARE
+    if middleware != "whitenoise.middleware.WhiteNoiseMiddleware"
+]
+SYNC_MIDDLEWARE = [
+    "whitenoise.middleware.WhiteNoiseMiddleware",
+    *ASYNC_MIDDLEWARE,
+]
+
+
+def run_wsgi(tokens: list[str], *, threads: int) -> float:
+    """Send the requests from a pool of threads, one token per request."""
+
+    def send(token):
+        return Client(headers={"Authorization": token}).get(PATH)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        responses = list(executor.map(send, tokens))
+    elapsed = time.perf_counter() - start
+    check(responses)
+    return elapsed
+
+
+def run_asgi(tokens: list[str], *, middleware: list[str]) -> float:
+    """Send the requests concurrently on an event loop."""
+
+    async def send_all():
+        with override_settings(MIDDLEWARE=middleware):
+            client = AsyncClient()
+            return await asyncio.gather(
+                *(
+                    client.get(PATH, headers={"Authorization": token})
+                    for token in tokens
+                )
+            )
+
+    start = time.perf_counter()
+    responses = asyncio.run(send_all())
+    elapsed = time.perf_counter() - start
+    check(responses)
+    return elapsed
+
+
+def check(responses) -> None:
+    """Make sure every request got past the middleware."""
+    statuses = {response.status_code for response in responses}
+    if statuses != {404}:
+        raise RuntimeError(f"Unexpected responses: {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    auth_service = StubAuthService(latency=args.latency)
+    auth_service.start()
+    # Let the clients keep every request in flight at once
+    auth_client.pool_size = async_auth_client.pool_size = args.requests
+    runs = {
+        f"wsgi, {args.threads} threads": lambda tokens: run_wsgi(
+            tokens, threads=args.threads
+        ),
+        "asgi, sync chain": lambda tokens: run_asgi(
+            tokens, middleware=SYNC_MIDDLEWARE
+        ),
+        "asgi": lambda tokens: run_asgi(tokens, middleware=ASYNC_MIDDLEWARE),
+    }
+
+    print(
+        f"{args.requests} concurrent requests, "
+        f"{args.latency * 1000:.0f} ms auth service latency"
+    )
+    with override_settings(EXTERNAL_AUTH_URL=auth_service.url):
+        for name, run in runs.items():
+            reset_auth_state()
+            auth_service.reset()
+            tokens = [
+                auth_service.add_user()[0] for _ in range(args.requests)
+            ]
+            elapsed = run(tokens)
+            print(
+                f"{name:>20}: {elapsed:6.2f} s, "
+                f"{args.requests / elapsed:7.1f} requests/s"
+            )
+    auth_service.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+This module benchmarks what it costs the auth middleware to hand a request
+its FamTrust user.
+
+Before the validated user was cached with its token, the middleware built
+and validated a `User` from the auth service's data on every request
+(`validate each request`). It now reads the user built when the token was
+first validated from the token cache (`token cache hit`). The whole
+middleware is measured on a cache hit as well, and `model_construct`, which
+skips validation without caching, is shown for reference.
+
+Example usage:
+
+```bash
+
+python -m benchmarks.user_construction --iterations 20000
+```
+"""
+
+import argparse
+import timeit
+
+from django.test import RequestFactory
+
+from famtrust import models
+from famtrust.cache import token_cache
+from famtrust.middleware import ValidateUserMiddleware
+from famtrust.testing import StubAuthService
+
+TOKEN = "Bearer benchmark"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    _, user_data = StubAuthService().add_user()
+    admin = user_data["role"]["id"] == "admin"
+    token_cache.set(TOKEN, models.User.from_auth_data(user_data))
+    middleware = ValidateUserMiddleware(lambda request: None)
+    request = RequestFactory().get(
+        "/api/v1/transactions/", headers={"Authorization": TOKEN}
+    )
+
+    runs = {
+        "validate each request": lambda: models.User(
+            **user_data, isAdmin=admin
+        ),
+        "model_construct": lambda: models.User.model_construct(
+            **user_data, isAdmin=admin
+        ),
+        "token cache hit": lambda: token_cache.get(TOKEN),
+        "middleware, cache hit": lambda: middleware.process_request(request),
+    }
+
+    print(f"{args.iterations} iterations")
+    for name, run in runs.items():
+        elapsed = min(timeit.repeat(run, number=args.iterations, repeat=3))
+        per_call = elapsed / args.iterations * 1_000_000
+        print(f"{name:>22}: {per_call:6.2f} µs per request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.9 on 2026-10-17 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("family_memberships", "0002_alter_familymembership_options"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="familymembership",
+            index=models.Index(
+                fields=["user_id", "-joined_at"],
+                name="membership_user_joined_idx",
+            ),
+        ),
+    ]
@@ -82,6 +82,12 @@ class FamilyMembership(models.Model):
         db_table = "family_memberships"
         unique_together = ("user_id", "family_group")
         ordering = ("-joined_at",)
+        indexes = [
+            models.Index(
+                fields=["user_id", "-joined_at"],
+                name="membership_user_joined_idx",
+            ),
+        ]
 
     def __str__(self):
         return (
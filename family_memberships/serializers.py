@@ -11,10 +11,13 @@ from family_memberships.models import (
     FamilyMembership,
 )
 from famtrust import utils
+from famtrust.serializers import SparseFieldsMixin
 
 
 class FamilyGroupSerializer(
-    validators.FamilyGroupValidatorMixin, serializers.ModelSerializer
+    validators.FamilyGroupValidatorMixin,
+    SparseFieldsMixin,
+    serializers.ModelSerializer,
 ):
     """Serializer for FamilyGroup object."""
 
@@ -25,7 +28,9 @@ class FamilyGroupSerializer(
         filterset_fields = ("is_default",)
 
 
-class FamilyGroupSummarySerializer(serializers.ModelSerializer):
+class FamilyGroupSummarySerializer(
+    SparseFieldsMixin, serializers.ModelSerializer
+):
     """Serializer for FamilyGroup object in FamilyMembership."""
 
     class Meta:
@@ -34,7 +39,9 @@ class FamilyGroupSummarySerializer(serializers.ModelSerializer):
 
 
 class FamilyMembershipSerializer(
-    validators.FamilyMembershipValidatorMixin, serializers.ModelSerializer
+    validators.FamilyMembershipValidatorMixin,
+    SparseFieldsMixin,
+    serializers.ModelSerializer,
 ):
     class Meta:
         model = FamilyMembership
@@ -67,7 +74,9 @@ class FamilyMembershipSerializer(
             )
 
 
-class FamilyMembershipInFamilyGroupSerializer(serializers.ModelSerializer):
+class FamilyMembershipInFamilyGroupSerializer(
+    SparseFieldsMixin, serializers.ModelSerializer
+):
     """Serializer for FamilyMembership object in FamilyGroup."""
 
     class Meta:
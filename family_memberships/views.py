@@ -17,6 +17,8 @@ from famtrust import (
     permissions,
     utils,
 )
+from famtrust.query_plans import QueryPlanMixin, apply_query_plan
+from idempotency.mixins import IdempotentViewMixin
 from . import models
 from .serializers import (
     FamilyGroupSerializer,
@@ -26,7 +28,9 @@ from .serializers import (
 
 
 @extend_schema(tags=["Family Groups"])
-class FamilyGroupViewSet(viewsets.ModelViewSet):
+class FamilyGroupViewSet(
+    IdempotentViewMixin, QueryPlanMixin, viewsets.ModelViewSet
+):
     """A collection of endpoints for FamilyGroup operations."""
 
     serializer_class = FamilyGroupSerializer
@@ -41,9 +45,10 @@ class FamilyGroupViewSet(viewsets.ModelViewSet):
         Admins can see both the groups they own and the groups they belong to.
         """
         user = self.request.ft_user
+        family_group_ids = utils.get_family_group_ids(user_id=user.id)
         return models.FamilyGroup.objects.filter(
-            Q(members__user_id=user.id) | Q(owner_id=user.id)
-        ).distinct()
+            Q(id__in=family_group_ids) | Q(owner_id=user.id)
+        )
 
     def perform_create(self, serializer):
         """Create a new family group."""
@@ -156,14 +161,22 @@ class FamilyGroupViewSet(viewsets.ModelViewSet):
                 detail="Family group not found",
                 status_code=status.HTTP_404_NOT_FOUND,
             )
+        context = self.get_serializer_context()
+        members = apply_query_plan(
+            family_group.members.all(),
+            FamilyMembershipInFamilyGroupSerializer(context=context),
+            defer_unused=True,
+        )
         family_members = FamilyMembershipInFamilyGroupSerializer(
-            family_group.members.all(), many=True
+            members, many=True, context=context
         )
         return Response({"data": family_members.data})
 
 
 @extend_schema(tags=["Family Memberships"])
-class FamilyMembershipViewSet(viewsets.ModelViewSet):
+class FamilyMembershipViewSet(
+    IdempotentViewMixin, QueryPlanMixin, viewsets.ModelViewSet
+):
     """A collection of endpoints for Family Membership operations."""
 
     http_method_names = ("get", "post", "put", "delete")
@@ -188,7 +201,7 @@ class FamilyMembershipViewSet(viewsets.ModelViewSet):
             return models.FamilyMembership.objects.filter(
                 Q(user_id__in=default_family_group_members)
                 | Q(user_id=user.id)
-            ).distinct()
+            )
         return models.FamilyMembership.objects.filter(user_id=user.id)
 
     @extend_schema(
@@ -9,8 +9,10 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "famtrust.settings")
+os.environ.setdefault("FAMTRUST_ASGI", "True")
 
-application = get_asgi_application()
+application = ASGIStaticFilesHandler(get_asgi_application())
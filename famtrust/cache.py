@@ -0,0 +1,310 @@
+"""
+This module defines an in-process cache for the results of validating access
+tokens against the external auth service.
+
+Entries are keyed by a hash of the `Authorization` header, so raw tokens are
+never kept in memory longer than the request that carried them. Every entry
+lives for at most `TOKEN_CACHE_TTL` seconds and never outlives the `exp`
+claim of the token it belongs to. When the cache grows past
+`TOKEN_CACHE_MAX_SIZE` entries, the least recently used entry is evicted.
+
+Concurrent validations of the same token that miss the cache are coalesced
+by `token_validations`, so only one of them calls the auth service, and
+hashes of rejected tokens are remembered by `rejected_tokens` for
+`AUTH_REJECTED_TOKEN_TTL` seconds.
+
+Example usage:
+
+```python
+
+from famtrust.cache import token_cache
+from famtrust.models import User
+
+user = token_cache.get(token)
+if user is None:
+    valid, data = utils.is_valid_token(token=token)
+    user = User.from_auth_data(data["user"])
+    token_cache.set(token, user)
+
+print(token_cache.stats())
+```
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from django.conf import settings
+
+
+def make_token_key(token: str) -> str:
+    """Return the cache key for an `Authorization` header value."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def get_token_expiry(token: str) -> float | None:
+    """
+    Return the `exp` claim of a JWT access token as a UNIX timestamp.
+
+    The signature is not verified; the value is only used to make sure a
+    cache entry never outlives the token it was created for. `None` is
+    returned when the token is not a JWT or has no `exp` claim.
+    """
+    token = token.removeprefix("Bearer ").strip()
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims["exp"])
+    except (
+        IndexError,
+        KeyError,
+        TypeError,
+        ValueError,
+        binascii.Error,
+    ):
+        return None
+
+
+class TTLCache:
+    """
+    A thread-safe TTL cache with a least recently used size limit.
+
+    With a `stale_ttl`, expired entries are kept for that many more seconds
+    and can still be read with `get_stale`, e.g. to serve a recent value
+    while the source of truth is unavailable.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl: int,
+        max_size: int,
+        enabled: bool = True,
+        stale_ttl: int = 0,
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.enabled = enabled
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._entries: OrderedDict[str, tuple[float, float, Any]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(key: str) -> str:
+        """Return the key an entry is stored under."""
+        return key
+
+    @staticmethod
+    def get_expiry(key: str) -> float | None:
+        """Return a UNIX timestamp an entry must not outlive, if any."""
+        return None
+
+    def get(self, key: str) -> Any | None:
+        """Return the cached value for a key, or `None` on a miss."""
+        if not self.enabled:
+            return None
+
+        key = self.make_key(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, stale_until, value = entry
+            now = time.time()
+            if expires_at <= now:
+                if stale_until <= now:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_stale(self, key: str) -> Any | None:
+        """
+        Return the cached value for a key even if it has expired, as long
+        as it is within its stale window, or `None` otherwise.
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(self.make_key(key))
+            if entry is None or entry[1] <= time.time():
+                return None
+
+            self.stale_hits += 1
+            return entry[2]
+
+    def set(self, key: str, value: Any, ttl: int | None = None) -> None:
+        """
+        Cache a value for a key.
+
+        The entry expires after `ttl` seconds (defaults to the cache TTL) or
+        at the expiry returned by `get_expiry`, whichever comes first. Its
+        stale window is capped by `get_expiry` as well.
+        """
+        if not self.enabled:
+            return
+
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        stale_until = expires_at + self.stale_ttl
+        expiry = self.get_expiry(key)
+        if expiry is not None:
+            expires_at = min(expires_at, expiry)
+            stale_until = min(stale_until, expiry)
+        if expires_at <= now:
+            return
+
+        key = self.make_key(key)
+        with self._lock:
+            self._entries[key] = (expires_at, stale_until, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        """Remove the cached value for a key, if any."""
+        with self._lock:
+            self._entries.pop(self.make_key(key), None)
+
+    def clear(self) -> None:
+        """Remove all entries and reset the hit and miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.stale_hits = 0
+
+    def stats(self) -> dict[str, int]:
+        """Return the hit and miss counters and the current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+                "size": len(self._entries),
+            }
+
+
+class TokenCache(TTLCache):
+    """
+    A `TTLCache` keyed by `Authorization` header values, whose entries never
+    outlive the token they belong to.
+    """
+
+    make_key = staticmethod(make_token_key)
+    get_expiry = staticmethod(get_token_expiry)
+
+
+class _Call:
+    """A call in flight whose result is shared by every waiting caller."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single call.
+
+    The first caller for a key runs the function, while every other caller
+    arriving before it returns waits for and shares its result (or
+    exception), so a burst of parallel requests with the same token only
+    hits the auth service once.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `func` once for all concurrent callers with the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces concurrent calls for the same key on an event loop into a
+    single call; the `asyncio` counterpart of `SingleFlight`.
+    """
+
+    def __init__(self):
+        self._calls: dict[tuple[int, str], asyncio.Future] = {}
+
+    async def do(self, key: str, func: Callable[..., Any], *args, **kwargs):
+        """Await `func` once for all concurrent callers with the same key."""
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)
+        future = self._calls.get(call_key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self._calls[call_key] = loop.create_future()
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else is waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[call_key]
+
+
+token_cache = TokenCache(
+    ttl=settings.TOKEN_CACHE_TTL,
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+    enabled=settings.TOKEN_CACHE_ENABLED,
+    stale_ttl=settings.AUTH_GRACE_PERIOD if settings.AUTH_GRACE_MODE else 0,
+)
+
+rejected_tokens = TTLCache(
+    ttl=settings.AUTH_REJECTED_TOKEN_TTL,
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+)
+
+token_validations = SingleFlight()
+async_token_validations = AsyncSingleFlight()
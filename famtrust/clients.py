@@ -0,0 +1,342 @@
+"""
+This module defines the HTTP client used to talk to the external auth
+service.
+
+All calls share one `requests.Session` per worker process, so TCP and TLS
+connections are pooled and kept alive between requests instead of being
+set up for every call. Every call has strict connect and read timeouts, and
+failed idempotent calls are retried a bounded number of times with
+exponential backoff and jitter.
+
+`async_auth_client` offers the same behaviour on top of a non-blocking
+`httpx.AsyncClient`, for code running on the ASGI event loop.
+
+Both clients share a circuit breaker: after `AUTH_CIRCUIT_FAILURE_THRESHOLD`
+consecutive failures, calls fail fast with `CircuitOpenError` for
+`AUTH_CIRCUIT_RESET_TIMEOUT` seconds, after which a single probe call is
+let through to decide whether the auth service has recovered.
+
+Example usage:
+
+```python
+
+from famtrust.clients import async_auth_client, auth_client
+
+response = auth_client.get("/v1/validate", token=token)
+response = await async_auth_client.get("/v1/validate", token=token)
+```
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_FACTOR = 0.1
+BACKOFF_JITTER = 0.1
+RETRY_STATUSES = (502, 503, 504)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of calling the auth service while the circuit is open.
+
+    It subclasses `ConnectionError`, so code handling failed calls to the
+    auth service handles it as well.
+    """
+
+
+class CircuitBreaker:
+    """
+    A thread-safe circuit breaker.
+
+    The circuit is `closed` while calls succeed. It opens after
+    `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds. It then becomes `half_open` and lets a single
+    probe call through: the circuit closes again if the probe succeeds and
+    re-opens if it fails.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self, *, name: str, failure_threshold: int, reset_timeout: float
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.transitions: dict[str, int] = {}
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raise `CircuitOpenError` if the call must not be made."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f"The {self.name} circuit is open")
+                self._transition(self.HALF_OPEN)
+
+            if self._probing:
+                raise CircuitOpenError(
+                    f"The {self.name} circuit is waiting for a probe call"
+                )
+            self._probing = True
+
+    def record_success(self) -> None:
+        """Record a successful call."""
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        """Record a failed call."""
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED
+                and self.failures >= self.failure_threshold
+            ):
+                self._opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+    def cancel_call(self) -> None:
+        """Forget a call that ended without a success or a failure."""
+        with self._lock:
+            self._probing = False
+
+    def _transition(self, state: str) -> None:
+        """Move to a new state and count the transition."""
+        transition = f"{self.state}_to_{state}"
+        self.transitions[transition] = self.transitions.get(transition, 0) + 1
+        logger.warning(
+            "The %s circuit moved from %s to %s",
+            self.name,
+            self.state,
+            state,
+        )
+        self.state = state
+
+    def stats(self) -> dict:
+        """Return the state of the circuit and its transition counters."""
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "transitions": dict(self.transitions),
+            }
+
+
+auth_breaker = CircuitBreaker(
+    name="auth service",
+    failure_threshold=settings.AUTH_CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=settings.AUTH_CIRCUIT_RESET_TIMEOUT,
+)
+
+
+class AuthServiceClient:
+    """A pooled, keep-alive HTTP client for the external auth service."""
+
+    def __init__(
+        self,
+        *,
+        connect_timeout: float,
+        read_timeout: float,
+        max_retries: int,
+        pool_size: int,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self._session: requests.Session | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        Return the session of the current process.
+
+        Connections must not be shared with the parent process after a
+        fork, so a new session is created whenever the PID changes.
+        """
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    self._session = self._create_session()
+                    self._pid = os.getpid()
+        return self._session
+
+    def _create_session(self) -> requests.Session:
+        """Create a session with a bounded connection pool and retries."""
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=self.max_retries,
+            status=self.max_retries,
+            backoff_factor=BACKOFF_FACTOR,
+            backoff_jitter=BACKOFF_JITTER,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=("GET", "HEAD"),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def get(self, path: str, *, token: str, **kwargs) -> requests.Response:
+        """Send a GET request to the auth service on behalf of a user."""
+        url = f"{settings.EXTERNAL_AUTH_URL}{path}"
+        headers = {"Authorization": token}
+
+        auth_breaker.before_call()
+        try:
+            response = self.session.get(
+                url=url, headers=headers, timeout=self.timeout, **kwargs
+            )
+        except requests.exceptions.RequestException:
+            auth_breaker.record_failure()
+            raise
+        except BaseException:
+            auth_breaker.cancel_call()
+            raise
+
+        if response.status_code >= 500:
+            auth_breaker.record_failure()
+        else:
+            auth_breaker.record_success()
+        return response
+
+
+class AsyncAuthServiceClient:
+    """A pooled, keep-alive, non-blocking client for the auth service."""
+
+    def __init__(
+        self,
+        *,
+        connect_timeout: float,
+        read_timeout: float,
+        max_retries: int,
+        pool_size: int,
+    ):
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self._clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Return the client of the running event loop.
+
+        Pooled connections belong to the loop that opened them, so every
+        loop gets a client of its own. The clients of closed loops are
+        dropped, so their connections are closed once they are garbage
+        collected. They are kept in a plain dict rather than one with weak
+        keys, as the connections of a client hold on to its loop.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            with self._lock:
+                for closed_loop in [
+                    other for other in self._clients if other.is_closed()
+                ]:
+                    del self._clients[closed_loop]
+                client = self._clients[loop] = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.pool_size,
+                        max_keepalive_connections=self.pool_size,
+                    ),
+                )
+        return client
+
+    async def get(self, path: str, *, token: str, **kwargs) -> httpx.Response:
+        """Send a GET request to the auth service on behalf of a user."""
+        url = f"{settings.EXTERNAL_AUTH_URL}{path}"
+        headers = {"Authorization": token}
+
+        auth_breaker.before_call()
+        try:
+            response = await self._get_with_retries(
+                url=url, headers=headers, **kwargs
+            )
+        except httpx.TransportError:
+            auth_breaker.record_failure()
+            raise
+        except BaseException:
+            auth_breaker.cancel_call()
+            raise
+
+        if response.status_code >= 500:
+            auth_breaker.record_failure()
+        else:
+            auth_breaker.record_success()
+        return response
+
+    async def _get_with_retries(self, *, url, headers, **kwargs):
+        """Send a GET request, retrying failed attempts with jitter."""
+        for attempt in range(self.max_retries + 1):
+            retries_left = attempt < self.max_retries
+            try:
+                response = await self.client.get(
+                    url=url, headers=headers, **kwargs
+                )
+            except httpx.TransportError:
+                if not retries_left:
+                    raise
+            else:
+                if (
+                    response.status_code not in RETRY_STATUSES
+                    or not retries_left
+                ):
+                    return response
+
+            await asyncio.sleep(
+                BACKOFF_FACTOR * (2**attempt)
+                + random.uniform(0, BACKOFF_JITTER)
+            )
+
+
+auth_client = AuthServiceClient(
+    connect_timeout=settings.AUTH_SERVICE_CONNECT_TIMEOUT,
+    read_timeout=settings.AUTH_SERVICE_READ_TIMEOUT,
+    max_retries=settings.AUTH_SERVICE_MAX_RETRIES,
+    pool_size=settings.AUTH_SERVICE_POOL_SIZE,
+)
+
+async_auth_client = AsyncAuthServiceClient(
+    connect_timeout=settings.AUTH_SERVICE_CONNECT_TIMEOUT,
+    read_timeout=settings.AUTH_SERVICE_READ_TIMEOUT,
+    max_retries=settings.AUTH_SERVICE_MAX_RETRIES,
+    pool_size=settings.AUTH_SERVICE_POOL_SIZE,
+)
@@ -0,0 +1,149 @@
+"""
+This module defines a directory of FamTrust users backed by the auth service.
+
+Looking up users one at a time costs one HTTP call per user. The directory
+resolves many user IDs at once instead: in a single call to the auth
+service's batch endpoint when `AUTH_SERVICE_USERS_BATCH_PATH` is set, or
+in parallel over a thread pool otherwise. Results are cached for
+`USER_DIRECTORY_TTL` seconds, and users that do not exist are remembered
+for `USER_DIRECTORY_NEGATIVE_TTL` seconds.
+
+Example usage:
+
+```python
+
+from famtrust.directory import user_directory
+
+users = user_directory.get_users(token=token, user_ids=[owner_id, user_id])
+if users[str(owner_id)] is None:
+    print("The owner does not exist")
+```
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
+
+import requests
+from django.conf import settings
+from rest_framework import status
+
+from famtrust import utils
+from famtrust.cache import TTLCache
+from famtrust.clients import auth_client
+from famtrust.models import User
+
+# Cached in place of users the auth service does not know about
+NOT_FOUND = object()
+
+
+class UserDirectory:
+    """Resolves user IDs to users in batches, with a TTL cache."""
+
+    def __init__(
+        self,
+        *,
+        ttl: int,
+        negative_ttl: int,
+        max_size: int,
+        max_workers: int,
+        batch_path: str | None = None,
+    ):
+        self.cache = TTLCache(ttl=ttl, max_size=max_size)
+        self.negative_ttl = negative_ttl
+        self.max_workers = max_workers
+        self.batch_path = batch_path
+
+    def get_user(self, *, token: str, user_id) -> User | None:
+        """Return a single user, or `None` if the user does not exist."""
+        return self.get_users(token=token, user_ids=[user_id])[str(user_id)]
+
+    def get_users(
+        self, *, token: str, user_ids: Iterable
+    ) -> dict[str, User | None]:
+        """
+        Return the users with the given IDs, keyed by the string form of
+        their ID. Users that do not exist are mapped to `None`.
+        """
+        users = {}
+        missing = []
+        for user_id in dict.fromkeys(str(user_id) for user_id in user_ids):
+            cached = self.cache.get(user_id)
+            if cached is None:
+                missing.append(user_id)
+            else:
+                users[user_id] = None if cached is NOT_FOUND else cached
+
+        if missing:
+            fetched = self._fetch_users(token=token, user_ids=missing)
+            for user_id in missing:
+                user = fetched.get(user_id)
+                if user is None:
+                    self.cache.set(user_id, NOT_FOUND, ttl=self.negative_ttl)
+                else:
+                    self.cache.set(user_id, user)
+                users[user_id] = user
+
+        return users
+
+    def _fetch_users(
+        self, *, token: str, user_ids: list[str]
+    ) -> dict[str, User | None]:
+        """Fetch users from the auth service."""
+        if self.batch_path and len(user_ids) > 1:
+            users = self._fetch_batch(token=token, user_ids=user_ids)
+            if users is not None:
+                return users
+
+        if len(user_ids) == 1:
+            return {
+                user_ids[0]: utils.fetch_user_data(
+                    token=token, user_id=user_ids[0]
+                )
+            }
+
+        workers = min(self.max_workers, len(user_ids))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            users = executor.map(
+                lambda user_id: utils.fetch_user_data(
+                    token=token, user_id=user_id
+                ),
+                user_ids,
+            )
+            return dict(zip(user_ids, users))
+
+    def _fetch_batch(
+        self, *, token: str, user_ids: list[str]
+    ) -> dict[str, User] | None:
+        """
+        Fetch users with a single call to the batch endpoint.
+
+        Returns `None` if the batch endpoint did not answer successfully, so
+        the users can be fetched one by one instead.
+        """
+        try:
+            response = auth_client.get(
+                f"/{settings.API_VERSION}{self.batch_path}",
+                token=token,
+                params={"ids": ",".join(user_ids)},
+            )
+        except requests.exceptions.RequestException as e:
+            raise utils.HTTPException(
+                detail="Auth service is unavailable, try again later.",
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            ) from e
+        if response.status_code != status.HTTP_200_OK:
+            return None
+
+        users = {}
+        for user_data in response.json().get("users", []):
+            users[str(user_data["id"])] = User.from_auth_data(user_data)
+        return users
+
+
+user_directory = UserDirectory(
+    ttl=settings.USER_DIRECTORY_TTL,
+    negative_ttl=settings.USER_DIRECTORY_NEGATIVE_TTL,
+    max_size=settings.USER_DIRECTORY_MAX_SIZE,
+    max_workers=settings.USER_DIRECTORY_MAX_WORKERS,
+    batch_path=settings.AUTH_SERVICE_USERS_BATCH_PATH,
+)
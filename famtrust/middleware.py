@@ -3,6 +3,10 @@ This module defines the middleware to perform user authentication
 verification. The user data is saved in the `request` object as a Pydantic
 model with the name `ft_user` (FamTrust user)
 
+The user is validated once per access token and cached with the token's
+cache entry, so requests that hit the cache reuse the same immutable user
+instead of validating it again.
+
 Example usage:
 
 ```python
@@ -16,85 +20,234 @@ if user.isAdmin:
 """
 import logging
 
+from django.conf import settings
 from django.http import JsonResponse
 from django.urls import reverse
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from rest_framework import status
 
-from famtrust import models, utils
+from famtrust import models, tokens, utils
+from famtrust.cache import (
+    async_token_validations,
+    make_token_key,
+    rejected_tokens,
+    token_cache,
+    token_validations,
+)
+from famtrust.clients import auth_breaker
+from famtrust.throttling import get_client_ip, invalid_attempts
 
 logger = logging.getLogger(__name__)
 
 
+class PublicRoutes:
+    """
+    Matches request paths against the routes that can be accessed without
+    authentication.
+
+    Routes are given as URL names or paths, and entries ending with `*`
+    match every path starting with them. The table is resolved once, so
+    matching a request is a set lookup plus a single prefix check.
+    """
+
+    def __init__(self, routes):
+        exact = set()
+        prefixes = []
+        for route in routes:
+            is_prefix = route.endswith("*")
+            route = route.removesuffix("*")
+            path = route if route.startswith("/") else reverse(route)
+            if is_prefix:
+                prefixes.append(path)
+            else:
+                exact.add(path.rstrip("/"))
+
+        self.exact = frozenset(exact)
+        self.prefixes = tuple(prefixes)
+
+    def match(self, path: str) -> bool:
+        """Return whether a path is a public route."""
+        return path.startswith(self.prefixes) or path.rstrip("/") in self.exact
+
+
 class ValidateUserMiddleware(MiddlewareMixin):
-    """Validates that the access token of a user is valid."""
+    """
+    Validates that the access token of a user is valid.
 
-    @staticmethod
-    def process_request(request):
-        """Validates that the access token of a user is valid."""
+    The middleware runs natively under both WSGI and ASGI. In an async
+    middleware chain the auth service is called through a non-blocking
+    client, so one worker can keep many token checks in flight instead of
+    serializing them in a thread-sensitive executor.
+    """
 
-        logger.debug("Processing request %s", request.path)
-        # Allow the API status documentation to be viewable without
-        # authentication
-        if request.path.startswith(reverse("admin:index")):
+    def process_request(self, request):
+        """Validates that the access token of a user is valid."""
+        if self.is_public_route(request):
             return
 
-        if request.path.startswith("/static") or request.path.startswith(
-            "/favicon"
-        ):
-            return
+        token = request.headers.get("Authorization")
+        if not token:
+            return self.unauthorized(_("Authorization token required"))
+
+        user = token_cache.get(token)
+        if user is None:
+            response = self.check_invalid_attempts(request, token)
+            if response:
+                return response
+
+            result = tokens.verify_token_locally(
+                token=token
+            ) or token_validations.do(
+                make_token_key(token), utils.is_valid_token, token=token
+            )
+            if result is None:
+                return self.handle_auth_service_unavailable(request, token)
 
-        allowed_routes = (
-            reverse("api-status"),
-            reverse("swagger"),
-            reverse("redoc"),
-            reverse("schema"),
-            reverse("api-root"),
-        )
-        if any(
-            path
-            for path in allowed_routes
-            if request.path.rstrip("/") == path.rstrip("/")
-        ):
+            user = self.get_validated_user(token, result)
+            if user is None:
+                rejected_tokens.set(make_token_key(token), True)
+                return self.reject_invalid_attempt(request, token)
+
+        request.ft_user = user
+
+    async def aprocess_request(self, request):
+        """Asynchronous version of `process_request`."""
+        if self.is_public_route(request):
             return
 
         token = request.headers.get("Authorization")
-
         if not token:
-            return JsonResponse(
-                data={
-                    "error": _("Authorization token required"),
-                    "status_code": status.HTTP_401_UNAUTHORIZED,
-                },
-                status=status.HTTP_401_UNAUTHORIZED,
+            return self.unauthorized(_("Authorization token required"))
+
+        user = token_cache.get(token)
+        if user is None:
+            response = self.check_invalid_attempts(request, token)
+            if response:
+                return response
+
+            result = await tokens.averify_token_locally(
+                token=token
+            ) or await async_token_validations.do(
+                make_token_key(token), utils.ais_valid_token, token=token
             )
+            if result is None:
+                return self.handle_auth_service_unavailable(request, token)
 
-        try:
-            valid_token, data = utils.is_valid_token(token=token)
-        except TypeError:
-            return JsonResponse(
-                data={
-                    "error": _("Invalid or expired token"),
-                    "status_code": status.HTTP_401_UNAUTHORIZED,
-                },
-                status=status.HTTP_401_UNAUTHORIZED,
+            user = self.get_validated_user(token, result)
+            if user is None:
+                rejected_tokens.set(make_token_key(token), True)
+                return self.reject_invalid_attempt(request, token)
+
+        request.ft_user = user
+
+    async def __acall__(self, request):
+        """Validate the access token without leaving the event loop."""
+        response = await self.aprocess_request(request)
+        return response or await self.get_response(request)
+
+    @cached_property
+    def public_routes(self) -> PublicRoutes:
+        """Return the routes that can be accessed without authentication."""
+        return PublicRoutes(settings.AUTH_PUBLIC_ROUTES)
+
+    def is_public_route(self, request) -> bool:
+        """Return whether a route can be accessed without authentication."""
+        logger.debug("Processing request %s", request.path)
+        return self.public_routes.match(request.path)
+
+    @classmethod
+    def check_invalid_attempts(cls, request, token):
+        """
+        Short-circuit repeated invalid attempts of a token without calling
+        the auth service: throttled tokens get a 429 and recently rejected
+        tokens a 401. The client IP is never checked here, so clients
+        sharing an IP can't keep each other's tokens from being validated.
+        """
+        if settings.AUTH_THROTTLE_ENABLED and not invalid_attempts.has_tokens(
+            f"token:{make_token_key(token)}"
+        ):
+            return cls.too_many_attempts()
+
+        if rejected_tokens.get(make_token_key(token)):
+            return cls.reject_invalid_attempt(request, token)
+
+    @classmethod
+    def reject_invalid_attempt(cls, request, token) -> JsonResponse:
+        """
+        Count an invalid attempt and return a 401 response, or a 429
+        response if the client IP is throttled.
+        """
+        if settings.AUTH_THROTTLE_ENABLED:
+            invalid_attempts.consume(f"token:{make_token_key(token)}")
+            if settings.AUTH_THROTTLE_PER_IP and not invalid_attempts.consume(
+                f"ip:{get_client_ip(request)}"
+            ):
+                return cls.too_many_attempts()
+        return cls.unauthorized(_("Invalid or expired token"))
+
+    @staticmethod
+    def too_many_attempts() -> JsonResponse:
+        """Return a 429 response."""
+        return JsonResponse(
+            data={
+                "error": _("Too many invalid attempts, try again later"),
+                "status_code": status.HTTP_429_TOO_MANY_REQUESTS,
+            },
+            status=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(invalid_attempts.retry_after)},
+        )
+
+    @staticmethod
+    def handle_auth_service_unavailable(request, token):
+        """
+        Authenticate the request with a recently validated token in grace
+        mode, or return a 503 response.
+        """
+        user = token_cache.get_stale(token)
+        if user is None:
+            logger.warning(
+                "Auth service unavailable, circuit: %s", auth_breaker.stats()
             )
-        if not valid_token:
             return JsonResponse(
                 data={
-                    "error": _("Invalid or expired token"),
-                    "status_code": status.HTTP_401_UNAUTHORIZED,
+                    "error": _("Auth service is unavailable, try again later"),
+                    "status_code": status.HTTP_503_SERVICE_UNAVAILABLE,
                 },
-                status=status.HTTP_401_UNAUTHORIZED,
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
             )
 
+        logger.info("Auth service unavailable, using a stale validation")
+        request.ft_user = user
+
+    @staticmethod
+    def get_validated_user(token, result) -> models.User | None:
+        """
+        Return the user of a token validation result and cache it, or
+        `None` if the token is invalid or expired.
+        """
+        valid_token, data = result
+        if not valid_token:
+            return None
+
         if not data:
             raise utils.HTTPException(
                 detail="Server error occurred",
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-        user_data = data.get("user")
-        admin = user_data.get("role").get("id") == "admin"
+        user = models.User.from_auth_data(data.get("user"))
+        token_cache.set(token, user)
+        logger.debug("Token cache stats: %s", token_cache.stats())
+        return user
 
-        request.ft_user = models.User(**user_data, isAdmin=admin)
+    @staticmethod
+    def unauthorized(error) -> JsonResponse:
+        """Return a 401 response with the given error."""
+        return JsonResponse(
+            data={
+                "error": error,
+                "status_code": status.HTTP_401_UNAUTHORIZED,
+            },
+            status=status.HTTP_401_UNAUTHORIZED,
+        )
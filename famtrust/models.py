@@ -4,17 +4,26 @@ from datetime import datetime
 from typing import List
 from uuid import UUID
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr
 
 
 class Role(BaseModel):
     """Role model for external auth service."""
+    model_config = ConfigDict(frozen=True)
+
     id: str
     permissions: List[str]
 
 
 class User(BaseModel):
-    """User model for external auth service."""
+    """
+    User model for external auth service.
+
+    Users are immutable, so a validated user can be cached and shared by
+    every request made with the same access token.
+    """
+    model_config = ConfigDict(frozen=True)
+
     id: UUID
     email: EmailStr
     role: Role
@@ -24,3 +33,9 @@ class User(BaseModel):
     isFrozen: bool
     lastLogin: datetime
     isAdmin: bool
+
+    @classmethod
+    def from_auth_data(cls, user_data: dict) -> "User":
+        """Validate the user data returned by the auth service."""
+        admin = user_data.get("role").get("id") == "admin"
+        return cls(**user_data, isAdmin=admin)
@@ -0,0 +1,240 @@
+"""
+This module defines query plans, which load the related objects a serializer
+renders together with the objects it serializes.
+
+A serializer declares the relations it needs through its fields: a nested
+serializer or a dotted `source` (e.g. `source_account.name`) over a foreign
+key is loaded with `select_related`, and a nested `many=True` serializer
+over a reverse or many-to-many relation is loaded with `prefetch_related`,
+with the plan of its own serializer. Rendering a page then takes a fixed
+number of queries, whatever the page size.
+
+A plan can also defer the columns no field reads, so narrowing the fields
+of a serializer (see `famtrust.serializers.SparseFieldsMixin`) narrows the
+`SELECT` and drops the joins of the relations left out.
+
+Example usage:
+
+```python
+
+from famtrust.query_plans import QueryPlanMixin
+
+
+class FundRequestViewSet(QueryPlanMixin, viewsets.ModelViewSet):
+    ...
+```
+"""
+
+from typing import NamedTuple, Sequence
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Model, Prefetch, QuerySet
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+class QueryPlan(NamedTuple):
+    """
+    The related objects to load with the objects of a serializer, and the
+    columns to load, or `None` to load every column.
+    """
+
+    select_related: tuple[str, ...] = ()
+    prefetch_related: tuple[Prefetch, ...] = ()
+    only: tuple[str, ...] | None = None
+
+    def prefixed(self, prefix: str) -> "QueryPlan":
+        """Return the plan for objects reached through a relation."""
+        return QueryPlan(
+            select_related=tuple(
+                f"{prefix}__{lookup}" for lookup in self.select_related
+            ),
+            prefetch_related=tuple(
+                Prefetch(
+                    f"{prefix}__{prefetch.prefetch_through}",
+                    queryset=prefetch.queryset,
+                )
+                for prefetch in self.prefetch_related
+            ),
+            only=(
+                None
+                if self.only is None
+                else tuple(f"{prefix}__{name}" for name in self.only)
+            ),
+        )
+
+    def apply(self, queryset: QuerySet) -> QuerySet:
+        """Load the related objects and columns of the plan."""
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.only is not None:
+            # The querysets of related managers set the object they belong
+            # to on the objects they load, through the foreign key
+            known = [field.name for field in queryset._known_related_objects]
+            queryset = queryset.only(*self.only, *known)
+        return queryset
+
+
+def get_forward_path(model: type[Model], attrs: Sequence[str]) -> list[str]:
+    """
+    Return the leading attributes of a source that follow foreign keys or
+    one-to-one relations, which can be loaded with `select_related`.
+    """
+    path = []
+    for attr in attrs:
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            break
+        if not (field.many_to_one or field.one_to_one):
+            break
+        path.append(attr)
+        model = field.related_model
+    return path
+
+
+def get_related_model(model: type[Model], attrs: Sequence[str]):
+    """Return the model at the end of a path of relations."""
+    for attr in attrs:
+        model = model._meta.get_field(attr).related_model
+    return model
+
+
+def get_query_plan(
+    serializer: serializers.BaseSerializer, *, defer_unused: bool = False
+) -> QueryPlan:
+    """
+    Return the query plan of the fields a serializer renders. With
+    `defer_unused`, the plan only loads the columns the fields read, unless
+    a field reads something other than a column (e.g. a property).
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    model = getattr(getattr(serializer, "Meta", None), "model", None)
+    if model is None:
+        return QueryPlan()
+
+    select_related = []
+    prefetch_related = []
+    only = [] if defer_unused else None
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == "*":
+            only = None
+            continue
+        attrs = field.source_attrs
+
+        if isinstance(field, serializers.ListSerializer):
+            path = get_forward_path(model, attrs[:-1])
+            if len(path) < len(attrs) - 1:
+                only = None
+                continue
+            try:
+                relation = get_related_model(model, path)._meta.get_field(
+                    attrs[-1]
+                )
+            except FieldDoesNotExist:
+                only = None
+                continue
+            if not (relation.one_to_many or relation.many_to_many):
+                only = None
+                continue
+            child = get_query_plan(field.child, defer_unused=defer_unused)
+            if relation.one_to_many and child.only is not None:
+                # Prefetched objects are matched to theirs by this key
+                child = child._replace(
+                    only=(*child.only, relation.field.name)
+                )
+            queryset = child.apply(
+                relation.related_model._default_manager.all()
+            )
+            if relation.one_to_many and hasattr(
+                field, "get_prefetch_queryset"
+            ):
+                queryset = field.get_prefetch_queryset(
+                    queryset, related_field=relation.field.name
+                )
+            prefetch_related.append(
+                Prefetch("__".join(attrs), queryset=queryset)
+            )
+            if path and only is not None:
+                only.append(path[0])
+            continue
+
+        if isinstance(field, serializers.BaseSerializer):
+            path = get_forward_path(model, attrs)
+            if len(path) < len(attrs):
+                only = None
+                continue
+            lookup = "__".join(path)
+            select_related.append(lookup)
+            nested = get_query_plan(
+                field, defer_unused=defer_unused
+            ).prefixed(lookup)
+            select_related += nested.select_related
+            prefetch_related += nested.prefetch_related
+            if only is not None and nested.only is not None:
+                only += [lookup, *nested.only]
+            else:
+                only = None
+            continue
+
+        path = get_forward_path(model, attrs[:-1])
+        if path:
+            select_related.append("__".join(path))
+        if only is None:
+            continue
+        try:
+            if len(path) < len(attrs) - 1:
+                raise FieldDoesNotExist
+            column = get_related_model(model, path)._meta.get_field(
+                attrs[-1]
+            )
+        except FieldDoesNotExist:
+            only = None
+            continue
+        if not column.concrete:
+            only = None
+            continue
+        only += [*(["__".join(path)] if path else []), "__".join(attrs)]
+
+    return QueryPlan(
+        tuple(select_related),
+        tuple(prefetch_related),
+        None if only is None else tuple(dict.fromkeys(only)),
+    )
+
+
+def apply_query_plan(
+    queryset: QuerySet,
+    serializer: serializers.BaseSerializer,
+    *,
+    defer_unused: bool = False,
+) -> QuerySet:
+    """Load the related objects a serializer renders with a queryset."""
+    return get_query_plan(serializer, defer_unused=defer_unused).apply(
+        queryset
+    )
+
+
+class QueryPlanMixin:
+    """
+    Applies the query plan of the serializer of a view to the querysets it
+    lists and retrieves objects from.
+    """
+
+    def filter_queryset(self, queryset):
+        """
+        Filter a queryset and load what its serializer renders. The objects
+        of safe (read-only) requests are only loaded with the columns that
+        are rendered.
+        """
+        queryset = super().filter_queryset(queryset)
+        return apply_query_plan(
+            queryset,
+            self.get_serializer(),
+            defer_unused=self.request.method in SAFE_METHODS,
+        )
@@ -43,7 +43,11 @@ class CustomJSONRenderer(JSONRenderer):
         else:
             action = "processed"
 
-        basename = getattr(view, "basename", None)
+        # Actions rendering another collection than their viewset's name it
+        # with `envelope_name`, e.g. the fund requests of a family account
+        basename = getattr(view, "envelope_name", None) or getattr(
+            view, "basename", None
+        )
         if not basename and hasattr(view, "get_queryset"):
             basename = view.get_queryset().model.__name__.lower()
         if not basename:
@@ -84,7 +88,9 @@ class CustomJSONRenderer(JSONRenderer):
 
         if data:
             temp = data.get("data", {})
-            if isinstance(temp, list):
+            # Paginated responses carry the metadata of the page with their
+            # data, which is a list, or a mapping of lists (e.g. accounts)
+            if isinstance(temp, (list, dict)) and "metadata" in data:
                 response_data["metadata"] = data.get("metadata", None)
             if status_code < 400:
                 response_data[data_name] = data.pop("data", data)
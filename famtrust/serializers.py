@@ -0,0 +1,167 @@
+"""
+This module defines the serializer mixins and fields shared by the apps.
+
+Example usage:
+
+```python
+
+from famtrust.serializers import (
+    CappedListSerializer,
+    ExpandableFieldsMixin,
+    SparseFieldsMixin,
+)
+
+
+class FamilyAccountSerializer(
+    SparseFieldsMixin, ExpandableFieldsMixin, serializers.ModelSerializer
+):
+    fund_requests = CappedListSerializer(
+        child=FundRequestInFamilyAccountSerializer(),
+        url_name="family-account-fund-requests",
+        read_only=True,
+    )
+    family_group = FamilyGroupSummarySerializer(read_only=True)
+
+    class Meta:
+        model = FamilyAccount
+        fields = "__all__"
+        expandable_fields = ("fund_requests", "family_group")
+```
+"""
+
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.reverse import reverse
+
+
+class CappedListSerializer(serializers.ListSerializer):
+    """
+    Renders the most recent items of a nested collection over a reverse
+    foreign key, up to `EXPANDED_COLLECTION_LIMIT`, with a link to the
+    paginated collection. The link is reversed from `url_name` with the
+    primary key of the object the collection belongs to.
+    """
+
+    ordering = ("-created_at", "-id")
+
+    def __init__(self, *args, url_name: str, **kwargs):
+        self.url_name = url_name
+        super().__init__(*args, **kwargs)
+
+    def get_prefetch_queryset(self, queryset, *, related_field: str):
+        """
+        Limit the collections prefetched for many objects at once to their
+        most recent items, ranking the items of each object in SQL.
+        """
+        return (
+            queryset.annotate(
+                collection_position=Window(
+                    RowNumber(),
+                    partition_by=F(related_field),
+                    order_by=self.ordering,
+                )
+            )
+            .filter(
+                collection_position__lte=settings.EXPANDED_COLLECTION_LIMIT
+            )
+            .order_by(*self.ordering)
+        )
+
+    def to_representation(self, data):
+        """Render the most recent items and the link to the collection."""
+        queryset = data.all()
+        # A prefetched collection is already limited by its query plan
+        if queryset._result_cache is None:
+            queryset = queryset.order_by(*self.ordering)[
+                : settings.EXPANDED_COLLECTION_LIMIT
+            ]
+        return {
+            "results": super().to_representation(queryset),
+            "url": reverse(
+                self.url_name,
+                kwargs={"pk": data.instance.pk},
+                request=self.context.get("request"),
+            ),
+        }
+
+
+def get_requested_names(serializer, query_param: str) -> set[str]:
+    """
+    Return the comma-separated field names of a query parameter of the
+    request a serializer renders.
+    """
+    request = serializer.context.get("request")
+    if request is None:
+        return set()
+    value = request.query_params.get(query_param, "")
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+class ExpandableFieldsMixin:
+    """
+    Leaves out the nested fields listed in `Meta.expandable_fields` unless
+    they are requested with `?expand=` (e.g. `?expand=fund_requests`).
+    Nested collections are then left out of the response, and other nested
+    objects are rendered as their primary key.
+    """
+
+    expand_query_param = "expand"
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expanded = get_requested_names(self, self.expand_query_param)
+        for name in getattr(self.Meta, "expandable_fields", ()):
+            if name in expanded or name not in fields:
+                continue
+            field = fields.pop(name)
+            if not isinstance(field, serializers.ListSerializer):
+                fields[name] = serializers.PrimaryKeyRelatedField(
+                    source=field.source, read_only=True
+                )
+        return fields
+
+
+class SparseFieldsMixin:
+    """
+    Renders only the fields requested with `?fields=` (e.g.
+    `?fields=id,name,balance`) and leaves out those requested with
+    `?exclude=`, in the responses of safe (read-only) requests. Unknown
+    names are ignored.
+
+    Only the serializer of the response is narrowed, not the serializers
+    nested in it, and the query plan of the view (see
+    `famtrust.query_plans`) only loads the columns and joins the relations
+    of the fields left.
+    """
+
+    fields_query_param = "fields"
+    exclude_query_param = "exclude"
+
+    def is_root(self) -> bool:
+        """Return whether the serializer renders the response itself."""
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if (
+            request is None
+            or request.method not in SAFE_METHODS
+            or not self.is_root()
+        ):
+            return fields
+
+        selected = get_requested_names(self, self.fields_query_param)
+        excluded = get_requested_names(self, self.exclude_query_param)
+        for name, field in list(fields.items()):
+            if field.write_only:
+                continue
+            if (selected and name not in selected) or name in excluded:
+                del fields[name]
+        return fields
@@ -26,6 +26,7 @@ INSTALLED_APPS = [
     "accounts",
     "family_memberships",
     "transactions",
+    "idempotency",
     "drf_spectacular",
     "drf_spectacular_sidecar",
     "corsheaders",
@@ -39,9 +40,14 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
 ]
 
+# WhiteNoise only supports WSGI. Under ASGI a sync-only middleware would
+# force every request through a single thread, so static files are served
+# by the ASGI application (see `famtrust/asgi.py`) instead.
+ASGI = os.environ.get("FAMTRUST_ASGI") == "True"
+
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    *([] if ASGI else ["whitenoise.middleware.WhiteNoiseMiddleware"]),
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -158,6 +164,15 @@ try:
 except TypeError:
     PAGE_SIZE = 25
 
+# The number of most recent items rendered in a nested collection expanded
+# with `?expand=`
+try:
+    EXPANDED_COLLECTION_LIMIT = int(
+        os.environ.get("EXPANDED_COLLECTION_LIMIT")
+    )
+except (TypeError, ValueError):
+    EXPANDED_COLLECTION_LIMIT = 5
+
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": ("famtrust.renderers.CustomJSONRenderer",),
     "EXCEPTION_HANDLER": "famtrust.utils.custom_exception_handler",
@@ -214,3 +229,231 @@ SPECTACULAR_SETTINGS = {
 }
 
 EXTERNAL_AUTH_URL = os.environ.get("EXTERNAL_AUTH_URL")
+
+# Routes that can be accessed without an access token, given as URL names or
+# paths. Entries ending with `*` match every path starting with them. Apps
+# with public routes of their own register them here.
+AUTH_PUBLIC_ROUTES = [
+    "admin:index*",
+    "/static*",
+    "/favicon*",
+    "api-status",
+    "swagger",
+    "redoc",
+    "schema",
+    "api-root",
+]
+
+# Timeouts (in seconds), retries and connection pool size of the client used
+# to call the auth service.
+try:
+    AUTH_SERVICE_CONNECT_TIMEOUT = float(
+        os.environ.get("AUTH_SERVICE_CONNECT_TIMEOUT")
+    )
+except (TypeError, ValueError):
+    AUTH_SERVICE_CONNECT_TIMEOUT = 1.0
+
+try:
+    AUTH_SERVICE_READ_TIMEOUT = float(
+        os.environ.get("AUTH_SERVICE_READ_TIMEOUT")
+    )
+except (TypeError, ValueError):
+    AUTH_SERVICE_READ_TIMEOUT = 3.0
+
+try:
+    AUTH_SERVICE_MAX_RETRIES = int(os.environ.get("AUTH_SERVICE_MAX_RETRIES"))
+except (TypeError, ValueError):
+    AUTH_SERVICE_MAX_RETRIES = 2
+
+try:
+    AUTH_SERVICE_POOL_SIZE = int(os.environ.get("AUTH_SERVICE_POOL_SIZE"))
+except (TypeError, ValueError):
+    AUTH_SERVICE_POOL_SIZE = 10
+
+# Fail fast once the auth service keeps failing, and optionally keep serving
+# recently validated tokens from the token cache (for up to AUTH_GRACE_PERIOD
+# seconds past their TTL) while it is unavailable.
+try:
+    AUTH_CIRCUIT_FAILURE_THRESHOLD = int(
+        os.environ.get("AUTH_CIRCUIT_FAILURE_THRESHOLD")
+    )
+except (TypeError, ValueError):
+    AUTH_CIRCUIT_FAILURE_THRESHOLD = 5
+
+try:
+    AUTH_CIRCUIT_RESET_TIMEOUT = float(
+        os.environ.get("AUTH_CIRCUIT_RESET_TIMEOUT")
+    )
+except (TypeError, ValueError):
+    AUTH_CIRCUIT_RESET_TIMEOUT = 30.0
+
+AUTH_GRACE_MODE = os.environ.get("AUTH_GRACE_MODE") == "True"
+
+try:
+    AUTH_GRACE_PERIOD = int(os.environ.get("AUTH_GRACE_PERIOD"))
+except (TypeError, ValueError):
+    AUTH_GRACE_PERIOD = 300
+
+# Look up users in batches and cache them (including users that do not
+# exist). When the auth service has a batch endpoint, set
+# AUTH_SERVICE_USERS_BATCH_PATH to its path (e.g. `/users/batch`); it is
+# called with the user IDs in an `ids` query parameter and must answer with
+# `{"users": [...]}`. Otherwise users are fetched in parallel.
+AUTH_SERVICE_USERS_BATCH_PATH = os.environ.get("AUTH_SERVICE_USERS_BATCH_PATH")
+
+try:
+    USER_DIRECTORY_TTL = int(os.environ.get("USER_DIRECTORY_TTL"))
+except (TypeError, ValueError):
+    USER_DIRECTORY_TTL = 300
+
+try:
+    USER_DIRECTORY_NEGATIVE_TTL = int(
+        os.environ.get("USER_DIRECTORY_NEGATIVE_TTL")
+    )
+except (TypeError, ValueError):
+    USER_DIRECTORY_NEGATIVE_TTL = 30
+
+try:
+    USER_DIRECTORY_MAX_SIZE = int(os.environ.get("USER_DIRECTORY_MAX_SIZE"))
+except (TypeError, ValueError):
+    USER_DIRECTORY_MAX_SIZE = 10_000
+
+try:
+    USER_DIRECTORY_MAX_WORKERS = int(
+        os.environ.get("USER_DIRECTORY_MAX_WORKERS")
+    )
+except (TypeError, ValueError):
+    USER_DIRECTORY_MAX_WORKERS = 8
+
+# Cache the result of validating an access token with the auth service so a
+# client only gets validated once per TTL window instead of once per request.
+TOKEN_CACHE_ENABLED = os.environ.get("TOKEN_CACHE_ENABLED", "True") == "True"
+
+try:
+    TOKEN_CACHE_TTL = int(os.environ.get("TOKEN_CACHE_TTL"))
+except (TypeError, ValueError):
+    TOKEN_CACHE_TTL = 60
+
+try:
+    TOKEN_CACHE_MAX_SIZE = int(os.environ.get("TOKEN_CACHE_MAX_SIZE"))
+except (TypeError, ValueError):
+    TOKEN_CACHE_MAX_SIZE = 10_000
+
+# Remember rejected tokens for AUTH_REJECTED_TOKEN_TTL seconds, and answer
+# with a 429 once a token has made more than AUTH_THROTTLE_BURST invalid
+# attempts (refilled at AUTH_THROTTLE_RATE attempts per second). With
+# AUTH_THROTTLE_PER_IP, client IPs are throttled the same way, but only once
+# their token has been rejected: behind a proxy that hides the client IP,
+# every client would otherwise share one bucket.
+try:
+    AUTH_REJECTED_TOKEN_TTL = int(os.environ.get("AUTH_REJECTED_TOKEN_TTL"))
+except (TypeError, ValueError):
+    AUTH_REJECTED_TOKEN_TTL = 30
+
+AUTH_THROTTLE_ENABLED = (
+    os.environ.get("AUTH_THROTTLE_ENABLED", "True") == "True"
+)
+AUTH_THROTTLE_PER_IP = os.environ.get("AUTH_THROTTLE_PER_IP") == "True"
+AUTH_THROTTLE_TRUST_X_FORWARDED_FOR = (
+    os.environ.get("AUTH_THROTTLE_TRUST_X_FORWARDED_FOR") == "True"
+)
+
+try:
+    AUTH_THROTTLE_BURST = int(os.environ.get("AUTH_THROTTLE_BURST"))
+except (TypeError, ValueError):
+    AUTH_THROTTLE_BURST = 10
+
+try:
+    AUTH_THROTTLE_RATE = float(os.environ.get("AUTH_THROTTLE_RATE"))
+except (TypeError, ValueError):
+    AUTH_THROTTLE_RATE = 0.2
+
+# Verify signed access tokens locally with the auth service's public key
+# (a PEM file or a JWKS document) instead of calling its validate endpoint.
+AUTH_JWT_LOCAL_VERIFICATION = (
+    os.environ.get("AUTH_JWT_LOCAL_VERIFICATION") == "True"
+)
+AUTH_JWT_KEY_FILE = os.environ.get("AUTH_JWT_KEY_FILE")
+AUTH_JWT_ALGORITHMS = os.environ.get("AUTH_JWT_ALGORITHMS", "RS256").split(",")
+AUTH_JWT_AUDIENCE = os.environ.get("AUTH_JWT_AUDIENCE")
+AUTH_JWT_ISSUER = os.environ.get("AUTH_JWT_ISSUER")
+
+try:
+    AUTH_JWT_KEY_REFRESH_INTERVAL = int(
+        os.environ.get("AUTH_JWT_KEY_REFRESH_INTERVAL")
+    )
+except (TypeError, ValueError):
+    AUTH_JWT_KEY_REFRESH_INTERVAL = 300
+
+# Retry a transfer up to TRANSFER_MAX_RETRIES times when the database aborts
+# it because of a serialization failure or a deadlock.
+try:
+    TRANSFER_MAX_RETRIES = int(os.environ.get("TRANSFER_MAX_RETRIES"))
+except (TypeError, ValueError):
+    TRANSFER_MAX_RETRIES = 3
+
+# Maximum number of transactions accepted by the bulk transactions endpoint,
+# and the number of transactions validated and written per batch.
+try:
+    TRANSACTIONS_BULK_MAX_SIZE = int(
+        os.environ.get("TRANSACTIONS_BULK_MAX_SIZE")
+    )
+except (TypeError, ValueError):
+    TRANSACTIONS_BULK_MAX_SIZE = 5000
+
+try:
+    TRANSACTIONS_BULK_BATCH_SIZE = int(
+        os.environ.get("TRANSACTIONS_BULK_BATCH_SIZE")
+    )
+except (TypeError, ValueError):
+    TRANSACTIONS_BULK_BATCH_SIZE = 500
+
+# The number of transactions read and sent at a time by exports
+try:
+    TRANSACTIONS_EXPORT_CHUNK_SIZE = int(
+        os.environ.get("TRANSACTIONS_EXPORT_CHUNK_SIZE")
+    )
+except (TypeError, ValueError):
+    TRANSACTIONS_EXPORT_CHUNK_SIZE = 2000
+
+# Leave transactions from or to a bank or a mobile wallet pending, to be
+# settled by the `settle_transactions` worker in batches of
+# TRANSACTIONS_SETTLEMENT_BATCH_SIZE, instead of settling them in the request.
+TRANSACTIONS_ASYNC_SETTLEMENT = (
+    os.environ.get("TRANSACTIONS_ASYNC_SETTLEMENT") == "True"
+)
+
+try:
+    TRANSACTIONS_SETTLEMENT_BATCH_SIZE = int(
+        os.environ.get("TRANSACTIONS_SETTLEMENT_BATCH_SIZE")
+    )
+except (TypeError, ValueError):
+    TRANSACTIONS_SETTLEMENT_BATCH_SIZE = 100
+
+# Store the response of a request made with an Idempotency-Key header for
+# IDEMPOTENCY_KEY_TTL seconds, and make a retry wait up to
+# IDEMPOTENCY_WAIT_TIMEOUT seconds for the response of a request with the
+# same key that is still in flight. A request holds a lease on its key,
+# which it renews every third of IDEMPOTENCY_LOCK_TIMEOUT seconds while it is
+# processed: if it isn't renewed in time, e.g. because its worker crashed, a
+# retry takes the key over and is processed. Keep it above the request
+# timeout of the server (gunicorn's --timeout, 30 seconds by default), so a
+# worker that is only slow is never taken for a lost one.
+try:
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL"))
+except (TypeError, ValueError):
+    IDEMPOTENCY_KEY_TTL = 86_400
+
+try:
+    IDEMPOTENCY_WAIT_TIMEOUT = float(
+        os.environ.get("IDEMPOTENCY_WAIT_TIMEOUT")
+    )
+except (TypeError, ValueError):
+    IDEMPOTENCY_WAIT_TIMEOUT = 10.0
+
+try:
+    IDEMPOTENCY_LOCK_TIMEOUT = float(
+        os.environ.get("IDEMPOTENCY_LOCK_TIMEOUT")
+    )
+except (TypeError, ValueError):
+    IDEMPOTENCY_LOCK_TIMEOUT = 60.0
@@ -0,0 +1,359 @@
+"""
+This module defines helpers for the test suites of the apps: a stub of the
+external auth service that counts the calls it gets, and a test case mixin
+that points the API at the stub and authenticates the test client. It also
+defines factories of the accounts most tests need, and a mixin creating a
+family account with a sub account for every test.
+
+Example usage:
+
+```python
+
+from django.test import TestCase
+
+from famtrust.testing import FamilyAccountMixin, StubAuthServiceMixin
+
+
+class FamilyAccountTests(StubAuthServiceMixin, TestCase):
+    def test_list(self):
+        response = self.client.get("/api/v1/family-accounts/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.auth_service.calls["validate"], 1)
+
+
+class SubAccountTests(FamilyAccountMixin, StubAuthServiceMixin, TestCase):
+    sub_account_balance = 30
+
+    def test_retrieve(self):
+        response = self.client.get(
+            f"/api/v1/sub-accounts/{self.sub_account.id}/"
+        )
+        self.assertEqual(response.status_code, 200)
+```
+"""
+
+import json
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from django.test import override_settings
+
+from accounts.models import FamilyAccount, SubAccount
+from family_memberships.models import FamilyGroup, FamilyMembership
+from transactions.models import (
+    Transaction,
+    TransactionDirectionEnum,
+    TransactionTypeEnum,
+)
+from famtrust.cache import rejected_tokens, token_cache
+from famtrust.directory import user_directory
+from famtrust.throttling import invalid_attempts
+
+
+class StubAuthServer(ThreadingHTTPServer):
+    """A threaded HTTP server that accepts bursts of connections."""
+
+    daemon_threads = True
+    request_queue_size = 512
+
+    def handle_error(self, request, client_address):
+        """Ignore clients that stopped waiting, e.g. after a timeout."""
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubAuthService:
+    """
+    A local HTTP server answering the auth service's `validate`, user and
+    `users/batch` endpoints for the users added to it, after `latency`
+    seconds. Use `fail` to make it answer with an error instead.
+    """
+
+    def __init__(self, *, latency: float = 0.0):
+        self.latency = latency
+        self.users: dict[str, dict] = {}
+        self.error_status: int | None = None
+        self.errors_left: int | None = None
+        self.calls: Counter[str] = Counter()
+        self.validations: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._server: StubAuthServer | None = None
+
+    @property
+    def url(self) -> str:
+        """Return the base URL of the running server."""
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> None:
+        """Serve requests in a background thread."""
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status_code, body = service.handle(
+                    self.path, self.headers.get("Authorization", "")
+                )
+                content = json.dumps(body).encode()
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = StubAuthServer(("127.0.0.1", 0), Handler)
+        threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        ).start()
+
+    def stop(self) -> None:
+        """Stop the server."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self) -> None:
+        """Forget the users and the call counters."""
+        with self._lock:
+            self.users.clear()
+            self.calls.clear()
+            self.validations.clear()
+            self.error_status = None
+            self.errors_left = None
+
+    def fail(self, *, status_code: int = 503, times: int | None = None):
+        """
+        Answer the next `times` calls, or every call until the service is
+        reset, with an error.
+        """
+        with self._lock:
+            self.error_status = status_code
+            self.errors_left = times
+
+    def add_user(
+        self, *, admin: bool = False, token: str | None = None
+    ) -> tuple[str, dict]:
+        """
+        Add a user and return its `Authorization` header and data. A random
+        token is made up unless one is given.
+        """
+        user = {
+            "id": str(uuid.uuid4()),
+            "email": "user@example.com",
+            "role": {"id": "admin" if admin else "member", "permissions": []},
+            "defaultGroup": str(uuid.uuid4()),
+            "has2FA": False,
+            "isVerified": True,
+            "isFrozen": False,
+            "lastLogin": "2024-01-01T00:00:00Z",
+        }
+        token = token or f"Bearer {uuid.uuid4().hex}"
+        with self._lock:
+            self.users[token] = user
+        return token, user
+
+    def handle(self, path: str, token: str) -> tuple[int, dict]:
+        """Return the status code and body of a response."""
+        time.sleep(self.latency)
+        path, _, query = path.partition("?")
+        path = path.rstrip("/")
+        if path.endswith("/validate"):
+            endpoint = "validate"
+        elif path.endswith("/users/batch"):
+            endpoint = "batch"
+        else:
+            endpoint = "users"
+
+        with self._lock:
+            users_by_id = {user["id"]: user for user in self.users.values()}
+            self.calls[endpoint] += 1
+            if endpoint == "validate":
+                self.validations[token] += 1
+
+            if self.error_status is not None and self.errors_left != 0:
+                if self.errors_left is not None:
+                    self.errors_left -= 1
+                return self.error_status, {"error": "Service unavailable"}
+
+            if endpoint == "validate":
+                user = self.users.get(token)
+                if user is None:
+                    return 401, {"error": "Invalid or expired token"}
+                return 200, {"user": user}
+
+            if endpoint == "batch":
+                user_ids = parse_qs(query).get("ids", [""])[0].split(",")
+                return 200, {
+                    "users": [
+                        users_by_id[user_id]
+                        for user_id in user_ids
+                        if user_id in users_by_id
+                    ]
+                }
+
+            user = users_by_id.get(path.rsplit("/", 1)[-1])
+            if user is None:
+                return 404, {"error": "User not found"}
+            return 200, {"user": user}
+
+
+def reset_auth_state() -> None:
+    """Clear the in-process caches and throttles of the auth middleware."""
+    token_cache.clear()
+    rejected_tokens.clear()
+    invalid_attempts.clear()
+    user_directory.cache.clear()
+
+
+class StubAuthServiceMixin:
+    """
+    Runs a `StubAuthService` for the test case and authenticates the test
+    client as `self.user` with `self.token`. Set `auth_latency` to slow the
+    stub down.
+    """
+
+    auth_latency = 0.0
+
+    @classmethod
+    def setUpClass(cls):
+        cls.auth_service = StubAuthService(latency=cls.auth_latency)
+        cls.auth_service.start()
+        cls.addClassCleanup(cls.auth_service.stop)
+        auth_settings = override_settings(
+            EXTERNAL_AUTH_URL=cls.auth_service.url
+        )
+        auth_settings.enable()
+        cls.addClassCleanup(auth_settings.disable)
+        super().setUpClass()
+
+    def setUp(self):
+        super().setUp()
+        reset_auth_state()
+        self.auth_service.reset()
+        self.token, self.user = self.auth_service.add_user()
+        self.client.defaults["HTTP_AUTHORIZATION"] = self.token
+
+    def authenticate(self, *, admin: bool = False) -> dict:
+        """Authenticate the test client as a new user and return it."""
+        self.token, self.user = self.auth_service.add_user(admin=admin)
+        self.client.defaults["HTTP_AUTHORIZATION"] = self.token
+        return self.user
+
+    def assert_list_queries(
+        self,
+        path: str,
+        num: int,
+        *,
+        key: str,
+        page_sizes=(2, 10),
+        **params,
+    ) -> None:
+        """
+        Assert that a full page of a list endpoint, requested with the
+        query parameters `params`, takes `num` queries at every page size,
+        i.e. that rendering an object takes no query of its own. There must
+        be more objects to list than the largest page.
+        """
+        for page_size in page_sizes:
+            with self.subTest(page_size=page_size):
+                with self.assertNumQueries(num):
+                    response = self.client.get(
+                        path, data={**params, "page_size": page_size}
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()[key]), page_size)
+
+
+def create_family_account(
+    *, owner_id, balance=0, name: str = "Family"
+) -> FamilyAccount:
+    """
+    Create a family account in a new family group of a user, funded with a
+    deposit from a bank, so its ledger matches its balance.
+    """
+    family_group = FamilyGroup.objects.create(
+        name=f"{name} group", description=name, owner_id=owner_id
+    )
+    FamilyMembership.objects.create(
+        user_id=owner_id, family_group=family_group
+    )
+    family_account = FamilyAccount.objects.create(
+        name=name, family_group=family_group, created_by=owner_id
+    )
+    if balance:
+        Transaction.objects.create(
+            user_id=owner_id,
+            amount=balance,
+            transaction_type=TransactionTypeEnum.SAVINGS,
+            transaction_direction=(
+                TransactionDirectionEnum.BANK_TO_FAMILY_ACCOUNT
+            ),
+            family_destination_account=family_account,
+            details="Deposit",
+        )
+        family_account.refresh_from_db()
+    return family_account
+
+
+def create_sub_account(
+    *, family_account: FamilyAccount, owner_id, balance=0, name: str = "Sub"
+) -> SubAccount:
+    """
+    Create a sub account of a family account for a user, funded with a
+    transfer from the family account.
+    """
+    sub_account = SubAccount.objects.create(
+        name=name,
+        family_account=family_account,
+        owner_id=owner_id,
+        created_by=owner_id,
+    )
+    if balance:
+        Transaction.objects.create(
+            user_id=owner_id,
+            amount=balance,
+            transaction_type=TransactionTypeEnum.TRANSFERS,
+            transaction_direction=(
+                TransactionDirectionEnum.FAMILY_ACCOUNT_TO_SUB_ACCOUNT
+            ),
+            family_source_account=family_account,
+            sub_destination_account=sub_account,
+            details="Allowance",
+        )
+        sub_account.refresh_from_db()
+        family_account.refresh_from_db()
+    return sub_account
+
+
+class FamilyAccountMixin:
+    """
+    Creates `self.family_account`, funded with `family_account_balance`, and
+    `self.sub_account` in it, funded with `sub_account_balance`, before every
+    test. Both are owned by `self.user_id`: the authenticated user when the
+    mixin is listed before `StubAuthServiceMixin`, or a new ID otherwise.
+    """
+
+    family_account_balance = 100
+    sub_account_balance = 0
+
+    def setUp(self):
+        super().setUp()
+        user = getattr(self, "user", None)
+        self.user_id = uuid.uuid4() if user is None else user["id"]
+        self.family_account = create_family_account(
+            owner_id=self.user_id, balance=self.family_account_balance
+        )
+        self.sub_account = create_sub_account(
+            family_account=self.family_account,
+            owner_id=self.user_id,
+            balance=self.sub_account_balance,
+        )
@@ -0,0 +1,678 @@
+import asyncio
+import gc
+import tempfile
+import threading
+import weakref
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import jwt
+from asgiref.sync import async_to_sync
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.conf import settings
+from django.test import (
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+
+from family_memberships.models import FamilyGroup, FamilyMembership
+from famtrust import clients, tokens, utils
+from famtrust.cache import TokenCache, TTLCache, token_cache
+from famtrust.clients import (
+    AsyncAuthServiceClient,
+    AuthServiceClient,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+from famtrust.directory import UserDirectory, user_directory
+from famtrust.models import User
+from famtrust.testing import StubAuthServiceMixin
+from famtrust.validators import BaseValidatorMixin
+
+USER_CLAIMS = {
+    "id": "11111111-1111-1111-1111-111111111111",
+    "email": "user@example.com",
+    "role": {"id": "member", "permissions": []},
+    "defaultGroup": "22222222-2222-2222-2222-222222222222",
+    "has2FA": False,
+    "isVerified": True,
+    "isFrozen": False,
+    "lastLogin": "2024-01-01T00:00:00Z",
+}
+
+
+class FakeClock:
+    """A clock that only moves when told to, for patching `time`."""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def make_expiring_token(*, exp):
+    """Return an `Authorization` header with a JWT expiring at `exp`."""
+    return f"Bearer {jwt.encode({'exp': int(exp)}, 'secret')}"
+
+
+class TokenCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("famtrust.cache.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = TTLCache(ttl=60, max_size=10)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=10)
+
+        self.clock.advance(10)
+        self.assertEqual((cache.get("a"), cache.get("b")), (1, None))
+
+        self.clock.advance(50)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_entries_never_outlive_the_token(self):
+        cache = TokenCache(ttl=60, max_size=10)
+        token = make_expiring_token(exp=self.clock.now + 30)
+        expired_token = make_expiring_token(exp=self.clock.now)
+        cache.set(token, "user")
+        cache.set(expired_token, "user")
+
+        self.clock.advance(29)
+        self.assertEqual(cache.get(token), "user")
+        self.clock.advance(1)
+        self.assertIsNone(cache.get(token))
+        self.assertIsNone(cache.get(expired_token))
+
+    def test_tokens_are_not_kept_in_memory(self):
+        cache = TokenCache(ttl=60, max_size=10)
+        cache.set("Bearer token", "user")
+
+        self.assertEqual(cache.get("Bearer token"), "user")
+        self.assertNotIn("Bearer token", cache._entries)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(ttl=60, max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+
+        cache.set("c", 3)
+
+        self.assertEqual(
+            [cache.get(key) for key in ("a", "b", "c")], [1, None, 3]
+        )
+        self.assertEqual(cache.stats()["size"], 2)
+
+    def test_hits_and_misses_are_counted(self):
+        cache = TTLCache(ttl=60, max_size=10)
+        cache.get("a")
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("a")
+        self.clock.advance(60)
+        cache.get("a")
+
+        self.assertEqual(
+            cache.stats(),
+            {"hits": 2, "misses": 2, "stale_hits": 0, "size": 0},
+        )
+        cache.clear()
+        self.assertEqual(
+            cache.stats(),
+            {"hits": 0, "misses": 0, "stale_hits": 0, "size": 0},
+        )
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = TTLCache(ttl=60, max_size=10, enabled=False, stale_ttl=60)
+        cache.set("a", 1)
+
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(cache.get_stale("a"))
+        self.assertEqual(
+            cache.stats(),
+            {"hits": 0, "misses": 0, "stale_hits": 0, "size": 0},
+        )
+
+
+@override_settings(AUTH_JWT_LOCAL_VERIFICATION=True)
+class LocalTokenVerificationTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.private_key = rsa.generate_private_key(
+            public_exponent=65537, key_size=2048
+        )
+        public_pem = cls.private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        cls.key_file = tempfile.NamedTemporaryFile(suffix=".pem")
+        cls.key_file.write(public_pem)
+        cls.key_file.flush()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.key_file.close()
+        super().tearDownClass()
+
+    def setUp(self):
+        key_store = tokens.JWTKeyStore(
+            path=self.key_file.name, refresh_interval=300
+        )
+        patcher = mock.patch.object(tokens, "key_store", key_store)
+        self.key_store = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_token(self, *, kid=None):
+        headers = {} if kid is None else {"kid": kid}
+        token = jwt.encode(
+            {**USER_CLAIMS, "exp": int(time.time()) + 60},
+            self.private_key,
+            algorithm="RS256",
+            headers=headers,
+        )
+        return f"Bearer {token}"
+
+    def test_single_pem_key_verifies_tokens_with_a_kid(self):
+        for kid in (None, "rotated-key"):
+            with self.subTest(kid=kid):
+                valid, data = tokens.verify_token_locally(
+                    token=self.make_token(kid=kid)
+                )
+                self.assertTrue(valid)
+                self.assertEqual(data["user"]["id"], USER_CLAIMS["id"])
+
+    def test_async_verification_reads_the_key_file_off_the_loop(self):
+        with mock.patch.object(
+            tokens, "sync_to_async", wraps=tokens.sync_to_async
+        ) as sync_to_async:
+            valid, _ = async_to_sync(tokens.averify_token_locally)(
+                token=self.make_token(kid="rotated-key")
+            )
+
+        self.assertTrue(valid)
+        sync_to_async.assert_called_once_with(
+            self.key_store.refresh, thread_sensitive=False
+        )
+
+
+class TokenValidationCoalescingTests(StubAuthServiceMixin, SimpleTestCase):
+    auth_latency = 0.2
+    requests_per_token = 8
+
+    def test_parallel_requests_validate_each_token_once(self):
+        other_token, _ = self.auth_service.add_user()
+        request_tokens = [self.token, other_token] * self.requests_per_token
+        barrier = threading.Barrier(len(request_tokens))
+
+        def send(token):
+            client = Client(headers={"Authorization": token})
+            barrier.wait()
+            return client.get("/api/v1/unknown-route/").status_code
+
+        with ThreadPoolExecutor(max_workers=len(request_tokens)) as executor:
+            statuses = list(executor.map(send, request_tokens))
+
+        # Authenticated requests get past the middleware to the router
+        self.assertEqual(statuses, [404] * len(request_tokens))
+        self.assertEqual(
+            self.auth_service.validations,
+            {self.token: 1, other_token: 1},
+        )
+
+
+class InvalidAttemptThrottlingTests(StubAuthServiceMixin, SimpleTestCase):
+    path = "/api/v1/unknown-route/"
+
+    def send_bad_tokens(self, count):
+        return [
+            self.client.get(
+                self.path, headers={"Authorization": f"Bearer bad-{i}"}
+            ).status_code
+            for i in range(count)
+        ]
+
+    def test_bad_tokens_from_one_ip_dont_block_a_valid_token(self):
+        statuses = self.send_bad_tokens(settings.AUTH_THROTTLE_BURST * 3)
+
+        self.assertEqual(set(statuses), {401})
+        self.assertEqual(self.client.get(self.path).status_code, 404)
+
+    @override_settings(AUTH_THROTTLE_PER_IP=True)
+    def test_throttled_ip_still_gets_a_valid_token_validated(self):
+        statuses = self.send_bad_tokens(settings.AUTH_THROTTLE_BURST + 1)
+
+        self.assertEqual(statuses[-1], 429)
+        self.assertEqual(self.client.get(self.path).status_code, 404)
+
+    def test_repeated_bad_token_is_throttled_without_validation(self):
+        statuses = [
+            self.client.get(
+                self.path, headers={"Authorization": "Bearer bad"}
+            ).status_code
+            for _ in range(settings.AUTH_THROTTLE_BURST + 1)
+        ]
+
+        self.assertEqual(statuses[-1], 429)
+        self.assertEqual(self.auth_service.validations["Bearer bad"], 1)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        for patcher in (
+            mock.patch.object(clients, "time", self.clock),
+            mock.patch.object(clients, "logger"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(
+            name="test", failure_threshold=3, reset_timeout=30
+        )
+
+    def fail(self, times):
+        for _ in range(times):
+            self.breaker.before_call()
+            self.breaker.record_failure()
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        self.fail(2)
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.fail(2)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+        self.fail(1)
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.clock.advance(29)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_single_probe_closes_the_circuit(self):
+        self.fail(3)
+        self.clock.advance(30)
+
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record_success()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.before_call()
+        self.assertEqual(
+            self.breaker.stats()["transitions"],
+            {
+                "closed_to_open": 1,
+                "open_to_half_open": 1,
+                "half_open_to_closed": 1,
+            },
+        )
+
+    def test_failed_probe_reopens_the_circuit(self):
+        self.fail(3)
+        self.clock.advance(30)
+
+        self.fail(1)
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.clock.advance(30)
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_cancelled_probe_lets_another_one_through(self):
+        self.fail(3)
+        self.clock.advance(30)
+        self.breaker.before_call()
+
+        self.breaker.cancel_call()
+
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+
+class AuthServiceUnavailableTests(StubAuthServiceMixin, SimpleTestCase):
+    path = "/api/v1/unknown-route/"
+
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            name="auth service",
+            failure_threshold=1,
+            reset_timeout=settings.AUTH_CIRCUIT_RESET_TIMEOUT,
+        )
+        for patcher in (
+            mock.patch.object(clients, "auth_breaker", self.breaker),
+            mock.patch.object(clients, "time", self.clock),
+            mock.patch.object(clients, "logger"),
+            mock.patch("famtrust.middleware.logger"),
+            mock.patch("famtrust.cache.time", self.clock),
+            mock.patch.object(
+                token_cache, "stale_ttl", settings.AUTH_GRACE_PERIOD
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_open_circuit_fails_fast_with_a_503(self):
+        attempts = settings.AUTH_SERVICE_MAX_RETRIES + 1
+        self.auth_service.fail(times=attempts)
+
+        response = self.client.get(self.path)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.auth_service.calls["validate"], attempts)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        response = self.client.get(self.path)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(
+            response.json()["error"],
+            "Auth service is unavailable, try again later",
+        )
+        self.assertEqual(self.auth_service.calls["validate"], attempts)
+
+        self.clock.advance(settings.AUTH_CIRCUIT_RESET_TIMEOUT)
+
+        self.assertEqual(self.client.get(self.path).status_code, 404)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_grace_mode_uses_a_stale_validation_within_the_period(self):
+        self.assertEqual(self.client.get(self.path).status_code, 404)
+        self.auth_service.fail()
+
+        self.clock.advance(settings.TOKEN_CACHE_TTL)
+        # Requests get past the middleware to the router
+        self.assertEqual(self.client.get(self.path).status_code, 404)
+        self.assertEqual(
+            self.auth_service.calls["validate"],
+            settings.AUTH_SERVICE_MAX_RETRIES + 2,
+        )
+
+        self.clock.advance(settings.AUTH_GRACE_PERIOD)
+        self.assertEqual(self.client.get(self.path).status_code, 503)
+
+    def test_grace_mode_never_outlives_the_token(self):
+        token, _ = self.auth_service.add_user(
+            token=make_expiring_token(
+                exp=self.clock.now + settings.TOKEN_CACHE_TTL * 2
+            )
+        )
+        self.client.defaults["HTTP_AUTHORIZATION"] = token
+        self.assertEqual(self.client.get(self.path).status_code, 404)
+        self.auth_service.fail()
+
+        self.clock.advance(settings.TOKEN_CACHE_TTL)
+        self.assertEqual(self.client.get(self.path).status_code, 404)
+
+        self.clock.advance(settings.TOKEN_CACHE_TTL)
+        self.assertEqual(self.client.get(self.path).status_code, 503)
+
+    @mock.patch.object(token_cache, "stale_ttl", 0)
+    def test_without_grace_mode_an_expired_validation_is_not_used(self):
+        self.assertEqual(self.client.get(self.path).status_code, 404)
+        self.auth_service.fail()
+
+        self.clock.advance(settings.TOKEN_CACHE_TTL)
+
+        self.assertEqual(self.client.get(self.path).status_code, 503)
+
+
+class UserDirectoryTests(StubAuthServiceMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        patcher = mock.patch("famtrust.cache.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user_ids = [self.auth_service.add_user()[1]["id"] for _ in "ab"]
+        self.missing_id = "33333333-3333-3333-3333-333333333333"
+
+    def make_directory(self, *, batch_path=None):
+        return UserDirectory(
+            ttl=60,
+            negative_ttl=10,
+            max_size=100,
+            max_workers=4,
+            batch_path=batch_path,
+        )
+
+    def get_users(self, directory):
+        return directory.get_users(
+            token=self.token, user_ids=[*self.user_ids, self.missing_id]
+        )
+
+    def assert_users(self, users):
+        expected = dict.fromkeys(self.user_ids) | {self.missing_id: None}
+        for user_id in self.user_ids:
+            expected[user_id] = user_id
+        self.assertEqual(
+            {
+                user_id: user and str(user.id)
+                for user_id, user in users.items()
+            },
+            expected,
+        )
+
+    def test_batch_endpoint(self):
+        directory = self.make_directory(batch_path="/users/batch")
+
+        self.assert_users(self.get_users(directory))
+        self.assert_users(self.get_users(directory))
+
+        self.assertEqual(self.auth_service.calls, {"batch": 1})
+
+    def test_users_are_fetched_in_parallel_without_a_batch_endpoint(self):
+        directory = self.make_directory()
+
+        self.assert_users(self.get_users(directory))
+
+        self.assertEqual(self.auth_service.calls, {"users": 3})
+
+    def test_users_are_fetched_in_parallel_if_the_batch_call_fails(self):
+        directory = self.make_directory(batch_path="/users/batch")
+        self.auth_service.fail(status_code=404, times=1)
+
+        self.assert_users(self.get_users(directory))
+
+        self.assertEqual(self.auth_service.calls, {"batch": 1, "users": 3})
+
+    def test_missing_users_are_remembered_for_the_negative_ttl(self):
+        directory = self.make_directory(batch_path="/users/batch")
+        self.get_users(directory)
+
+        self.clock.advance(9)
+        self.assert_users(self.get_users(directory))
+        self.assertEqual(self.auth_service.calls, {"batch": 1})
+
+        # Only the missing user has expired
+        self.clock.advance(1)
+        self.assert_users(self.get_users(directory))
+        self.assertEqual(self.auth_service.calls, {"batch": 1, "users": 1})
+
+
+class ReferencedUsersValidationTests(StubAuthServiceMixin, TestCase):
+    class Validator(BaseValidatorMixin):
+        model = FamilyGroup
+        friendly_name = "family group"
+
+        def __init__(self, *, context):
+            self.context = context
+
+    def setUp(self):
+        super().setUp()
+        _, self.owner = self.auth_service.add_user()
+        _, self.member = self.auth_service.add_user()
+        family_group = FamilyGroup.objects.create(
+            id=self.user["defaultGroup"],
+            name="Family",
+            description="Family",
+            owner_id=self.user["id"],
+            is_default=True,
+        )
+        FamilyMembership.objects.create(
+            user_id=self.member["id"], family_group=family_group
+        )
+        request = RequestFactory().post(
+            "/", headers={"Authorization": self.token}
+        )
+        request.ft_user = User.from_auth_data(self.user)
+        self.validator = self.Validator(context={"request": request})
+
+    def test_owner_and_user_are_resolved_in_one_lookup(self):
+        data = {"owner_id": self.owner["id"], "user_id": self.member["id"]}
+
+        with mock.patch.object(
+            user_directory, "get_users", wraps=user_directory.get_users
+        ) as get_users:
+            self.validator._validate_user_is_in_default_group(data)
+
+        get_users.assert_called_once_with(
+            token=self.token,
+            user_ids=[self.owner["id"], self.member["id"]],
+        )
+
+
+class AuthServiceClientTests(StubAuthServiceMixin, SimpleTestCase):
+    path = "/api/v1/unknown-route/"
+
+    def setUp(self):
+        super().setUp()
+        self.auth_client = AuthServiceClient(
+            connect_timeout=1,
+            read_timeout=0.2,
+            max_retries=2,
+            pool_size=2,
+        )
+        breaker = CircuitBreaker(
+            name="auth service", failure_threshold=100, reset_timeout=30
+        )
+        for patcher in (
+            mock.patch.object(clients, "auth_breaker", breaker),
+            mock.patch.object(utils, "auth_client", self.auth_client),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def validate(self):
+        return self.auth_client.get("/v1/validate", token=self.token)
+
+    def test_session_is_reused_within_a_process(self):
+        session = self.auth_client.session
+        self.validate()
+
+        self.assertIs(self.auth_client.session, session)
+        with mock.patch.object(clients, "os") as os:
+            os.getpid.return_value = -1
+            self.assertIsNot(self.auth_client.session, session)
+
+    def test_gateway_errors_are_retried(self):
+        for status_code in (502, 503, 504):
+            with self.subTest(status_code=status_code):
+                self.auth_service.calls.clear()
+                self.auth_service.fail(status_code=status_code, times=2)
+
+                self.assertEqual(self.validate().status_code, 200)
+                self.assertEqual(self.auth_service.calls["validate"], 3)
+
+    def test_retries_are_bounded(self):
+        self.auth_service.fail(status_code=503)
+
+        self.assertEqual(self.validate().status_code, 503)
+        self.assertEqual(self.auth_service.calls["validate"], 3)
+
+    def test_other_errors_are_not_retried(self):
+        self.auth_service.fail(status_code=500, times=1)
+
+        self.assertEqual(self.validate().status_code, 500)
+        self.assertEqual(self.auth_service.calls["validate"], 1)
+
+    def test_timeout_means_the_service_is_unavailable(self):
+        self.auth_service.latency = 0.5
+        self.addCleanup(setattr, self.auth_service, "latency", 0.0)
+
+        self.assertIsNone(utils.is_valid_token(token=self.token))
+        with mock.patch("famtrust.middleware.logger"):
+            response = self.client.get(self.path)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(
+            response.json()["error"],
+            "Auth service is unavailable, try again later",
+        )
+
+
+class AsyncAuthServiceClientTests(StubAuthServiceMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.auth_client = AsyncAuthServiceClient(
+            connect_timeout=1, read_timeout=1, max_retries=0, pool_size=2
+        )
+
+    async def validate(self):
+        response = await self.auth_client.get(
+            "/v1/validate", token=self.token
+        )
+        self.assertEqual(response.status_code, 200)
+        return self.auth_client.client
+
+    def test_client_is_reused_on_a_loop(self):
+        async def validate_twice():
+            return await self.validate(), await self.validate()
+
+        first, second = asyncio.run(validate_twice())
+
+        self.assertIs(first, second)
+
+    def test_clients_of_closed_loops_are_dropped(self):
+        client = weakref.ref(asyncio.run(self.validate()))
+        asyncio.run(self.validate())
+        gc.collect()
+
+        self.assertIsNone(client())
+        self.assertEqual(len(self.auth_client._clients), 1)
+
+    def test_concurrent_loops_keep_their_own_client(self):
+        barrier = threading.Barrier(2)
+        clients = []
+
+        async def validate_around_the_other_loop():
+            first = await self.validate()
+            await asyncio.to_thread(barrier.wait)
+            clients.append((first, await self.validate()))
+
+        threads = [
+            threading.Thread(
+                target=asyncio.run, args=(validate_around_the_other_loop(),)
+            )
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(clients), 2)
+        for first, second in clients:
+            self.assertIs(first, second)
+        self.assertIsNot(clients[0][0], clients[1][0])
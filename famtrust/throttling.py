@@ -0,0 +1,110 @@
+"""
+This module defines the throttling of repeated invalid authentication
+attempts.
+
+Clients holding an expired or invalid token tend to retry aggressively.
+Every rejected attempt takes a token from a bucket kept for the token; once
+it is empty, further attempts with that token are answered with a 429
+without calling the auth service, until the bucket refills at
+`AUTH_THROTTLE_RATE` tokens per second.
+
+With `AUTH_THROTTLE_PER_IP`, rejected attempts also take a token from a
+bucket kept for the client IP, and are answered with a 429 instead of a 401
+once it is empty. The IP bucket is only charged and checked after a token
+is rejected, so it never keeps a valid token from being validated, even
+when many clients share an IP behind a proxy.
+
+Example usage:
+
+```python
+
+from famtrust.throttling import invalid_attempts
+
+if not invalid_attempts.has_tokens(token_key):
+    print("Too many invalid attempts")
+
+invalid_attempts.consume(token_key)
+```
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class TokenBucket:
+    """
+    Thread-safe token buckets, one per key.
+
+    Each bucket holds up to `capacity` tokens and refills at `rate` tokens
+    per second. At most `max_keys` buckets are kept; the least recently
+    used ones are dropped first.
+    """
+
+    def __init__(self, *, capacity: int, rate: float, max_keys: int):
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _refill(self, key: str, now: float) -> float:
+        """Return the number of tokens left in a bucket at `now`."""
+        tokens, updated_at = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated_at) * self.rate)
+
+    def has_tokens(self, key: str) -> bool:
+        """Return whether the bucket of a key has a token left."""
+        with self._lock:
+            return self._refill(key, time.monotonic()) >= 1
+
+    def consume(self, key: str) -> bool:
+        """
+        Take a token from the bucket of a key. Returns `False` if the
+        bucket was empty.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._refill(key, now)
+            consumed = tokens >= 1
+            if consumed:
+                tokens -= 1
+
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return consumed
+
+    def clear(self) -> None:
+        """Remove every bucket."""
+        with self._lock:
+            self._buckets.clear()
+
+    @property
+    def retry_after(self) -> int:
+        """Return the number of seconds it takes to refill one token."""
+        return max(1, round(1 / self.rate))
+
+
+def get_client_ip(request) -> str:
+    """
+    Return the IP address of the client.
+
+    Behind a proxy that appends the client address to `X-Forwarded-For`
+    (enabled with `AUTH_THROTTLE_TRUST_X_FORWARDED_FOR`), the last address
+    of the header is used; earlier ones can be set by the client itself.
+    """
+    forwarded_for = request.headers.get("X-Forwarded-For")
+    if settings.AUTH_THROTTLE_TRUST_X_FORWARDED_FOR and forwarded_for:
+        return forwarded_for.split(",")[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+invalid_attempts = TokenBucket(
+    capacity=settings.AUTH_THROTTLE_BURST,
+    rate=settings.AUTH_THROTTLE_RATE,
+    max_keys=settings.TOKEN_CACHE_MAX_SIZE,
+)
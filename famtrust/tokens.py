@@ -0,0 +1,216 @@
+"""
+This module defines the local verification of signed access tokens.
+
+When `AUTH_JWT_LOCAL_VERIFICATION` is enabled, access tokens are verified
+with the auth service's public key instead of calling its `validate`
+endpoint. The key is read from `AUTH_JWT_KEY_FILE`, which can either be a
+PEM encoded public key or a JWKS document, and re-read every
+`AUTH_JWT_KEY_REFRESH_INTERVAL` seconds so rotated keys get picked up.
+
+When a single key is configured (e.g. a PEM file), it verifies every token
+whatever the `kid` header names. A token that cannot be verified locally
+(no key available, the key is unknown or a user claim is missing) falls
+back to the remote validator.
+
+On the event loop, use `averify_token_locally`: the key file is then
+re-read in a worker thread instead of blocking the loop.
+
+Example usage:
+
+```python
+
+result = tokens.verify_token_locally(token=token)
+if result is None:
+    result = utils.is_valid_token(token=token)
+valid_token, data = result
+
+result = await tokens.averify_token_locally(token=token)
+```
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Any
+
+import jwt
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+USER_CLAIMS = (
+    "id",
+    "email",
+    "role",
+    "defaultGroup",
+    "has2FA",
+    "isVerified",
+    "isFrozen",
+    "lastLogin",
+)
+
+
+class JWTKeyStore:
+    """Loads the public keys used to verify access tokens from a file."""
+
+    def __init__(self, *, path: str | None, refresh_interval: int):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._keys: dict[str | None, Any] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        """Return whether the keys are due to be re-read from the file."""
+        return time.monotonic() - self._loaded_at >= self.refresh_interval
+
+    def get_key(self, kid: str | None) -> Any | None:
+        """
+        Return the key with the given key ID, or the only key available
+        whatever the key ID.
+        """
+        if self.is_stale:
+            self.refresh()
+        return self.find_key(kid)
+
+    async def aget_key(self, kid: str | None) -> Any | None:
+        """
+        Asynchronous version of `get_key`, which re-reads the key file in a
+        worker thread.
+        """
+        if self.is_stale:
+            await sync_to_async(self.refresh, thread_sensitive=False)()
+        return self.find_key(kid)
+
+    def find_key(self, kid: str | None) -> Any | None:
+        """Return a loaded key by key ID, without refreshing the keys."""
+        keys = self._keys
+        if len(keys) == 1:
+            return next(iter(keys.values()))
+        return keys.get(kid)
+
+    def refresh(self) -> None:
+        """Reload the keys from the key file."""
+        with self._lock:
+            self._loaded_at = time.monotonic()
+            if not self.path:
+                return
+
+            try:
+                with open(self.path) as key_file:
+                    content = key_file.read()
+                self._keys = self._parse(content)
+            except (OSError, ValueError, jwt.PyJWTError):
+                logger.exception(
+                    "Unable to load the JWT keys from %s", self.path
+                )
+
+    @staticmethod
+    def _parse(content: str) -> dict[str | None, Any]:
+        """Parse a PEM public key or a JWKS document."""
+        if content.lstrip().startswith("{"):
+            jwks = jwt.PyJWKSet.from_dict(json.loads(content))
+            return {jwk.key_id: jwk.key for jwk in jwks.keys}
+        return {None: content}
+
+
+key_store = JWTKeyStore(
+    path=settings.AUTH_JWT_KEY_FILE,
+    refresh_interval=settings.AUTH_JWT_KEY_REFRESH_INTERVAL,
+)
+
+
+def get_user_data(claims: dict) -> dict | None:
+    """
+    Return the user data held in the claims of an access token, in the same
+    shape as the auth service's `validate` response, or `None` if a user
+    claim is missing.
+    """
+    claims = claims.get("user", claims)
+    user_data = {claim: claims.get(claim) for claim in USER_CLAIMS}
+    if user_data["id"] is None:
+        user_data["id"] = claims.get("sub")
+
+    if any(value is None for value in user_data.values()):
+        return None
+    role = user_data["role"]
+    if not isinstance(role, dict) or "id" not in role:
+        return None
+
+    user_data["role"].setdefault("permissions", [])
+    return {"user": user_data}
+
+
+def get_key_id(token: str) -> tuple[str, str | None] | None:
+    """
+    Return a raw access token and the `kid` named by its header, or `None`
+    when the token can't be verified locally.
+    """
+    if not settings.AUTH_JWT_LOCAL_VERIFICATION:
+        return None
+
+    raw_token = token.removeprefix("Bearer ").strip()
+    try:
+        header = jwt.get_unverified_header(raw_token)
+    except jwt.PyJWTError:
+        return None
+    return raw_token, header.get("kid")
+
+
+def verify_with_key(raw_token: str, key: Any) -> tuple[bool, Any] | None:
+    """Verify a raw access token with a public key."""
+    try:
+        claims = jwt.decode(
+            raw_token,
+            key=key,
+            algorithms=settings.AUTH_JWT_ALGORITHMS,
+            audience=settings.AUTH_JWT_AUDIENCE,
+            issuer=settings.AUTH_JWT_ISSUER,
+            options={
+                "require": ["exp"],
+                "verify_aud": bool(settings.AUTH_JWT_AUDIENCE),
+            },
+        )
+    except jwt.PyJWTError as e:
+        logger.debug("Access token rejected: %s", e)
+        return False, None
+
+    data = get_user_data(claims)
+    if data is None:
+        logger.debug("Access token is missing user claims")
+        return None
+    return True, data
+
+
+def verify_token_locally(*, token: str) -> tuple[bool, Any] | None:
+    """
+    Verify a user token with the auth service's public key.
+
+    Returns `None` when the token cannot be verified locally and has to be
+    checked by the auth service instead.
+    """
+    key_id = get_key_id(token)
+    if key_id is None:
+        return None
+
+    raw_token, kid = key_id
+    key = key_store.get_key(kid)
+    if key is None:
+        return None
+    return verify_with_key(raw_token, key)
+
+
+async def averify_token_locally(*, token: str) -> tuple[bool, Any] | None:
+    """Asynchronous version of `verify_token_locally`."""
+    key_id = get_key_id(token)
+    if key_id is None:
+        return None
+
+    raw_token, kid = key_id
+    key = await key_store.aget_key(kid)
+    if key is None:
+        return None
+    return verify_with_key(raw_token, key)
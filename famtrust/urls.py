@@ -15,6 +15,8 @@ from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
+from famtrust.clients import auth_breaker
+
 api_prefix = f"api/{settings.API_VERSION}"
 
 
@@ -37,6 +39,11 @@ api_prefix = f"api/{settings.API_VERSION}"
                         "api": {
                             "status": "OK",
                             "version": settings.API_VERSION,
+                            "auth_service": {
+                                "state": "closed",
+                                "failures": 0,
+                                "transitions": {"closed_to_open": 1},
+                            },
                         },
                     },
                 )
@@ -51,6 +58,7 @@ def api_status(_):
         data={
             "status": "OK",
             "version": settings.API_VERSION,
+            "auth_service": auth_breaker.stats(),
         },
         status=status.HTTP_200_OK,
     )
@@ -2,10 +2,14 @@
 
 import contextlib
 import os
+from datetime import datetime
 from typing import Any
 
+import httpx
 import requests
 from django.conf import settings
+from django.core import signing
+from django.db.models import Q
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.exceptions import APIException
@@ -15,9 +19,15 @@ from rest_framework.routers import (
     APIRootView,
     DefaultRouter,
 )
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework.views import exception_handler
 
 from family_memberships.models import FamilyMembership
+from famtrust.clients import (
+    CircuitOpenError,
+    async_auth_client,
+    auth_client,
+)
 from famtrust.models import User
 
 
@@ -114,11 +124,32 @@ def custom_exception_handler(exc, context):
     return response
 
 
+def get_union(querysets, *, ordering=()):
+    """
+    Return the `UNION ALL` of querysets with the same columns, ordered by
+    `ordering`. A single queryset keeps its own ordering unless `ordering`
+    is given.
+    """
+    if len(querysets) == 1:
+        queryset = querysets[0]
+    else:
+        first, *others = (queryset.order_by() for queryset in querysets)
+        queryset = first.union(*others, all=True)
+    return queryset.order_by(*ordering) if ordering else queryset
+
+
 class Pagination(PageNumberPagination):
     """
     A custom pagination class that includes links to the next and previous
     pages.
 
+    Clients can opt in to cursor (keyset) pagination per request with
+    `?pagination=cursor`. Results are then ordered by (`created_at`, `id`),
+    newest first, and the `next` and `previous` links carry an opaque signed
+    cursor instead of a page number, so every page costs the same single
+    indexed query no matter how deep it is, and no COUNT is run;
+    `total_pages` and `current_page` are `null` in that mode.
+
     Attributes:
         page_size (int): The number of items to include on each page.
         page_size_query_param (str): The query parameter to control the page
@@ -128,11 +159,20 @@ class Pagination(PageNumberPagination):
         page number.
         last_page_strings (tuple): A tuple of strings to represent the last
         page in the pagination response.
+        pagination_query_param (str): The query parameter to opt in to
+        cursor pagination.
+        cursor_query_param (str): The query parameter holding the cursor.
+        cursor_ordering (tuple): The unique ordering of cursor pagination.
     """
 
     page_query_param = "page"
     page_size_query_param = "page_size"
     last_page_strings = ("last", "end")
+    pagination_query_param = "pagination"
+    cursor_query_param = "cursor"
+    cursor_ordering = ("-created_at", "-id")
+    cursor_salt = "famtrust.utils.Pagination.cursor"
+    cursor = None
     try:
         max_page_size = min(int(os.environ.get("MAX_PAGE_SIZE")), 100)
     except ValueError:
@@ -163,6 +203,118 @@ class Pagination(PageNumberPagination):
 
         return super().get_page_size(request)
 
+    def uses_cursor(self, request) -> bool:
+        """Return whether a request opted in to cursor pagination."""
+        return (
+            request.query_params.get(self.pagination_query_param) == "cursor"
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Paginate a queryset by page number or by cursor."""
+        return self.paginate_union([queryset], request, view)
+
+    def paginate_union(self, querysets, request, view=None, *, ordering=()):
+        """
+        Paginate the union of querysets with the same columns (e.g. the
+        `values()` of several models) by page number or by cursor, with a
+        single count and a single page query. Pages by number are ordered by
+        `ordering`, or by the queryset if there is only one.
+        """
+        if not self.uses_cursor(request):
+            return super().paginate_queryset(
+                get_union(querysets, ordering=ordering), request, view
+            )
+
+        self.request = request
+        self.cursor = self.decode_cursor(request)
+        page_size = self.get_page_size(request)
+
+        ordering = self.cursor_ordering
+        if self.cursor is not None:
+            # The redundant bound on `created_at` lets the database seek
+            # the (created_at, id) index instead of scanning up to the
+            # cursor
+            created_at, pk, reverse = self.cursor
+            if reverse:
+                ordering = tuple(field[1:] for field in ordering)
+                cursor_filter = Q(
+                    Q(created_at__gt=created_at)
+                    | Q(created_at=created_at, id__gt=pk),
+                    created_at__gte=created_at,
+                )
+            else:
+                cursor_filter = Q(
+                    Q(created_at__lt=created_at)
+                    | Q(created_at=created_at, id__lt=pk),
+                    created_at__lte=created_at,
+                )
+            querysets = [
+                queryset.filter(cursor_filter) for queryset in querysets
+            ]
+
+        results = list(
+            get_union(querysets, ordering=ordering)[:page_size + 1]
+        )
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        reverse = self.cursor is not None and self.cursor[2]
+        if reverse:
+            results.reverse()
+
+        self.next_cursor = self.previous_cursor = None
+        if results and (has_more or reverse):
+            self.next_cursor = self.encode_cursor(results[-1], reverse=False)
+        if results and (has_more if reverse else self.cursor is not None):
+            self.previous_cursor = self.encode_cursor(results[0], reverse=True)
+        return results
+
+    def encode_cursor(self, instance, *, reverse: bool) -> str:
+        """
+        Return the signed cursor pointing before or after an instance, or a
+        row of `values()`.
+        """
+        if isinstance(instance, dict):
+            created_at, pk = instance["created_at"], instance["id"]
+        else:
+            created_at, pk = instance.created_at, instance.pk
+        return signing.dumps(
+            [created_at.isoformat(), str(pk), reverse],
+            salt=self.cursor_salt,
+            compress=True,
+        )
+
+    def decode_cursor(self, request):
+        """
+        Return the `created_at`, `id` and direction of the cursor of a
+        request, or `None` on the first page.
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+
+        try:
+            created_at, pk, reverse = signing.loads(
+                cursor, salt=self.cursor_salt
+            )
+            return datetime.fromisoformat(created_at), pk, bool(reverse)
+        except (signing.BadSignature, TypeError, ValueError) as e:
+            raise HTTPException(
+                detail="Invalid cursor",
+                code="invalid_cursor",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            ) from e
+
+    def get_cursor_link(self, cursor: str | None) -> str | None:
+        """Return the URL of the page a cursor points to."""
+        if cursor is None:
+            return None
+
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
     def get_paginated_response(self, data) -> Response:
         """
         Get the paginated response with links to the next and previous pages.
@@ -174,6 +326,22 @@ class Pagination(PageNumberPagination):
             dict: The paginated response containing links, count, total pages,
             current page, and results.
         """
+        if self.uses_cursor(self.request):
+            return Response(
+                data={
+                    "metadata": {
+                        "next": self.get_cursor_link(self.next_cursor),
+                        "previous": self.get_cursor_link(
+                            self.previous_cursor
+                        ),
+                        "count": len(data),
+                        "total_pages": None,
+                        "current_page": None,
+                    },
+                    "data": data,
+                }
+            )
+
         return Response(
             data={
                 "metadata": {
@@ -220,8 +388,16 @@ class Pagination(PageNumberPagination):
                             ),
                         },
                         "count": {"type": "integer", "example": 100},
-                        "total_pages": {"type": "integer", "example": 5},
-                        "current_page": {"type": "integer", "example": 3},
+                        "total_pages": {
+                            "type": "integer",
+                            "nullable": True,
+                            "example": 5,
+                        },
+                        "current_page": {
+                            "type": "integer",
+                            "nullable": True,
+                            "example": 3,
+                        },
                     },
                 },
                 "data": schema,
@@ -229,32 +405,55 @@ class Pagination(PageNumberPagination):
         }
 
 
-def is_valid_token(*, token) -> tuple[bool, Any] | tuple[bool, None]:
-    """Verify a user token and returns some user data if valid."""
-    url = f"{settings.EXTERNAL_AUTH_URL}/{settings.API_VERSION}/validate"
-    headers = {"Authorization": token}
+def is_valid_token(*, token) -> tuple[bool, Any] | tuple[bool, None] | None:
+    """
+    Verify a user token and returns some user data if valid.
 
+    Returns `None` if the auth service is unavailable.
+    """
     with contextlib.suppress(requests.exceptions.RequestException):
-        response = requests.get(url=url, headers=headers)
+        response = auth_client.get(
+            f"/{settings.API_VERSION}/validate", token=token
+        )
+        if response.status_code == status.HTTP_200_OK:
+            return True, response.json()
+        if response.status_code >= 500:
+            return None
+
+        return False, None
+
+
+async def ais_valid_token(
+    *, token
+) -> tuple[bool, Any] | tuple[bool, None] | None:
+    """Asynchronous version of `is_valid_token`."""
+    with contextlib.suppress(httpx.HTTPError, ValueError, CircuitOpenError):
+        response = await async_auth_client.get(
+            f"/{settings.API_VERSION}/validate", token=token
+        )
         if response.status_code == status.HTTP_200_OK:
             return True, response.json()
+        if response.status_code >= 500:
+            return None
 
         return False, None
 
 
 def fetch_user_data(*, token: str, user_id: str) -> User | None:
     """Fetch user data for further usages."""
-    url = (
-        f"{settings.EXTERNAL_AUTH_URL}/{settings.API_VERSION}/users/"
-        f"{user_id}/"
-    )
-    response = requests.get(url=url, headers={"Authorization": token})
+    try:
+        response = auth_client.get(
+            f"/{settings.API_VERSION}/users/{user_id}/", token=token
+        )
+    except requests.exceptions.RequestException as e:
+        raise HTTPException(
+            detail="Auth service is unavailable, try again later.",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        ) from e
     if response.status_code != status.HTTP_200_OK:
         return None
 
-    user_data = response.json().get("user")
-    admin = user_data.get("role").get("id") == "admin"
-    return User(**user_data, isAdmin=admin)
+    return User.from_auth_data(response.json().get("user"))
 
 
 def get_family_group_ids(*, user_id: str):
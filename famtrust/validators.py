@@ -7,6 +7,7 @@ from rest_framework import (
 
 from family_memberships import models as fam_models
 from famtrust import utils
+from famtrust.directory import user_directory
 
 
 class BaseValidatorMixin:
@@ -78,22 +79,27 @@ class BaseValidatorMixin:
                 status_code=status.HTTP_400_BAD_REQUEST,
             )
 
+        # Resolve every user referenced by the data in a single lookup
+        user_ids = [
+            data[field]
+            for field in ("owner_id", "user_id")
+            if field in data and data[field] != user.id
+        ]
+        users = user_directory.get_users(
+            token=self.get_token(), user_ids=user_ids
+        )
+
         if "owner_id" in data and data["owner_id"] != user.id:
-            user = utils.fetch_user_data(
-                token=self.get_token(), user_id=data["owner_id"]
-            )
-            if not user:
+            if not users[str(data["owner_id"])]:
                 raise utils.HTTPException(
                     detail=_(
-                        f"User with id {data['user_id']} does not exist."
+                        f"User with id {data['owner_id']} does not exist."
                     ),
                     status_code=status.HTTP_400_BAD_REQUEST,
                 )
 
         if "user_id" in data and data["user_id"] != user.id:
-            user = utils.fetch_user_data(
-                token=self.get_token(), user_id=data["user_id"]
-            )
+            user = users[str(data["user_id"])]
             if not user:
                 raise utils.HTTPException(
                     detail=_(
@@ -101,8 +107,8 @@ class BaseValidatorMixin:
                     ),
                     status_code=status.HTTP_400_BAD_REQUEST,
                 )
-            if not default_family_group.filter(
-                members__user_id=user.id
+            if not default_family_group.members.filter(
+                user_id=user.id
             ).exists():
                 raise self.user_not_in_group_exception
 
@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from idempotency.models import IdempotencyKey
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = (
+        "key",
+        "user_id",
+        "status_code",
+        "locked_until",
+        "expires_at",
+    )
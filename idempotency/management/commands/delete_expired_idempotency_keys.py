@@ -0,0 +1,29 @@
+"""
+This module defines the `delete_expired_idempotency_keys` command, which
+deletes the stored responses of idempotency keys that have expired. Run it
+periodically (e.g. daily from cron) to keep the table small.
+
+Example usage:
+
+```bash
+
+python3 manage.py delete_expired_idempotency_keys
+```
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from idempotency.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete the idempotency keys that have expired."
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(
+            expires_at__lte=timezone.now()
+        ).delete()
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys")
+        )
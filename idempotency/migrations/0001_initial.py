@@ -0,0 +1,76 @@
+# Generated by Django 5.0.9 on 2026-10-17 02:38
+
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "user_id",
+                    models.UUIDField(
+                        db_comment="The user who made the request"
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        db_comment="The value of the Idempotency-Key header",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "request_hash",
+                    models.CharField(
+                        db_comment=(
+                            "A hash of the method, path and body of the "
+                            "request"
+                        ),
+                        max_length=64,
+                    ),
+                ),
+                (
+                    "status_code",
+                    models.PositiveSmallIntegerField(
+                        db_comment="The status code of the stored response",
+                        null=True,
+                    ),
+                ),
+                (
+                    "content_type",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                ("content", models.BinaryField(blank=True, default=b"")),
+                ("created_at", models.DateTimeField(editable=False)),
+                (
+                    "expires_at",
+                    models.DateTimeField(
+                        db_comment="The key can be reused after this time",
+                        db_index=True,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "idempotency_keys",
+                "unique_together": {("user_id", "key")},
+            },
+        ),
+    ]
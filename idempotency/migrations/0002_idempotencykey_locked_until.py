@@ -0,0 +1,27 @@
+# Generated by Django 5.0.9 on 2026-10-17 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("idempotency", "0001_initial"),
+    ]
+
+    operations = [
+        # The keys still in flight can be taken over right away
+        migrations.AddField(
+            model_name="idempotencykey",
+            name="locked_until",
+            field=models.DateTimeField(
+                db_comment=(
+                    "A retry can take the key over after this time if the "
+                    "request is still in flight"
+                ),
+                default=django.utils.timezone.now,
+            ),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,293 @@
+"""
+This module defines the view mixin that makes mutating requests idempotent.
+
+Clients on flaky networks may retry a request whose response they never
+received. When such a request carries an `Idempotency-Key` header, the first
+request made by a user with that key is processed and its response stored
+for `IDEMPOTENCY_KEY_TTL` seconds; retries get the stored response back
+(with an `Idempotent-Replayed: true` header) without being processed again.
+A retry that arrives while the first request is still in flight waits up to
+`IDEMPOTENCY_WAIT_TIMEOUT` seconds for its response, and gets a 409 if it
+is still in flight by then. A request holds a lease on its key, which it
+renews every third of `IDEMPOTENCY_LOCK_TIMEOUT` seconds for as long as it is
+processed: only if it was lost, e.g. because its worker crashed, does the
+lease expire, and the first retry after that takes the key over and is
+processed.
+Reusing a key for a different request is rejected with a 422.
+
+Example usage:
+
+```python
+
+from idempotency.mixins import IdempotentViewMixin
+
+
+class TransactionViewSet(IdempotentViewMixin, viewsets.ModelViewSet):
+    ...
+```
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    IntegrityError,
+    connection,
+    transaction,
+)
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+
+from idempotency.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+IDEMPOTENT_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+POLL_INTERVAL = 0.1
+
+
+def get_request_hash(request) -> str:
+    """Return a hash of the method, path and body of a request."""
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.path.encode(), request.body):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def error_response(error, status_code: int) -> JsonResponse:
+    """Return a JSON error response."""
+    return JsonResponse(
+        data={"error": error, "status_code": status_code},
+        status=status_code,
+    )
+
+
+class LeaseRenewal(threading.Thread):
+    """
+    Renews the lease of a claimed key every third of
+    `IDEMPOTENCY_LOCK_TIMEOUT` seconds until it is stopped, so the key is
+    only taken over once the worker processing its request is gone.
+    """
+
+    def __init__(self, record):
+        super().__init__(daemon=True)
+        self.record = record
+        self.stopped = threading.Event()
+
+    def run(self):
+        interval = settings.IDEMPOTENCY_LOCK_TIMEOUT / 3
+        try:
+            while not self.stopped.wait(interval) and self.renew():
+                pass
+        finally:
+            connection.close()
+
+    def renew(self) -> bool:
+        """
+        Renew the lease. Returns whether it is still held, which it is
+        assumed to be if the database can't be reached this time.
+        """
+        locked_until = timezone.now() + timedelta(
+            seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT
+        )
+        try:
+            renewed = IdempotentViewMixin.get_lease(self.record).update(
+                locked_until=locked_until
+            )
+        except DatabaseError:
+            logger.warning(
+                "Could not renew the lease of idempotency key %s",
+                self.record,
+                exc_info=True,
+            )
+            return True
+        if not renewed:
+            return False
+        self.record.locked_until = locked_until
+        return True
+
+    def stop(self):
+        """Stop renewing the lease, once a renewal in progress is done."""
+        self.stopped.set()
+        self.join()
+
+
+class IdempotentViewMixin:
+    """
+    Makes the mutating requests of a view idempotent with an
+    `Idempotency-Key` header. Requests without the header are processed as
+    usual.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        """Process a request once per user and idempotency key."""
+        key = request.headers.get(HEADER)
+        user = getattr(request, "ft_user", None)
+        if (
+            not key
+            or user is None
+            or request.method not in IDEMPOTENT_METHODS
+        ):
+            return super().dispatch(request, *args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return error_response(
+                _("Idempotency-Key must not exceed %(length)d characters")
+                % {"length": MAX_KEY_LENGTH},
+                status.HTTP_400_BAD_REQUEST,
+            )
+
+        request_hash = get_request_hash(request)
+        record, claimed = self.claim_idempotency_key(
+            user.id, key, request_hash
+        )
+        if not claimed:
+            return self.replay_idempotent_response(record, request_hash)
+
+        renewal = LeaseRenewal(record)
+        renewal.start()
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, "render"):
+                response.render()
+        except BaseException:
+            renewal.stop()
+            self.release_idempotency_key(record)
+            raise
+        renewal.stop()
+
+        if response.status_code >= 500:
+            self.release_idempotency_key(record)
+        elif not self.get_lease(record).update(
+            status_code=response.status_code,
+            content_type=response.get("Content-Type", ""),
+            content=response.content,
+        ):
+            logger.warning(
+                "Idempotency key %s was taken over before its response was "
+                "stored",
+                record,
+            )
+        return response
+
+    @staticmethod
+    def get_lease(record):
+        """
+        Return a queryset of the key of a record, as long as it is still
+        claimed by the request that made the record.
+        """
+        return IdempotencyKey.objects.filter(
+            pk=record.pk, status_code=None, locked_until=record.locked_until
+        )
+
+    @staticmethod
+    def claim_idempotency_key(user_id, key, request_hash):
+        """
+        Claim a key for a request. Returns the record of the key, and
+        whether it was claimed: a key still in flight is taken over if its
+        lease has expired and it was claimed for the same request.
+        """
+        now = timezone.now()
+        locked_until = now + timedelta(
+            seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT
+        )
+        # Make room for the key if it has expired
+        IdempotencyKey.objects.filter(
+            user_id=user_id, key=key, expires_at__lte=now
+        ).delete()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user_id=user_id,
+                    key=key,
+                    request_hash=request_hash,
+                    expires_at=now
+                    + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                    locked_until=locked_until,
+                )
+            return record, True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(
+                user_id=user_id, key=key
+            ).first()
+        if record is None:
+            # The in-flight request failed and released the key meanwhile
+            return IdempotentViewMixin.claim_idempotency_key(
+                user_id, key, request_hash
+            )
+
+        if (
+            not record.is_completed
+            and record.locked_until <= now
+            and record.request_hash == request_hash
+        ):
+            # The request that claimed the key was lost, e.g. its worker
+            # crashed. Only one retry can win the lease.
+            if IdempotentViewMixin.get_lease(record).update(
+                locked_until=locked_until
+            ):
+                logger.info(
+                    "Taking over idempotency key %s, whose lease expired",
+                    record,
+                )
+                record.locked_until = locked_until
+                return record, True
+            return IdempotentViewMixin.claim_idempotency_key(
+                user_id, key, request_hash
+            )
+        return record, False
+
+    @staticmethod
+    def release_idempotency_key(record):
+        """Release a key whose request failed, so it can be retried."""
+        IdempotentViewMixin.get_lease(record).delete()
+
+    def replay_idempotent_response(self, record, request_hash):
+        """
+        Return the stored response of a key, waiting for the request that
+        claimed it if it is still in flight.
+        """
+        if record.request_hash != request_hash:
+            return error_response(
+                _("Idempotency-Key was already used for a different request"),
+                status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+        while not record.is_completed:
+            if time.monotonic() >= deadline:
+                return error_response(
+                    _(
+                        "A request with this Idempotency-Key is still being "
+                        "processed, try again later"
+                    ),
+                    status.HTTP_409_CONFLICT,
+                )
+            time.sleep(POLL_INTERVAL)
+            record = IdempotencyKey.objects.filter(pk=record.pk).first()
+            if record is None or (
+                not record.is_completed
+                and record.locked_until <= timezone.now()
+            ):
+                return self.dispatch(self.request, *self.args, **self.kwargs)
+
+        logger.debug("Replaying the response of idempotency key %s", record)
+        response = HttpResponse(
+            content=bytes(record.content),
+            status=record.status_code,
+            content_type=record.content_type or None,
+        )
+        response[REPLAYED_HEADER] = "true"
+        return response
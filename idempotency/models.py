@@ -0,0 +1,67 @@
+"""
+This module defines the model for storing the responses of requests made
+with an `Idempotency-Key` header.
+"""
+
+from uuid import uuid4
+
+from django.db import models
+from django.utils import timezone
+
+
+class IdempotencyKey(models.Model):
+    """
+    Model representing a request made with an `Idempotency-Key` header.
+
+    The key is claimed before the request is processed and holds its
+    response once it completes; `status_code` is `None` while the request is
+    still in flight. A request that hasn't completed by `locked_until` is
+    considered lost, and a retry can take its key over.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    user_id = models.UUIDField(
+        null=False, db_comment="The user who made the request"
+    )
+    key = models.CharField(
+        max_length=255, db_comment="The value of the Idempotency-Key header"
+    )
+    request_hash = models.CharField(
+        max_length=64,
+        db_comment="A hash of the method, path and body of the request",
+    )
+    status_code = models.PositiveSmallIntegerField(
+        null=True, db_comment="The status code of the stored response"
+    )
+    content_type = models.CharField(max_length=255, blank=True, default="")
+    content = models.BinaryField(blank=True, default=b"")
+    created_at = models.DateTimeField(null=False, blank=False, editable=False)
+    expires_at = models.DateTimeField(
+        db_index=True, db_comment="The key can be reused after this time"
+    )
+    locked_until = models.DateTimeField(
+        db_comment=(
+            "A retry can take the key over after this time if the request "
+            "is still in flight"
+        )
+    )
+
+    class Meta:
+        db_table = "idempotency_keys"
+        unique_together = ("user_id", "key")
+
+    def save(self, *args, **kwargs):
+        """Save the idempotency key and set the `created_at` field."""
+        if not self.created_at:
+            self.created_at = timezone.now()
+
+        return super(IdempotencyKey, self).save(*args, **kwargs)
+
+    def __str__(self):
+        """Return the user and the key."""
+        return f"{self.user_id}: {self.key}"
+
+    @property
+    def is_completed(self) -> bool:
+        """Return whether the response of the request is stored."""
+        return self.status_code is not None
@@ -0,0 +1,199 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from famtrust.testing import FamilyAccountMixin, StubAuthServiceMixin
+from idempotency.mixins import (
+    HEADER,
+    REPLAYED_HEADER,
+    IdempotentViewMixin,
+    LeaseRenewal,
+    get_request_hash,
+)
+from idempotency.models import IdempotencyKey
+from transactions.models import Transaction
+from transactions.views import TransactionViewSet
+
+PATH = "/api/v1/transactions/"
+
+
+class IdempotentRequestTests(
+    FamilyAccountMixin, StubAuthServiceMixin, TestCase
+):
+    def make_data(self, amount):
+        return {
+            "amount": str(amount),
+            "transaction_type": "transfers",
+            "transaction_direction": "family_account_to_sub_account",
+            "family_source_account_id": str(self.family_account.pk),
+            "sub_destination_account_id": str(self.sub_account.pk),
+            "details": "Payout",
+        }
+
+    def send(self, amount, *, key="payout-1"):
+        return self.client.post(
+            PATH,
+            data=self.make_data(amount),
+            content_type="application/json",
+            headers={HEADER: key},
+        )
+
+    def claim(self, amount, *, locked_until, key="payout-1"):
+        """Make a key look claimed by a request that is still in flight."""
+        request = RequestFactory().post(
+            PATH, data=self.make_data(amount), content_type="application/json"
+        )
+        now = timezone.now()
+        return IdempotencyKey.objects.create(
+            user_id=self.user["id"],
+            key=key,
+            request_hash=get_request_hash(request),
+            expires_at=now + timedelta(days=1),
+            locked_until=locked_until,
+        )
+
+    def payouts(self):
+        return Transaction.objects.filter(details="Payout")
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.send(10)
+        retry = self.send(10)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry[REPLAYED_HEADER], "true")
+        self.assertFalse(first.has_header(REPLAYED_HEADER))
+        self.assertEqual(self.payouts().count(), 1)
+
+    def test_key_reused_for_a_different_request_is_rejected(self):
+        self.send(10)
+        response = self.send(20)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.payouts().count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0.2)
+    def test_retry_of_a_request_in_flight_is_a_conflict(self):
+        self.claim(10, locked_until=timezone.now() + timedelta(minutes=1))
+        response = self.send(10)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(self.payouts().exists())
+
+    def test_retry_takes_over_a_key_whose_lease_expired(self):
+        record = self.claim(10, locked_until=timezone.now())
+        response = self.send(10)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header(REPLAYED_HEADER))
+        self.assertEqual(self.payouts().count(), 1)
+        record.refresh_from_db()
+        self.assertEqual(record.status_code, 201)
+        self.assertEqual(bytes(record.content), response.content)
+
+    def test_expired_lease_is_not_taken_over_for_a_different_request(self):
+        self.claim(10, locked_until=timezone.now())
+        response = self.send(20)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(self.payouts().exists())
+
+    def test_lost_request_cannot_overwrite_the_response_of_a_takeover(self):
+        record = self.claim(10, locked_until=timezone.now())
+        self.send(10)
+
+        # The request that claimed the key first completes after all
+        stored = IdempotentViewMixin.get_lease(record).update(status_code=500)
+        self.assertEqual(stored, 0)
+        record.refresh_from_db()
+        self.assertEqual(record.status_code, 201)
+
+    def test_renewal_extends_the_lease_until_it_is_taken_over(self):
+        record = self.claim(10, locked_until=timezone.now())
+        renewal = LeaseRenewal(record)
+
+        self.assertTrue(renewal.renew())
+        self.assertGreater(record.locked_until, timezone.now())
+        self.assertEqual(
+            IdempotencyKey.objects.get(pk=record.pk).locked_until,
+            record.locked_until,
+        )
+
+        # A retry took the key over
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            locked_until=timezone.now() + timedelta(minutes=1)
+        )
+        self.assertFalse(renewal.renew())
+
+
+@override_settings(IDEMPOTENCY_LOCK_TIMEOUT=0.3)
+class LeaseRenewalTests(
+    FamilyAccountMixin, StubAuthServiceMixin, TransactionTestCase
+):
+    """
+    A request slower than `IDEMPOTENCY_LOCK_TIMEOUT` keeps its key, because
+    it renews its lease while it is processed.
+    """
+
+    def test_slow_request_is_not_taken_over(self):
+        data = {
+            "amount": "10",
+            "transaction_type": "transfers",
+            "transaction_direction": "family_account_to_sub_account",
+            "family_source_account_id": str(self.family_account.pk),
+            "sub_destination_account_id": str(self.sub_account.pk),
+            "details": "Payout",
+        }
+        create = TransactionViewSet.create
+        started = threading.Event()
+        responses = []
+
+        def slow_create(view, request, *args, **kwargs):
+            started.set()
+            time.sleep(1)
+            return create(view, request, *args, **kwargs)
+
+        def send():
+            try:
+                responses.append(
+                    self.client.post(
+                        PATH,
+                        data=data,
+                        content_type="application/json",
+                        headers={HEADER: "payout-1"},
+                    )
+                )
+            finally:
+                connection.close()
+
+        # SQLite locks whole tables, so some renewals fail and are logged
+        with mock.patch.object(
+            TransactionViewSet, "create", slow_create
+        ), mock.patch("idempotency.mixins.logger"):
+            first = threading.Thread(target=send)
+            first.start()
+            started.wait()
+            time.sleep(0.6)
+            record = IdempotencyKey.objects.get(key="payout-1")
+            _, claimed = IdempotentViewMixin.claim_idempotency_key(
+                record.user_id, record.key, record.request_hash
+            )
+            first.join()
+
+        self.assertFalse(claimed)
+        (response,) = responses
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            Transaction.objects.filter(details="Payout").count(), 1
+        )
@@ -0,0 +1,300 @@
+"""
+This module defines the bulk ingestion of transactions, e.g. for family
+payouts and bank statement imports.
+
+Transactions are validated in batches of `TRANSACTIONS_BULK_BATCH_SIZE`,
+with a single query per batch for each table they reference. They are then
+written in a database transaction that locks the involved accounts in the
+order used by the transfer engine, checks every debit against the locked
+balances, inserts the transactions and their ledger entries with
+`bulk_create`, applies the balance changes with one `UPDATE` per account,
+and adds the transactions to their spending rollups and to the aggregates
+of their family accounts.
+
+In `all_or_nothing` mode, all the transactions are written in a single
+database transaction, and none of them is written if any of them fails. In
+`best_effort` mode, every batch is written in a database transaction of its
+own, and the transactions that fail are skipped.
+
+Example usage:
+
+```python
+
+from transactions import bulk
+
+results = bulk.ingest(items, user_id=user.id, best_effort=True)
+for result in results:
+    print(result["index"], result["status"])
+```
+"""
+
+from functools import partial
+from typing import Any, Iterator, Sequence
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from accounts import aggregates, models as accounts_models
+from transactions import ledger, models, rollups, settlement, transfers
+from transactions.serializers import BulkTransactionItemSerializer
+from transactions.validators import ValidateTransactionData
+
+CREATED = "created"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+# The fields of a bulk request item that reference other rows, with the
+# transaction field and the model they are looked up as
+RELATED_FIELDS = (
+    (
+        "sub_source_account_id",
+        "sub_source_account",
+        accounts_models.SubAccount,
+    ),
+    (
+        "sub_destination_account_id",
+        "sub_destination_account",
+        accounts_models.SubAccount,
+    ),
+    (
+        "family_source_account_id",
+        "family_source_account",
+        accounts_models.FamilyAccount,
+    ),
+    (
+        "family_destination_account_id",
+        "family_destination_account",
+        accounts_models.FamilyAccount,
+    ),
+    ("fund_request_id", "fund_request_id", accounts_models.FundRequest),
+)
+
+
+class TransactionFailed(Exception):
+    """Rolls back an all-or-nothing request when a transaction fails."""
+
+    def __init__(self, index: int, errors: Any):
+        super().__init__(index, errors)
+        self.index = index
+        self.errors = errors
+
+
+def chunks(items: Sequence, size: int) -> Iterator[tuple[int, Sequence]]:
+    """Yield the batches of a sequence with the index they start at."""
+    for start in range(0, len(items), size):
+        yield start, items[start:start + size]
+
+
+def validate_batch(
+    items: Sequence[dict], *, offset: int, user_id
+) -> tuple[list[tuple[int, models.Transaction]], dict[int, Any]]:
+    """
+    Validate a batch of bulk request items. Returns the unsaved transactions
+    of the valid items and the errors of the invalid ones, keyed by their
+    index in the request.
+    """
+    validated = {}
+    errors = {}
+    for index, item in enumerate(items, start=offset):
+        serializer = BulkTransactionItemSerializer(data=item)
+        if serializer.is_valid():
+            validated[index] = serializer.validated_data
+        else:
+            errors[index] = serializer.errors
+
+    related = {}
+    for model in {model for key, field, model in RELATED_FIELDS}:
+        ids = {
+            data[key]
+            for data in validated.values()
+            for key, field, related_model in RELATED_FIELDS
+            if related_model is model and data.get(key) is not None
+        }
+        related[model] = model.objects.in_bulk(ids) if ids else {}
+
+    transactions = []
+    for index, data in validated.items():
+        data = dict(data)
+        field_errors = {}
+        for key, field, model in RELATED_FIELDS:
+            pk = data.pop(key, None)
+            data[field] = related[model].get(pk)
+            if pk is not None and data[field] is None:
+                field_errors[key] = [
+                    _('Invalid pk "%(pk)s" - object does not exist.')
+                    % {"pk": pk}
+                ]
+        if field_errors:
+            errors[index] = field_errors
+            continue
+
+        transaction = models.Transaction(**data, user_id=user_id)
+        try:
+            ValidateTransactionData(transaction)
+        except ValidationError as e:
+            errors[index] = {"non_field_errors": e.messages}
+            continue
+        transactions.append((index, transaction))
+
+    return transactions, errors
+
+
+def write(
+    transactions: list[tuple[int, models.Transaction]], *, best_effort: bool
+) -> tuple[list[tuple[int, models.Transaction]], dict[int, Any]]:
+    """
+    Write validated transactions and move their funds, or leave them
+    pending for a settlement worker (see `transactions.settlement`). Must
+    run inside a database transaction. Returns the transactions that were
+    written and the errors of the ones that were not, keyed by their index.
+
+    Unless `best_effort` is set, `TransactionFailed` is raised as soon as a
+    transaction cannot be written.
+    """
+    entries = {
+        index: transfers.get_entries(transaction)
+        for index, transaction in transactions
+        if not settlement.is_deferred(transaction)
+    }
+    initial_balances = transfers.lock(
+        entry for items in entries.values() for entry in items
+    )
+    balances = dict(initial_balances)
+    written = []
+    errors = {}
+    for index, transaction in transactions:
+        error = None
+        for entry in entries.get(index, ()):
+            balance = balances.get((entry.model, entry.pk))
+            if balance is None:
+                error = _("Account does not exist.")
+            elif balance + entry.amount < 0:
+                error = transfers.INSUFFICIENT_BALANCE_ERRORS[entry.model]
+            if error is not None:
+                break
+
+        if error is not None:
+            if not best_effort:
+                raise TransactionFailed(index, {"non_field_errors": [error]})
+            errors[index] = {"non_field_errors": [error]}
+            continue
+
+        for entry in entries.get(index, ()):
+            balances[(entry.model, entry.pk)] += entry.amount
+        written.append((index, transaction))
+
+    now = timezone.now()
+    ledger_entries = []
+    settled = []
+    for index, transaction in written:
+        transaction.created_at = now
+        transaction.updated_at = now
+        if index not in entries:
+            transaction.transaction_status = (
+                models.TransactionStatusEnum.PENDING
+            )
+            continue
+        transaction.transaction_status = (
+            models.TransactionStatusEnum.SUCCESSFUL
+        )
+        ledger_entries += ledger.make_entries(
+            transaction, entries[index], created_at=now
+        )
+        settled.append(transaction.pk)
+
+    batch_size = settings.TRANSACTIONS_BULK_BATCH_SIZE
+    models.Transaction.objects.bulk_create(
+        [transaction for index, transaction in written],
+        batch_size=batch_size,
+    )
+    models.LedgerEntry.objects.bulk_create(
+        ledger_entries, batch_size=batch_size
+    )
+    rollups.record(settled, batch_size=batch_size)
+    for (model, pk), balance in balances.items():
+        change = balance - initial_balances[(model, pk)]
+        if change:
+            model.objects.filter(pk=pk).update(
+                balance=F("balance") + change, updated_at=now
+            )
+    aggregates.record(
+        (
+            entry
+            for index, transaction in written
+            for entry in entries.get(index, ())
+        ),
+        at=now,
+    )
+
+    return written, errors
+
+
+def ingest(
+    items: Sequence[dict], *, user_id, best_effort: bool
+) -> list[dict[str, Any]]:
+    """
+    Validate and write the transactions of a bulk request. Returns the
+    result of every item, in the order of the request.
+    """
+    batch_size = settings.TRANSACTIONS_BULK_BATCH_SIZE
+    results = {}
+    valid = []
+    for start, batch in chunks(items, batch_size):
+        transactions, errors = validate_batch(
+            batch, offset=start, user_id=user_id
+        )
+        valid += transactions
+        for index, error in errors.items():
+            results[index] = {
+                "index": index,
+                "status": FAILED,
+                "errors": error,
+            }
+
+    if results and not best_effort:
+        return get_results(results, size=len(items))
+
+    groups = chunks(valid, batch_size) if best_effort else [(0, valid)]
+    for start, group in groups:
+        try:
+            written, errors = transfers.run_with_retries(
+                partial(write, group, best_effort=best_effort)
+            )
+        except TransactionFailed as e:
+            results[e.index] = {
+                "index": e.index,
+                "status": FAILED,
+                "errors": e.errors,
+            }
+            return get_results(results, size=len(items))
+
+        for index, transaction in written:
+            results[index] = {
+                "index": index,
+                "status": CREATED,
+                "id": transaction.id,
+            }
+        for index, error in errors.items():
+            results[index] = {
+                "index": index,
+                "status": FAILED,
+                "errors": error,
+            }
+
+    return get_results(results, size=len(items))
+
+
+def get_results(
+    results: dict[int, dict[str, Any]], *, size: int
+) -> list[dict[str, Any]]:
+    """
+    Return the results of a bulk request in order. Items without a result
+    were skipped because another item of an all-or-nothing request failed.
+    """
+    return [
+        results.get(index, {"index": index, "status": SKIPPED})
+        for index in range(size)
+    ]
@@ -0,0 +1,202 @@
+"""
+This module defines the double-entry ledger behind account balances.
+
+Every transaction appends one debit and one credit `LedgerEntry` in the same
+database transaction that moves its funds. Balances are periodically
+checkpointed (see the `create_balance_checkpoints` command), so the balance
+of an account at any point in time is the balance of its last checkpoint
+before that time plus the short tail of entries written after it, read
+through the (account_id, created_at) index.
+
+Example usage:
+
+```python
+
+from transactions import ledger
+
+current_balance = ledger.get_balance(account_id=account.id)
+last_month_balance = ledger.get_balance(account_id=account.id, at=last_month)
+```
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import TYPE_CHECKING
+
+from django.db.models import Exists, F, OuterRef, Q, QuerySet, Subquery, Sum
+from django.utils import timezone
+
+import transactions.models as md
+from accounts import models as accounts_models
+
+if TYPE_CHECKING:
+    from transactions.transfers import Entry
+
+ACCOUNT_TYPES = {
+    accounts_models.SubAccount: "sub_account",
+    accounts_models.FamilyAccount: "family_account",
+}
+
+
+def make_entries(
+    transaction: md.Transaction, entries: list[Entry], *, created_at
+) -> list[md.LedgerEntry]:
+    """
+    Return the unsaved ledger entries of a transaction. The side of the
+    transfer that is not held in an account becomes an `external` entry.
+    """
+    rows = [
+        md.LedgerEntry(
+            transaction_id=transaction.id,
+            account_type=ACCOUNT_TYPES[entry.model],
+            account_id=entry.pk,
+            amount=entry.amount,
+            created_at=created_at,
+        )
+        for entry in entries
+    ]
+    external = -sum((entry.amount for entry in entries), Decimal(0))
+    if external:
+        rows.append(
+            md.LedgerEntry(
+                transaction_id=transaction.id,
+                account_type=md.LedgerAccountTypeEnum.EXTERNAL,
+                account_id=None,
+                amount=external,
+                created_at=created_at,
+            )
+        )
+    return rows
+
+
+def record(
+    transaction: md.Transaction, entries: list[Entry], *, created_at=None
+) -> list[md.LedgerEntry]:
+    """Append the ledger entries of a transaction."""
+    return md.LedgerEntry.objects.bulk_create(
+        make_entries(
+            transaction, entries, created_at=created_at or timezone.now()
+        )
+    )
+
+
+def get_balance(*, account_id, at: datetime | None = None) -> Decimal:
+    """
+    Return the balance of an account at a point in time (now by default),
+    from its last checkpoint and the entries written after it.
+    """
+    checkpoints = md.BalanceCheckpoint.objects.filter(account_id=account_id)
+    entries = md.LedgerEntry.objects.filter(account_id=account_id)
+    if at is not None:
+        checkpoints = checkpoints.filter(as_of__lte=at)
+        entries = entries.filter(created_at__lte=at)
+
+    checkpoint = checkpoints.order_by("-as_of").first()
+    balance = Decimal(0)
+    if checkpoint is not None:
+        balance = checkpoint.balance
+        entries = entries.filter(created_at__gt=checkpoint.as_of)
+
+    tail = entries.aggregate(total=Sum("amount"))["total"]
+    return balance + (tail or 0)
+
+
+def get_balances(**lookups) -> dict[object, Decimal]:
+    """
+    Return the current balances of the accounts whose entries match
+    `lookups` (e.g. a range of `account_id`), from their last checkpoints and
+    the entries written after them, keyed by account.
+    """
+    last_checkpoints = md.BalanceCheckpoint.objects.filter(
+        account_id=OuterRef("account_id")
+    ).order_by("-as_of")
+    balances = defaultdict(
+        Decimal,
+        md.BalanceCheckpoint.objects.filter(
+            id=Subquery(last_checkpoints.values("id")[:1]), **lookups
+        ).values_list("account_id", "balance"),
+    )
+    tails = (
+        md.LedgerEntry.objects.exclude(account_id=None)
+        .filter(**lookups)
+        .annotate(
+            checkpoint_as_of=Subquery(last_checkpoints.values("as_of")[:1])
+        )
+        .filter(
+            Q(checkpoint_as_of=None) | Q(created_at__gt=F("checkpoint_as_of"))
+        )
+        .values_list("account_id")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    for account_id, total in tails:
+        balances[account_id] += total
+    return dict(balances)
+
+
+def get_opening_checkpoints(**lookups) -> QuerySet[md.BalanceCheckpoint]:
+    """
+    Return the checkpoints of the balances accounts had before the ledger
+    existed (see the `0002_ledger` migration) whose fields match `lookups`:
+    the first checkpoint of an account, when none of its entries was written
+    up to it.
+    """
+    first_checkpoints = md.BalanceCheckpoint.objects.filter(
+        account_id=OuterRef("account_id")
+    ).order_by("as_of")
+    return md.BalanceCheckpoint.objects.filter(
+        id=Subquery(first_checkpoints.values("id")[:1]), **lookups
+    ).exclude(
+        Exists(
+            md.LedgerEntry.objects.filter(
+                account_id=OuterRef("account_id"),
+                created_at__lte=OuterRef("as_of"),
+            )
+        )
+    )
+
+
+def create_checkpoints(*, as_of: datetime) -> list[md.BalanceCheckpoint]:
+    """
+    Checkpoint the balance as of a point in time of every account with
+    entries written since its last checkpoint.
+
+    `as_of` must be far enough in the past for every transaction that
+    wrote entries up to it to have committed.
+    """
+    last_checkpoints = md.BalanceCheckpoint.objects.filter(
+        account_id=OuterRef("account_id")
+    ).order_by("-as_of")
+    tails = (
+        md.LedgerEntry.objects.exclude(account_id=None)
+        .filter(created_at__lte=as_of)
+        .annotate(
+            checkpoint_id=Subquery(last_checkpoints.values("id")[:1]),
+            checkpoint_as_of=Subquery(last_checkpoints.values("as_of")[:1]),
+        )
+        .filter(
+            Q(checkpoint_as_of=None) | Q(created_at__gt=F("checkpoint_as_of"))
+        )
+        .values("account_type", "account_id", "checkpoint_id")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+
+    tails = list(tails)
+    balances = dict(
+        md.BalanceCheckpoint.objects.filter(
+            id__in=[tail["checkpoint_id"] for tail in tails]
+        ).values_list("id", "balance")
+    )
+    return md.BalanceCheckpoint.objects.bulk_create(
+        md.BalanceCheckpoint(
+            account_type=tail["account_type"],
+            account_id=tail["account_id"],
+            balance=balances.get(tail["checkpoint_id"], 0) + tail["total"],
+            as_of=as_of,
+        )
+        for tail in tails
+    )
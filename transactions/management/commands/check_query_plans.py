@@ -0,0 +1,215 @@
+"""
+This module defines the `check_query_plans` command, which asks the database
+how it plans to run the queries behind the list endpoints and the
+settlement queue, and fails if any of them would read a whole table or sort
+its rows instead of walking an index. Run it in CI after migrating, so a
+query or index change can't silently regress to sequential scans.
+
+The queries of the list endpoints are built by the viewsets themselves,
+from their `get_queryset` and `filter_queryset`, for a member and for an
+administrator, so they are the queries the endpoints actually run. Queries
+that match rows through an `OR` of indexes or through a join can't read
+them in the order of a single index; they may sort the rows they matched,
+but must still find them through indexes.
+
+On PostgreSQL, sequential scans and sorts are disabled for the session
+while planning, so a table too small for an index to pay off still reports
+the index that would be used on a large one.
+
+Example usage:
+
+```bash
+
+python3 manage.py check_query_plans --verbosity 2
+```
+"""
+
+import re
+import uuid
+from datetime import timedelta
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.settings import api_settings
+
+from accounts.models import FamilyAccount
+from accounts.views import (
+    FamilyAccountViewSet,
+    FundRequestViewSet,
+    SubAccountViewSet,
+)
+from famtrust.models import User
+from family_memberships.views import (
+    FamilyGroupViewSet,
+    FamilyMembershipViewSet,
+)
+from transactions import settlement
+from transactions.models import BalanceCheckpoint, LedgerEntry
+from transactions.views import TransactionViewSet
+
+# Plan lines that show a table is read without an index, by vendor
+FULL_SCAN_PATTERNS = {
+    "sqlite": re.compile(r"SCAN \w+$", re.MULTILINE),
+    "postgresql": re.compile(r"Seq Scan"),
+}
+
+# Plan lines that show rows are sorted instead of read in index order
+SORT_PATTERNS = {
+    "sqlite": re.compile(r"USE TEMP B-TREE"),
+    "postgresql": re.compile(r"Sort  \("),
+}
+
+# The viewsets whose list endpoints are checked, by name
+LIST_VIEWSETS = {
+    "sub accounts": SubAccountViewSet,
+    "family accounts": FamilyAccountViewSet,
+    "fund requests": FundRequestViewSet,
+    "transactions": TransactionViewSet,
+    "family groups": FamilyGroupViewSet,
+    "family memberships": FamilyMembershipViewSet,
+}
+
+# The list queries that match rows through an `OR` or a join
+SORTED_LISTS = (
+    "sub accounts (admin)",
+    "family accounts (member)",
+    "family accounts (admin)",
+    "family groups (member)",
+    "family groups (admin)",
+    "family memberships (admin)",
+)
+
+
+class HotQuery(NamedTuple):
+    """A query to check, and whether it may sort the rows it matched."""
+
+    queryset: QuerySet
+    may_sort: bool = False
+
+
+def get_view(viewset, *, user: User, action: str = "list"):
+    """Return a viewset set up to handle a GET request made by a user."""
+    request = RequestFactory().get("/")
+    request.ft_user = user
+    view = viewset(
+        action_map={"get": action}, format_kwarg=None, args=(), kwargs={}
+    )
+    view.request = view.initialize_request(request)
+    return view
+
+
+def get_hot_queries(
+    *, users: list[User], account_id, since
+) -> dict[str, HotQuery]:
+    """
+    Return the first page queries of the list endpoints, as the viewsets
+    build them for each user, and the queries of the settlement queue and
+    the ledger, by name.
+    """
+    page_size = api_settings.PAGE_SIZE
+    queries = {}
+    for user in users:
+        role = "admin" if user.isAdmin else "member"
+        for name, viewset in LIST_VIEWSETS.items():
+            name = f"{name} ({role})"
+            view = get_view(viewset, user=user)
+            queryset = view.filter_queryset(view.get_queryset())
+            queries[name] = HotQuery(
+                queryset[:page_size], may_sort=name in SORTED_LISTS
+            )
+
+    view = get_view(
+        FamilyAccountViewSet, user=users[0], action="fund_requests"
+    )
+    queries["fund requests of a family account"] = HotQuery(
+        view.get_fund_requests(FamilyAccount(pk=account_id))[:page_size]
+    )
+    queries["pending transactions queue"] = HotQuery(
+        settlement.get_queue()[: settings.TRANSACTIONS_SETTLEMENT_BATCH_SIZE]
+    )
+    queries["ledger entries by account"] = HotQuery(
+        LedgerEntry.objects.filter(
+            account_id=account_id, created_at__gt=since
+        )
+    )
+    queries["last balance checkpoint by account"] = HotQuery(
+        BalanceCheckpoint.objects.filter(account_id=account_id).order_by(
+            "-as_of"
+        )[:1]
+    )
+    return queries
+
+
+def make_user(*, admin: bool) -> User:
+    """Return a user to build the queries of the list endpoints for."""
+    return User.model_construct(
+        id=uuid.uuid4(), defaultGroup=uuid.uuid4(), isAdmin=admin
+    )
+
+
+def explain(queries: dict[str, HotQuery]) -> dict[str, str]:
+    """Return the plans of queries, by name."""
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("SET LOCAL enable_sort = off")
+        return {
+            name: query.queryset.explain() for name, query in queries.items()
+        }
+
+
+def get_failures(
+    queries: dict[str, HotQuery], plans: dict[str, str]
+) -> list[str]:
+    """
+    Return the names of the queries whose plans scan a whole table, or sort
+    rows they should read in index order.
+    """
+    if connection.vendor not in FULL_SCAN_PATTERNS:
+        raise CommandError(
+            f"Query plans can't be checked on {connection.vendor}"
+        )
+    full_scan = FULL_SCAN_PATTERNS[connection.vendor]
+    sort = SORT_PATTERNS[connection.vendor]
+    return [
+        name
+        for name, query in queries.items()
+        if full_scan.search(plans[name])
+        or (not query.may_sort and sort.search(plans[name]))
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fail if a query behind the list endpoints would scan or sort a "
+        "whole table."
+    )
+
+    def handle(self, *args, **options):
+        queries = get_hot_queries(
+            users=[make_user(admin=False), make_user(admin=True)],
+            account_id=uuid.uuid4(),
+            since=timezone.now() - timedelta(hours=1),
+        )
+        plans = explain(queries)
+        if options["verbosity"] > 1:
+            for name, plan in plans.items():
+                self.stdout.write(f"{name}:\n{plan}\n")
+
+        failures = get_failures(queries, plans)
+        if failures:
+            raise CommandError(
+                "These queries would scan or sort a whole table:\n\n"
+                + "\n\n".join(f"{name}:\n{plans[name]}" for name in failures)
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"All {len(queries)} query plans use an index"
+            )
+        )
@@ -0,0 +1,45 @@
+"""
+This module defines the `create_balance_checkpoints` command, which
+checkpoints the balance of every account with new ledger entries. Run it
+periodically (e.g. every few minutes from cron) to keep the tail of entries
+read by `transactions.ledger.get_balance` short.
+
+Example usage:
+
+```bash
+
+python3 manage.py create_balance_checkpoints --lag 60
+```
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from transactions import ledger
+
+
+class Command(BaseCommand):
+    help = "Checkpoint the balance of every account with new ledger entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lag",
+            type=int,
+            default=60,
+            help=(
+                "Only checkpoint entries older than this many seconds, so "
+                "transactions still in flight are not skipped."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        as_of = timezone.now() - timedelta(seconds=options["lag"])
+        checkpoints = ledger.create_checkpoints(as_of=as_of)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {len(checkpoints)} balance checkpoints as of "
+                f"{as_of.isoformat()}"
+            )
+        )
@@ -0,0 +1,35 @@
+"""
+This module defines the `rebuild_spending_rollups` command, which recomputes
+the spending rollups of family groups from their transactions, one month at
+a time. Run it after transactions are edited or deleted, or to backfill the
+rollups of the transactions made before they existed.
+
+Example usage:
+
+```bash
+
+python3 manage.py rebuild_spending_rollups --chunk-size 2000
+```
+"""
+
+from django.core.management.base import BaseCommand
+
+from transactions import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the spending rollups from the transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="The number of transactions read at a time.",
+        )
+
+    def handle(self, *args, **options):
+        written = rollups.rebuild(chunk_size=options["chunk_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {written} spending rollups")
+        )
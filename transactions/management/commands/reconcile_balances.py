@@ -0,0 +1,76 @@
+"""
+This module defines the `reconcile_balances` command, which verifies the
+stored balance of every account against the ledger, and the ledger against
+the transactions, and reports each mismatch as a JSON object on its own line
+of the standard output. Mismatches are only repaired with `--repair`, and
+never where the ledger and the transactions disagree. Run it periodically
+(e.g. nightly from cron); it exits with an error if it finds unrepaired
+mismatches.
+
+Example usage:
+
+```bash
+
+python3 manage.py reconcile_balances --workers 4 --chunks 64 > mismatches.json
+```
+"""
+
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions import reconciliation
+
+
+class Command(BaseCommand):
+    help = "Verify the balance of every account against the ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help="The number of processes verifying accounts in parallel.",
+        )
+        parser.add_argument(
+            "--chunks",
+            type=int,
+            default=64,
+            help="The number of key ranges the accounts are verified in.",
+        )
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help=(
+                "Set mismatched balances to their ledger balance, where the "
+                "ledger matches the transactions."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        checked = 0
+
+        def on_range(count):
+            nonlocal checked
+            checked += count
+
+        mismatches = 0
+        unrepaired = 0
+        for mismatch in reconciliation.reconcile(
+            workers=options["workers"],
+            chunks=options["chunks"],
+            repair=options["repair"],
+            on_range=on_range,
+        ):
+            mismatches += 1
+            unrepaired += not mismatch["repaired"]
+            self.stdout.write(json.dumps(mismatch))
+
+        summary = (
+            f"Verified {checked} accounts, found {mismatches} mismatched "
+            "balances"
+        )
+        if unrepaired:
+            raise CommandError(summary)
+        self.stderr.write(self.style.SUCCESS(summary))
@@ -0,0 +1,65 @@
+"""
+This module defines the `settle_transactions` command, a worker that settles
+the transactions left pending when `TRANSACTIONS_ASYNC_SETTLEMENT` is
+enabled. Run one or more workers next to the web servers; they share the
+queue without settling a transaction twice.
+
+Example usage:
+
+```bash
+
+python3 manage.py settle_transactions --batch-size 100 --interval 1
+```
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from transactions import settlement
+
+
+class Command(BaseCommand):
+    help = "Settle pending transactions in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.TRANSACTIONS_SETTLEMENT_BATCH_SIZE,
+            help="The number of transactions settled at a time.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait for new transactions when none are pending.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when no transactions are pending instead of waiting.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        try:
+            while True:
+                # Replace the connection if the database dropped it
+                close_old_connections()
+                settled, failed = settlement.settle_batch(
+                    batch_size=batch_size
+                )
+                if settled or failed:
+                    self.stdout.write(
+                        f"Settled {settled} transactions, {failed} failed"
+                    )
+                if settled + failed < batch_size:
+                    if options["once"]:
+                        break
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS("Stopped settling transactions"))
@@ -0,0 +1,137 @@
+# Generated by Django 5.0.9 on 2026-10-17 02:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_opening_checkpoints(apps, schema_editor):
+    """Checkpoint the balances accounts had before the ledger existed."""
+    BalanceCheckpoint = apps.get_model("transactions", "BalanceCheckpoint")
+    as_of = timezone.now()
+    for model_name, account_type in (
+        ("SubAccount", "sub_account"),
+        ("FamilyAccount", "family_account"),
+    ):
+        accounts = apps.get_model("accounts", model_name).objects.all()
+        BalanceCheckpoint.objects.bulk_create(
+            (
+                BalanceCheckpoint(
+                    account_type=account_type,
+                    account_id=account_id,
+                    balance=balance,
+                    as_of=as_of,
+                )
+                for account_id, balance in accounts.values_list(
+                    "id", "balance"
+                ).iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_alter_familyaccount_name"),
+        ("transactions", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BalanceCheckpoint",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "account_type",
+                    models.CharField(
+                        choices=[
+                            ("sub_account", "Sub Account"),
+                            ("family_account", "Family Account"),
+                            ("external", "External"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("account_id", models.UUIDField()),
+                (
+                    "balance",
+                    models.DecimalField(decimal_places=2, max_digits=10),
+                ),
+                (
+                    "as_of",
+                    models.DateTimeField(
+                        db_comment=(
+                            "The balance includes every entry created up to "
+                            "this time"
+                        )
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "balance_checkpoints",
+                "indexes": [
+                    models.Index(
+                        fields=["account_id", "as_of"],
+                        name="checkpoint_account_as_of_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="LedgerEntry",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "account_type",
+                    models.CharField(
+                        choices=[
+                            ("sub_account", "Sub Account"),
+                            ("family_account", "Family Account"),
+                            ("external", "External"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "account_id",
+                    models.UUIDField(
+                        db_comment="The debited or credited account",
+                        null=True,
+                    ),
+                ),
+                (
+                    "amount",
+                    models.DecimalField(
+                        db_comment=(
+                            "Negative for debits and positive for credits"
+                        ),
+                        decimal_places=2,
+                        max_digits=10,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(editable=False)),
+                (
+                    "transaction",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="ledger_entries",
+                        to="transactions.transaction",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "ledger_entries",
+                "indexes": [
+                    models.Index(
+                        fields=["account_id", "created_at"],
+                        name="ledger_account_created_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(
+            create_opening_checkpoints, migrations.RunPython.noop
+        ),
+    ]
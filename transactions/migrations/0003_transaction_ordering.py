@@ -0,0 +1,17 @@
+# Generated by Django 5.0.9 on 2026-10-17 02:39
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transactions", "0002_ledger"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="transaction",
+            options={"ordering": ["-created_at", "-id"]},
+        ),
+    ]
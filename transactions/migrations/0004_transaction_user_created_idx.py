@@ -0,0 +1,20 @@
+# Generated by Django 5.0.9 on 2026-10-17 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transactions", "0003_transaction_ordering"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["user_id", "-created_at", "-id"],
+                name="transaction_user_created_idx",
+            ),
+        ),
+    ]
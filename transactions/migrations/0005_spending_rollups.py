@@ -0,0 +1,120 @@
+# Generated by Django 5.0.9 on 2026-10-17 02:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("family_memberships", "0003_membership_indexes"),
+        ("transactions", "0004_transaction_user_created_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SpendingRollup",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "user_id",
+                    models.UUIDField(
+                        db_comment="The member who made the transactions"
+                    ),
+                ),
+                (
+                    "month",
+                    models.DateField(
+                        db_comment=(
+                            "The first day of the month the transactions "
+                            "were made in"
+                        )
+                    ),
+                ),
+                (
+                    "transaction_type",
+                    models.CharField(
+                        choices=[
+                            ("savings", "Savings"),
+                            ("withdrawal", "Withdrawal"),
+                            ("investment", "Investment"),
+                            ("airtime_top_up", "Airtime Top Up"),
+                            ("bill_payment", "Bill Payment"),
+                            ("transfers", "Transfers"),
+                            ("fund_request", "Fund Request"),
+                        ],
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "transaction_direction",
+                    models.CharField(
+                        choices=[
+                            (
+                                "sub_account_to_sub_account",
+                                "Sub Account to Sub Account",
+                            ),
+                            (
+                                "sub_account_to_family_account",
+                                "Sub Account to Family Account",
+                            ),
+                            (
+                                "family_account_to_sub_account",
+                                "Family Account to Sub Account",
+                            ),
+                            (
+                                "family_account_to_family_account",
+                                "Family Account to Family Account",
+                            ),
+                            ("bank_to_sub_account", "Bank to Sub Account"),
+                            ("sub_account_to_bank", "Sub Account to Bank"),
+                            (
+                                "bank_to_family_account",
+                                "Bank to Family Account",
+                            ),
+                            (
+                                "family_account_to_bank",
+                                "Family Account to Bank",
+                            ),
+                            (
+                                "mobile_wallet_to_family_account",
+                                "Mobile Wallet to Family Account",
+                            ),
+                        ],
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "total",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=14
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "family_group",
+                    models.ForeignKey(
+                        db_comment=(
+                            "The family group of the accounts of the "
+                            "transactions"
+                        ),
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="spending_rollups",
+                        to="family_memberships.familygroup",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "spending_rollups",
+                "unique_together": {
+                    (
+                        "family_group",
+                        "month",
+                        "user_id",
+                        "transaction_type",
+                        "transaction_direction",
+                    )
+                },
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.9 on 2026-10-17 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transactions", "0005_spending_rollups"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                condition=models.Q(("transaction_status", "pending")),
+                fields=["created_at"],
+                name="transaction_pending_idx",
+            ),
+        ),
+    ]
@@ -3,12 +3,15 @@ This module defines the models for handling transactions and related models in
 the FamTrust web app.
 """
 
+from functools import partial
 from uuid import uuid4
 
 from django.db import models
 from django.utils import timezone
 
 from accounts import models as accounts_models
+from family_memberships import models as fm_models
+from transactions import settlement, transfers
 from transactions.validators import ValidateTransactionData
 
 
@@ -140,12 +143,31 @@ class Transaction(models.Model):
 
     class Meta:
         db_table = "transactions"
-        ordering = ["-created_at", "-updated_at"]
+        # `id` breaks ties so the ordering is unique, which cursor
+        # pagination (see `famtrust.utils.Pagination`) relies on
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(
+                fields=["user_id", "-created_at", "-id"],
+                name="transaction_user_created_idx",
+            ),
+            # The queue of transactions waiting for a settlement worker
+            models.Index(
+                fields=["created_at"],
+                name="transaction_pending_idx",
+                condition=models.Q(transaction_status="pending"),
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         """
         Save the new transaction and set the `created_at` and `updated_at`
         fields correctly.
+
+        A new transaction moves its funds and is inserted atomically through
+        the transfer engine, unless it is left pending for a settlement
+        worker (see `transactions.settlement`); saving an existing one does
+        not move funds again.
         """
         if not self.created_at:
             current_time = timezone.now()
@@ -155,5 +177,132 @@ class Transaction(models.Model):
             self.updated_at = timezone.now()
 
         ValidateTransactionData(self)
+        if not self._state.adding:
+            return super(Transaction, self).save(*args, **kwargs)
+
+        if settlement.is_deferred(self):
+            self.transaction_status = TransactionStatusEnum.PENDING
+            return super(Transaction, self).save(*args, **kwargs)
+
         self.transaction_status = TransactionStatusEnum.SUCCESSFUL
-        return super(Transaction, self).save(*args, **kwargs)
+        transfers.execute(
+            self, save=partial(super(Transaction, self).save, *args, **kwargs)
+        )
+
+
+class LedgerAccountTypeEnum(models.TextChoices):
+    """Enum types of accounts ledger entries are written for."""
+
+    SUB_ACCOUNT = "sub_account", "Sub Account"
+    FAMILY_ACCOUNT = "family_account", "Family Account"
+    EXTERNAL = "external", "External"
+
+
+class LedgerEntry(models.Model):
+    """
+    Model representing a debit or a credit of an account.
+
+    Every transaction writes one debit entry (negative amount) and one
+    credit entry (positive amount) that add up to zero; the bank side of an
+    external transfer is written as an `external` entry without an account.
+    Entries are never updated or deleted, and outlive the transaction they
+    were written for.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="ledger_entries",
+    )
+    account_type = models.CharField(
+        max_length=20, choices=LedgerAccountTypeEnum.choices
+    )
+    account_id = models.UUIDField(
+        null=True, db_comment="The debited or credited account"
+    )
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        db_comment="Negative for debits and positive for credits",
+    )
+    created_at = models.DateTimeField(null=False, blank=False, editable=False)
+
+    class Meta:
+        db_table = "ledger_entries"
+        indexes = [
+            models.Index(
+                fields=["account_id", "created_at"],
+                name="ledger_account_created_idx",
+            ),
+        ]
+
+
+class BalanceCheckpoint(models.Model):
+    """
+    Model representing the balance of an account as of a point in time, so
+    balances can be computed from the last checkpoint and the ledger entries
+    written after it.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    account_type = models.CharField(
+        max_length=20, choices=LedgerAccountTypeEnum.choices
+    )
+    account_id = models.UUIDField()
+    balance = models.DecimalField(max_digits=10, decimal_places=2)
+    as_of = models.DateTimeField(
+        db_comment="The balance includes every entry created up to this time"
+    )
+
+    class Meta:
+        db_table = "balance_checkpoints"
+        indexes = [
+            models.Index(
+                fields=["account_id", "as_of"],
+                name="checkpoint_account_as_of_idx",
+            ),
+        ]
+
+
+class SpendingRollup(models.Model):
+    """
+    Model representing the total of the successful transactions a member of
+    a family group made in a month, by transaction type and direction.
+
+    Rollups are updated in the same database transaction as the transactions
+    they add up, so summaries read them instead of scanning transactions.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    family_group = models.ForeignKey(
+        fm_models.FamilyGroup,
+        on_delete=models.CASCADE,
+        db_comment="The family group of the accounts of the transactions",
+        related_name="spending_rollups",
+    )
+    user_id = models.UUIDField(
+        db_comment="The member who made the transactions"
+    )
+    month = models.DateField(
+        db_comment="The first day of the month the transactions were made in"
+    )
+    transaction_type = models.CharField(
+        max_length=50, choices=TransactionTypeEnum.choices
+    )
+    transaction_direction = models.CharField(
+        max_length=100, choices=TransactionDirectionEnum.choices
+    )
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "spending_rollups"
+        unique_together = (
+            "family_group",
+            "month",
+            "user_id",
+            "transaction_type",
+            "transaction_direction",
+        )
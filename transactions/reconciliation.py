@@ -0,0 +1,282 @@
+"""
+This module defines the reconciliation of the stored balances of accounts
+with the ledger.
+
+The expected balance of an account is its ledger balance: its last balance
+checkpoint plus the entries appended after it (see `transactions.ledger`).
+The ledger is append-only, so it is cross-checked against the transaction
+rows, which can be edited: the total of the successful transactions
+crediting an account minus those debiting it, following the transaction
+directions of the transfer engine. Accounts that existed before the ledger
+start from their opening checkpoint instead of 0, and only the transactions
+created after it are counted.
+
+Accounts are verified in ranges of primary keys, in parallel, with one
+aggregate query per account column and range and without locking anything.
+Since transfers may commit while a range is verified, every mismatch found
+is verified again with the account locked before it is reported.
+
+A balance that differs from a ledger which agrees with the transactions can
+be repaired: it is set to the ledger balance. When the ledger and the
+transactions disagree, the expected balance is unknown, so the mismatch is
+reported and never repaired.
+
+Example usage:
+
+```python
+
+from transactions import reconciliation
+
+for mismatch in reconciliation.reconcile(workers=4, chunks=64, repair=False):
+    print(mismatch["account_id"], mismatch["difference"])
+```
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from typing import Any, Callable, Iterator
+
+import django
+from django.db import transaction as db_transaction
+from django.db.models import F, Model, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+import transactions.models as md
+from accounts import aggregates, models as accounts_models
+from transactions import ledger, transfers
+
+ACCOUNT_MODELS = (accounts_models.SubAccount, accounts_models.FamilyAccount)
+
+KeyRange = tuple[uuid.UUID | None, uuid.UUID | None]
+
+
+def get_key_ranges(chunks: int) -> list[KeyRange]:
+    """
+    Split the space of UUID primary keys into `chunks` ranges, each
+    including its lower bound and excluding its upper bound.
+    """
+    bounds = [uuid.UUID(int=i * 2**128 // chunks) for i in range(1, chunks)]
+    return list(zip([None, *bounds], [*bounds, None]))
+
+
+def get_range_lookups(column: str, key_range: KeyRange) -> dict[str, Any]:
+    """Return the lookups that limit a column to a range of keys."""
+    lower, upper = key_range
+    lookups = {}
+    if lower is not None:
+        lookups[f"{column}__gte"] = lower
+    if upper is not None:
+        lookups[f"{column}__lt"] = upper
+    return lookups
+
+
+def get_flows(model: type[Model]) -> dict[tuple[str, int], list[str]]:
+    """
+    Return the transaction directions that move the funds of an account
+    model, keyed by the transaction column of the account and the sign of
+    the balance change.
+    """
+    flows = defaultdict(list)
+    for direction, fields in transfers.TRANSFER_FIELDS.items():
+        for field, sign in zip(fields, (-1, 1)):
+            if (
+                field is not None
+                and md.Transaction._meta.get_field(field).related_model
+                is model
+            ):
+                flows[(f"{field}_id", sign)].append(direction)
+    return dict(flows)
+
+
+def get_transaction_balances(
+    model: type[Model], lookups: Callable[[str], dict[str, Any]]
+) -> dict[Any, Decimal]:
+    """
+    Return the balances of the accounts according to their transactions, for
+    the accounts whose column matches `lookups(column)`. The balance of an
+    account that existed before the ledger starts from its opening
+    checkpoint, and only the transactions created after it are counted: the
+    transactions before it were not all recorded by the transfer engine.
+    """
+    openings = ledger.get_opening_checkpoints(
+        account_type=ledger.ACCOUNT_TYPES[model]
+    )
+    balances = defaultdict(
+        Decimal,
+        openings.filter(**lookups("account_id")).values_list(
+            "account_id", "balance"
+        ),
+    )
+    successful = md.Transaction.objects.filter(
+        transaction_status=md.TransactionStatusEnum.SUCCESSFUL
+    )
+    for (column, sign), directions in get_flows(model).items():
+        totals = (
+            successful.filter(
+                transaction_direction__in=directions, **lookups(column)
+            )
+            .annotate(
+                opened_at=Subquery(
+                    openings.filter(account_id=OuterRef(column)).values(
+                        "as_of"
+                    )[:1]
+                )
+            )
+            .filter(Q(opened_at=None) | Q(created_at__gt=F("opened_at")))
+            .values_list(column)
+            .annotate(total=Sum("amount"))
+            .order_by()
+        )
+        for pk, total in totals:
+            balances[pk] += sign * total
+    return balances
+
+
+def get_mismatch(
+    model: type[Model],
+    pk,
+    balance: Decimal,
+    ledger_balance: Decimal,
+    transactions_balance: Decimal,
+) -> dict[str, Any] | None:
+    """
+    Return the structured report of a balance that doesn't match the
+    ledger, or of a ledger that doesn't match the transactions, or `None`
+    if everything matches.
+    """
+    if balance == ledger_balance == transactions_balance:
+        return None
+    ledger_balance = Decimal(ledger_balance).quantize(balance)
+    transactions_balance = Decimal(transactions_balance).quantize(balance)
+    return {
+        "account_type": ledger.ACCOUNT_TYPES[model],
+        "account_id": str(pk),
+        "balance": str(balance),
+        "expected_balance": str(ledger_balance),
+        "difference": str(balance - ledger_balance),
+        "transactions_balance": str(transactions_balance),
+        "ledger_matches_transactions": (
+            ledger_balance == transactions_balance
+        ),
+    }
+
+
+def verify_range(key_range: KeyRange) -> tuple[int, list[dict[str, Any]]]:
+    """
+    Compare the balances of the accounts in a range of keys with the ledger,
+    and the ledger with the transactions, without locking. Returns the
+    number of accounts verified and the mismatches found.
+    """
+    checked = 0
+    mismatches = []
+    for model in ACCOUNT_MODELS:
+        ledger_balances = ledger.get_balances(
+            **get_range_lookups("account_id", key_range)
+        )
+        transaction_balances = get_transaction_balances(
+            model, lambda column: get_range_lookups(column, key_range)
+        )
+        accounts = model.objects.filter(
+            **get_range_lookups("pk", key_range)
+        ).values_list("pk", "balance")
+        for pk, balance in accounts.iterator():
+            checked += 1
+            mismatch = get_mismatch(
+                model,
+                pk,
+                balance,
+                ledger_balances.get(pk, Decimal(0)),
+                transaction_balances.get(pk, Decimal(0)),
+            )
+            if mismatch is not None:
+                mismatches.append(mismatch)
+    return checked, mismatches
+
+
+def confirm(mismatch: dict[str, Any], *, repair: bool) -> dict | None:
+    """
+    Verify a mismatch again with its account locked, and repair it if
+    `repair` is set and the ledger matches the transactions. Returns the
+    confirmed mismatch, or `None` if the balance matches (a transfer
+    committed while it was first verified).
+    """
+    model = next(
+        model
+        for model in ACCOUNT_MODELS
+        if ledger.ACCOUNT_TYPES[model] == mismatch["account_type"]
+    )
+    pk = uuid.UUID(mismatch["account_id"])
+    with db_transaction.atomic():
+        balance = (
+            model.objects.select_for_update()
+            .filter(pk=pk)
+            .values_list("balance", flat=True)
+            .first()
+        )
+        if balance is None:
+            return None
+        ledger_balance = ledger.get_balance(account_id=pk)
+        mismatch = get_mismatch(
+            model,
+            pk,
+            balance,
+            ledger_balance,
+            get_transaction_balances(model, lambda column: {column: pk}).get(
+                pk, Decimal(0)
+            ),
+        )
+        if mismatch is None:
+            return None
+
+        # The ledger can only be trusted if the transactions agree with it
+        repair = repair and mismatch["ledger_matches_transactions"]
+        mismatch["repaired"] = repair
+        if repair:
+            model.objects.filter(pk=pk).update(
+                balance=ledger_balance, updated_at=timezone.now()
+            )
+            aggregates.record(
+                [transfers.Entry(model, pk, ledger_balance - balance)],
+                at=None,
+            )
+    return mismatch
+
+
+def reconcile(
+    *, workers: int, chunks: int, repair: bool, on_range=None
+) -> Iterator[dict[str, Any]]:
+    """
+    Verify every account, `chunks` key ranges at a time over a pool of
+    `workers` processes, and yield the confirmed mismatches. `on_range` is
+    called with the number of accounts verified in every range.
+    """
+    ranges = get_key_ranges(chunks)
+    if workers > 1:
+        # Workers are spawned instead of forked, so they don't inherit the
+        # database connections of this process
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+        results = pool.map(verify_range, ranges)
+    else:
+        pool = None
+        results = map(verify_range, ranges)
+
+    try:
+        for checked, mismatches in results:
+            if on_range is not None:
+                on_range(checked)
+            for mismatch in mismatches:
+                confirmed = confirm(mismatch, repair=repair)
+                if confirmed is not None:
+                    yield confirmed
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
@@ -0,0 +1,170 @@
+"""
+This module defines the monthly spending rollups behind the spending
+summaries of family groups.
+
+A successful transaction adds its amount to the `SpendingRollup` of every
+family group its accounts belong to, for the member who made it and the
+month, type and direction of the transaction. Rollups are updated in the
+database transaction that moves the funds, so a summary reads one row per
+month, member, type and direction instead of every transaction.
+
+Rollups only follow new transactions. Run the `rebuild_spending_rollups`
+command to recompute them after transactions are edited or deleted.
+
+Example usage:
+
+```python
+
+from transactions import rollups
+
+rollups.record([transaction.id])
+rollups.rebuild(chunk_size=2000)
+```
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, NamedTuple, Sequence
+
+from django.db import transaction as db_transaction
+from django.db.models import F, QuerySet
+from django.utils import timezone
+
+import transactions.models as md
+
+FIELDS = (
+    "user_id",
+    "transaction_type",
+    "transaction_direction",
+    "amount",
+    "created_at",
+)
+
+# The family group of each account a transaction can move funds from or to
+FAMILY_GROUP_FIELDS = (
+    "sub_source_account__family_account__family_group_id",
+    "sub_destination_account__family_account__family_group_id",
+    "family_source_account__family_group_id",
+    "family_destination_account__family_group_id",
+)
+
+
+class Key(NamedTuple):
+    family_group_id: object
+    month: date
+    user_id: object
+    transaction_type: str
+    transaction_direction: str
+
+
+class Total(NamedTuple):
+    total: Decimal
+    count: int
+
+
+def get_month(created_at: datetime) -> date:
+    """Return the first day of the month of a point in time."""
+    return timezone.localtime(created_at).date().replace(day=1)
+
+
+def get_totals(
+    queryset: QuerySet, *, chunk_size: int | None = None
+) -> dict[Key, Total]:
+    """Add up the successful transactions of a queryset by rollup."""
+    rows = queryset.filter(
+        transaction_status=md.TransactionStatusEnum.SUCCESSFUL
+    ).values_list(*FIELDS, *FAMILY_GROUP_FIELDS)
+    if chunk_size is not None:
+        rows = rows.iterator(chunk_size=chunk_size)
+
+    totals = defaultdict(lambda: Total(Decimal(0), 0))
+    for user_id, type_, direction, amount, created_at, *groups in rows:
+        month = get_month(created_at)
+        for family_group_id in set(groups) - {None}:
+            key = Key(family_group_id, month, user_id, type_, direction)
+            total, count = totals[key]
+            totals[key] = Total(total + amount, count + 1)
+    return dict(totals)
+
+
+def add(totals: dict[Key, Total]) -> None:
+    """
+    Add totals to their rollups. Rows are locked in key order, so
+    concurrent transactions can't deadlock on them.
+    """
+    keys = sorted(totals, key=lambda key: tuple(map(str, key)))
+    md.SpendingRollup.objects.bulk_create(
+        [md.SpendingRollup(**key._asdict()) for key in keys],
+        ignore_conflicts=True,
+    )
+    for key in keys:
+        md.SpendingRollup.objects.filter(**key._asdict()).update(
+            total=F("total") + totals[key].total,
+            count=F("count") + totals[key].count,
+        )
+
+
+def record(transaction_ids: Sequence, *, batch_size: int = 500) -> None:
+    """
+    Add saved transactions to their rollups. Must run in the database
+    transaction that saved them.
+    """
+    totals = defaultdict(lambda: Total(Decimal(0), 0))
+    for start in range(0, len(transaction_ids), batch_size):
+        batch = md.Transaction.objects.filter(
+            pk__in=transaction_ids[start:start + batch_size]
+        )
+        for key, (total, count) in get_totals(batch).items():
+            totals[key] = Total(
+                totals[key].total + total, totals[key].count + count
+            )
+    add(totals)
+
+
+def get_months(queryset: QuerySet) -> Iterable[date]:
+    """Return the months the successful transactions of a queryset are in."""
+    return queryset.filter(
+        transaction_status=md.TransactionStatusEnum.SUCCESSFUL
+    ).dates("created_at", "month")
+
+
+def rebuild_month(month: date, *, chunk_size: int) -> int:
+    """
+    Recompute the rollups of a month from its transactions, atomically.
+    Returns the number of rollups written.
+    """
+    start = timezone.make_aware(datetime(month.year, month.month, 1))
+    if month.month == 12:
+        end = start.replace(year=month.year + 1, month=1)
+    else:
+        end = start.replace(month=month.month + 1)
+
+    with db_transaction.atomic():
+        md.SpendingRollup.objects.filter(month=month).delete()
+        totals = get_totals(
+            md.Transaction.objects.filter(
+                created_at__gte=start, created_at__lt=end
+            ),
+            chunk_size=chunk_size,
+        )
+        md.SpendingRollup.objects.bulk_create(
+            [
+                md.SpendingRollup(**key._asdict(), total=total, count=count)
+                for key, (total, count) in totals.items()
+            ],
+            batch_size=chunk_size,
+        )
+    return len(totals)
+
+
+def rebuild(*, chunk_size: int) -> int:
+    """
+    Recompute every rollup from the transactions, one month at a time.
+    Returns the number of rollups written.
+    """
+    months = list(get_months(md.Transaction.objects.all()))
+    md.SpendingRollup.objects.exclude(month__in=months).delete()
+    return sum(rebuild_month(month, chunk_size=chunk_size) for month in months)
@@ -2,6 +2,9 @@
 This module defines serializers for transactions.
 """
 
+from decimal import Decimal
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from rest_framework import (
@@ -14,11 +17,16 @@ from accounts import (
     serializers as accounts_serializers,
 )
 from famtrust import utils
+from famtrust.serializers import SparseFieldsMixin
 from transactions import models
 
 
-class TransactionSerializer(serializers.ModelSerializer):
-    """Serializer for Transaction model."""
+class TransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Serializer for Transaction model. Funds only move when a transaction is
+    created (see `transactions.transfers`), so the fields that decide which
+    funds move are read-only once it exists.
+    """
 
     family_source_account = (
         accounts_serializers.FamilyAccountSummarySerializer(
@@ -68,6 +76,27 @@ class TransactionSerializer(serializers.ModelSerializer):
         model = models.Transaction
         fields = "__all__"
         read_only_fields = ("user_id", "transaction_status")
+        immutable_fields = (
+            "amount",
+            "transaction_type",
+            "transaction_direction",
+            "fund_request_id",
+            "family_source_account_id",
+            "family_destination_account_id",
+            "sub_source_account_id",
+            "sub_destination_account_id",
+        )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            for name in self.Meta.immutable_fields:
+                # Sparse fieldsets may have left the field out
+                if name not in fields:
+                    continue
+                fields[name].read_only = True
+                fields[name].required = False
+        return fields
 
     def create(self, validated_data):
         try:
@@ -98,3 +127,142 @@ class TransactionSerializer(serializers.ModelSerializer):
                 code="error",
                 status_code=status.HTTP_400_BAD_REQUEST,
             )
+
+
+class BulkTransactionItemSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a transaction in a bulk request. The accounts and fund
+    requests are looked up per batch instead of per transaction.
+    """
+
+    amount = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal("0.01")
+    )
+    sub_source_account_id = serializers.UUIDField(
+        required=False, allow_null=True
+    )
+    sub_destination_account_id = serializers.UUIDField(
+        required=False, allow_null=True
+    )
+    family_source_account_id = serializers.UUIDField(
+        required=False, allow_null=True
+    )
+    family_destination_account_id = serializers.UUIDField(
+        required=False, allow_null=True
+    )
+    fund_request_id = serializers.UUIDField(required=False, allow_null=True)
+
+    class Meta:
+        model = models.Transaction
+        fields = (
+            "amount",
+            "transaction_type",
+            "transaction_direction",
+            "details",
+            "sub_source_account_id",
+            "sub_destination_account_id",
+            "family_source_account_id",
+            "family_destination_account_id",
+            "fund_request_id",
+        )
+
+
+class BulkTransactionSerializer(serializers.Serializer):
+    """Serializer for a bulk transactions request."""
+
+    transactions = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=settings.TRANSACTIONS_BULK_MAX_SIZE,
+    )
+    mode = serializers.ChoiceField(
+        choices=("all_or_nothing", "best_effort"),
+        default="all_or_nothing",
+        help_text=(
+            "`all_or_nothing` creates every transaction or none of them, "
+            "`best_effort` creates every transaction that can be created."
+        ),
+    )
+
+
+class BulkTransactionResultSerializer(serializers.Serializer):
+    """Serializer for the result of a transaction in a bulk request."""
+
+    index = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=("created", "failed", "skipped"))
+    id = serializers.UUIDField(required=False)
+    errors = serializers.JSONField(required=False)
+
+
+class BulkTransactionResponseSerializer(serializers.Serializer):
+    """Serializer for the response of a bulk transactions request."""
+
+    created = serializers.IntegerField()
+    failed = serializers.IntegerField()
+    results = BulkTransactionResultSerializer(many=True)
+
+
+class TransactionExportSerializer(serializers.Serializer):
+    """Serializer for the query parameters of a transactions export."""
+
+    file_format = serializers.ChoiceField(
+        choices=("csv", "ndjson"),
+        default="csv",
+        help_text="`csv`, or `ndjson` for one JSON object per line.",
+    )
+    created_after = serializers.DateTimeField(
+        required=False,
+        help_text="Only export transactions created at or after this time.",
+    )
+    created_before = serializers.DateTimeField(
+        required=False,
+        help_text="Only export transactions created before this time.",
+    )
+    account_id = serializers.UUIDField(
+        required=False,
+        help_text=(
+            "Only export transactions from or to this sub account or "
+            "family account."
+        ),
+    )
+
+    def validate(self, attrs):
+        created_after = attrs.get("created_after")
+        created_before = attrs.get("created_before")
+        if created_after and created_before and created_after > created_before:
+            raise serializers.ValidationError(
+                _("created_after must not be later than created_before")
+            )
+        return attrs
+
+
+class SpendingRollupQuerySerializer(serializers.Serializer):
+    """Serializer for the query parameters of a spending summary."""
+
+    family_group_id = serializers.UUIDField()
+    month_from = serializers.DateField(
+        required=False,
+        help_text="Only include this month and the months after it.",
+    )
+    month_to = serializers.DateField(
+        required=False,
+        help_text="Only include this month and the months before it.",
+    )
+    by_member = serializers.BooleanField(
+        default=False,
+        help_text=(
+            "Break the totals down by member. Members who don't own the "
+            "family group only get their own totals."
+        ),
+    )
+
+
+class SpendingRollupSerializer(serializers.Serializer):
+    """Serializer for the totals of a month in a spending summary."""
+
+    month = serializers.DateField()
+    user_id = serializers.UUIDField(required=False)
+    transaction_type = serializers.CharField()
+    transaction_direction = serializers.CharField()
+    total = serializers.DecimalField(max_digits=14, decimal_places=2)
+    count = serializers.IntegerField()
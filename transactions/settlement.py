@@ -0,0 +1,123 @@
+"""
+This module defines the asynchronous settlement of external transactions.
+
+When `TRANSACTIONS_ASYNC_SETTLEMENT` is enabled, transactions from or to a
+bank or a mobile wallet are saved as `pending` without moving their funds,
+and the request returns right away. The `settle_transactions` worker then
+claims pending transactions in batches with `SELECT ... FOR UPDATE SKIP
+LOCKED`, so any number of workers can share the queue, moves their funds
+through the transfer engine and marks each one `successful`, or `failed` if
+its funds can't be moved.
+
+Example usage:
+
+```python
+
+from transactions import settlement
+
+settled, failed = settlement.settle_batch(batch_size=100)
+```
+"""
+
+from __future__ import annotations
+
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+import transactions.models as md
+from transactions import rollups, transfers
+
+logger = logging.getLogger(__name__)
+
+# The transaction directions (see `TransactionDirectionEnum`) from or to a
+# bank or a mobile wallet
+EXTERNAL_DIRECTIONS = (
+    "bank_to_sub_account",
+    "sub_account_to_bank",
+    "bank_to_family_account",
+    "family_account_to_bank",
+    "mobile_wallet_to_family_account",
+)
+
+
+def is_deferred(transaction: md.Transaction) -> bool:
+    """Return whether a new transaction is left pending for a worker."""
+    return (
+        settings.TRANSACTIONS_ASYNC_SETTLEMENT
+        and transaction.transaction_direction in EXTERNAL_DIRECTIONS
+    )
+
+
+def get_queue():
+    """Return the pending transactions, oldest first."""
+    return md.Transaction.objects.filter(
+        transaction_status=md.TransactionStatusEnum.PENDING
+    ).order_by("created_at")
+
+
+def claim(*, batch_size: int) -> list[md.Transaction]:
+    """
+    Lock the oldest pending transactions that no other worker has claimed.
+    Must run inside a database transaction.
+    """
+    return list(get_queue().select_for_update(skip_locked=True)[:batch_size])
+
+
+def settle(transactions: list[md.Transaction]) -> tuple[list, list]:
+    """
+    Move the funds of claimed transactions and mark them `successful` or
+    `failed`. Must run inside the database transaction that claimed them.
+    Returns the primary keys of the settled and the failed transactions.
+    """
+    # Locking every account up front keeps workers from deadlocking on
+    # accounts locked one transaction at a time
+    transfers.lock(
+        entry
+        for transaction in transactions
+        for entry in transfers.get_entries(transaction)
+    )
+
+    settled = []
+    failed = []
+    for transaction in transactions:
+        try:
+            with db_transaction.atomic():
+                transfers.apply(transaction)
+        except ValidationError as e:
+            logger.info(
+                "Transaction %s failed to settle: %s",
+                transaction.pk,
+                "; ".join(e.messages),
+            )
+            failed.append(transaction.pk)
+        else:
+            settled.append(transaction.pk)
+
+    now = timezone.now()
+    for pks, status in (
+        (settled, md.TransactionStatusEnum.SUCCESSFUL),
+        (failed, md.TransactionStatusEnum.FAILED),
+    ):
+        if pks:
+            md.Transaction.objects.filter(pk__in=pks).update(
+                transaction_status=status, updated_at=now
+            )
+    rollups.record(settled)
+    return settled, failed
+
+
+def settle_batch(*, batch_size: int) -> tuple[int, int]:
+    """
+    Claim and settle a batch of pending transactions, atomically. Returns
+    the number of settled and failed transactions.
+    """
+
+    def claim_and_settle():
+        return settle(claim(batch_size=batch_size))
+
+    settled, failed = transfers.run_with_retries(claim_and_settle)
+    return len(settled), len(failed)
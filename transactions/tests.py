@@ -1,3 +1,1050 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import threading
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, Sum
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import FamilyAccount, FundRequest, SubAccount
+from famtrust.models import User
+from famtrust.testing import (
+    FamilyAccountMixin,
+    StubAuthServiceMixin,
+    create_family_account,
+    create_sub_account,
+)
+from family_memberships.models import FamilyGroup, FamilyMembership
+from transactions import (
+    export,
+    ledger,
+    reconciliation,
+    rollups,
+    settlement,
+    transfers,
+)
+from transactions.management.commands import check_query_plans
+from transactions.models import (
+    BalanceCheckpoint,
+    LedgerEntry,
+    SpendingRollup,
+    Transaction,
+    TransactionStatusEnum,
+)
+
+
+def create_transfer(*, user_id, source, destination, amount, **kwargs):
+    """Create a transaction moving funds between two accounts."""
+    fields = {
+        SubAccount: ("sub_source_account", "sub_destination_account"),
+        FamilyAccount: ("family_source_account", "family_destination_account"),
+    }
+    kinds = {SubAccount: "sub_account", FamilyAccount: "family_account"}
+    kwargs.setdefault("transaction_type", "transfers")
+    kwargs.setdefault("details", "Transfer")
+    return Transaction.objects.create(
+        user_id=user_id,
+        amount=amount,
+        transaction_direction=(
+            f"{kinds[type(source)]}_to_{kinds[type(destination)]}"
+        ),
+        **{
+            fields[type(source)][0]: source,
+            fields[type(destination)][1]: destination,
+        },
+        **kwargs,
+    )
+
+
+class LedgerTests(FamilyAccountMixin, TestCase):
+    sub_account_balance = 30
+
+    def test_transactions_write_balanced_entries(self):
+        entries = LedgerEntry.objects.values("transaction_id").annotate(
+            count=Count("id"), total=Sum("amount")
+        )
+
+        self.assertEqual(len(entries), Transaction.objects.count())
+        for entry in entries:
+            self.assertEqual((entry["count"], entry["total"]), (2, 0))
+        self.assertEqual(
+            ledger.get_balance(account_id=self.family_account.pk), 70
+        )
+        self.assertEqual(
+            ledger.get_balance(account_id=self.sub_account.pk), 30
+        )
+
+    def test_balance_adds_the_entries_after_the_last_checkpoint(self):
+        as_of = timezone.now()
+        checkpoints = ledger.create_checkpoints(as_of=as_of)
+        create_transfer(
+            user_id=self.user_id,
+            source=self.sub_account,
+            destination=self.family_account,
+            amount=10,
+        )
+
+        self.assertEqual(
+            {(c.account_id, c.balance) for c in checkpoints},
+            {(self.family_account.pk, 70), (self.sub_account.pk, 30)},
+        )
+        self.assertEqual(
+            ledger.get_balance(account_id=self.family_account.pk), 80
+        )
+        self.assertEqual(
+            ledger.get_balance(account_id=self.sub_account.pk), 20
+        )
+        self.assertEqual(
+            ledger.get_balance(account_id=self.sub_account.pk, at=as_of), 30
+        )
+        # Only the accounts with new entries get a new checkpoint
+        ledger.create_checkpoints(as_of=timezone.now())
+        self.assertEqual(BalanceCheckpoint.objects.count(), 4)
+
+
+class ReconciliationTests(FamilyAccountMixin, TestCase):
+    sub_account_balance = 30
+
+    def setUp(self):
+        super().setUp()
+        ledger.create_checkpoints(as_of=timezone.now())
+        self.transfer = create_transfer(
+            user_id=self.user_id,
+            source=self.sub_account,
+            destination=self.family_account,
+            amount=10,
+        )
+
+    def reconcile(self, *, repair):
+        return {
+            mismatch["account_id"]: mismatch
+            for mismatch in reconciliation.reconcile(
+                workers=1, chunks=4, repair=repair
+            )
+        }
+
+    def get_balances(self):
+        self.family_account.refresh_from_db()
+        self.sub_account.refresh_from_db()
+        return self.family_account.balance, self.sub_account.balance
+
+    def test_matching_balances_are_not_reported(self):
+        self.assertEqual(self.reconcile(repair=True), {})
+
+    def test_balance_is_repaired_from_the_ledger(self):
+        SubAccount.objects.filter(pk=self.sub_account.pk).update(balance=99)
+        entries = LedgerEntry.objects.count()
+
+        mismatches = self.reconcile(repair=True)
+
+        self.assertEqual(list(mismatches), [str(self.sub_account.pk)])
+        mismatch = mismatches[str(self.sub_account.pk)]
+        self.assertEqual(
+            (
+                mismatch["balance"],
+                mismatch["expected_balance"],
+                mismatch["difference"],
+            ),
+            ("99.00", "20.00", "79.00"),
+        )
+        self.assertTrue(mismatch["ledger_matches_transactions"])
+        self.assertTrue(mismatch["repaired"])
+        self.assertEqual(self.get_balances(), (80, 20))
+        # The ledger is the source of truth, so it is left as it is
+        self.assertEqual(LedgerEntry.objects.count(), entries)
+        self.assertEqual(self.reconcile(repair=False), {})
+
+    def test_ledger_disagreeing_with_transactions_is_not_repaired(self):
+        # The amount of a transaction row is edited behind the ledger's back
+        Transaction.objects.filter(pk=self.transfer.pk).update(amount=25)
+
+        mismatches = self.reconcile(repair=True)
+
+        self.assertEqual(
+            set(mismatches),
+            {str(self.family_account.pk), str(self.sub_account.pk)},
+        )
+        mismatch = mismatches[str(self.sub_account.pk)]
+        self.assertEqual(
+            (
+                mismatch["balance"],
+                mismatch["expected_balance"],
+                mismatch["transactions_balance"],
+            ),
+            ("20.00", "20.00", "5.00"),
+        )
+        self.assertFalse(mismatch["ledger_matches_transactions"])
+        self.assertFalse(mismatch["repaired"])
+        self.assertEqual(self.get_balances(), (80, 20))
+
+        with self.assertRaisesMessage(CommandError, "2 mismatched"):
+            call_command(
+                "reconcile_balances",
+                "--workers=1",
+                "--repair",
+                stdout=StringIO(),
+            )
+
+
+class LegacyReconciliationTests(TestCase):
+    """
+    Accounts that existed before the ledger have transactions the transfer
+    engine never saw, e.g. withdrawals to a bank marked successful without
+    moving funds, and an opening checkpoint of their stored balance.
+    """
+
+    def setUp(self):
+        self.user_id = uuid.uuid4()
+        family_group = FamilyGroup.objects.create(
+            name="Legacy", description="Legacy", owner_id=self.user_id
+        )
+        self.family_account = FamilyAccount.objects.create(
+            name="Legacy",
+            family_group=family_group,
+            created_by=self.user_id,
+        )
+        self.sub_account = SubAccount.objects.create(
+            name="Legacy",
+            family_account=self.family_account,
+            owner_id=self.user_id,
+            created_by=self.user_id,
+        )
+        created_at = timezone.now() - timedelta(days=30)
+        Transaction.objects.bulk_create(
+            Transaction(
+                user_id=self.user_id,
+                amount=amount,
+                transaction_type="transfers",
+                transaction_status=TransactionStatusEnum.SUCCESSFUL,
+                transaction_direction=direction,
+                details="Legacy",
+                created_at=created_at,
+                updated_at=created_at,
+                **accounts,
+            )
+            for amount, direction, accounts in (
+                (
+                    100,
+                    "bank_to_family_account",
+                    {"family_destination_account": self.family_account},
+                ),
+                (
+                    30,
+                    "family_account_to_sub_account",
+                    {
+                        "family_source_account": self.family_account,
+                        "sub_destination_account": self.sub_account,
+                    },
+                ),
+                # Neither of these moved funds before the ledger
+                (
+                    5,
+                    "sub_account_to_bank",
+                    {"sub_source_account": self.sub_account},
+                ),
+                (
+                    20,
+                    "family_account_to_bank",
+                    {"family_source_account": self.family_account},
+                ),
+            )
+        )
+        FamilyAccount.objects.filter(pk=self.family_account.pk).update(
+            balance=70
+        )
+        SubAccount.objects.filter(pk=self.sub_account.pk).update(balance=30)
+        importlib.import_module(
+            "transactions.migrations.0002_ledger"
+        ).create_opening_checkpoints(apps, None)
+        self.sub_account.refresh_from_db()
+
+        create_transfer(
+            user_id=self.user_id,
+            source=self.sub_account,
+            destination=self.family_account,
+            amount=10,
+        )
+
+    def reconcile(self, *, repair):
+        return {
+            mismatch["account_id"]: mismatch
+            for mismatch in reconciliation.reconcile(
+                workers=1, chunks=4, repair=repair
+            )
+        }
+
+    def test_legacy_history_is_not_reported(self):
+        self.assertEqual(self.reconcile(repair=False), {})
+        call_command("reconcile_balances", "--workers=1", stdout=StringIO())
+
+    def test_legacy_account_is_repaired(self):
+        SubAccount.objects.filter(pk=self.sub_account.pk).update(balance=99)
+
+        mismatches = self.reconcile(repair=True)
+
+        self.assertEqual(list(mismatches), [str(self.sub_account.pk)])
+        mismatch = mismatches[str(self.sub_account.pk)]
+        self.assertEqual(
+            (mismatch["expected_balance"], mismatch["transactions_balance"]),
+            ("20.00", "20.00"),
+        )
+        self.assertTrue(mismatch["repaired"])
+        self.sub_account.refresh_from_db()
+        self.assertEqual(self.sub_account.balance, 20)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Checks the plans of the queries the list endpoints run, as the viewsets
+    build them, on a seeded database. It isn't analyzed: without statistics,
+    SQLite plans every table as a large one, where a scan of a table this
+    small would otherwise be cheapest.
+    """
+
+    families = 10
+    transfers_per_family = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_id = uuid.uuid4()
+        cls.member_id = uuid.uuid4()
+        for i in range(cls.families):
+            owner_id = cls.admin_id if i == 0 else uuid.uuid4()
+            family_account = create_family_account(
+                owner_id=owner_id, balance=1000, name=f"Family {i}"
+            )
+            if i == 0:
+                cls.family_account = family_account
+                FamilyMembership.objects.create(
+                    user_id=cls.member_id,
+                    family_group=family_account.family_group,
+                )
+            sub_account = create_sub_account(
+                family_account=family_account,
+                owner_id=cls.member_id if i == 0 else owner_id,
+                balance=100,
+            )
+            for _ in range(cls.transfers_per_family):
+                create_transfer(
+                    user_id=owner_id,
+                    source=family_account,
+                    destination=sub_account,
+                    amount=1,
+                )
+                FundRequest.objects.create(
+                    reason="Lunch",
+                    requested_by=sub_account.owner_id,
+                    family_account=family_account,
+                    source_account=sub_account,
+                    amount=5,
+                )
+        ledger.create_checkpoints(as_of=timezone.now())
+
+    def get_hot_queries(self):
+        users = [
+            User.model_construct(
+                id=user_id,
+                defaultGroup=self.family_account.family_group_id,
+                isAdmin=admin,
+            )
+            for user_id, admin in (
+                (self.member_id, False),
+                (self.admin_id, True),
+            )
+        ]
+        return check_query_plans.get_hot_queries(
+            users=users,
+            account_id=self.family_account.pk,
+            since=timezone.now() - timedelta(hours=1),
+        )
+
+    def test_hot_queries_use_indexes(self):
+        queries = self.get_hot_queries()
+        plans = check_query_plans.explain(queries)
+
+        failures = check_query_plans.get_failures(queries, plans)
+        self.assertEqual(
+            failures, [], "\n\n".join(plans[name] for name in failures)
+        )
+        # The list endpoints are checked for members and administrators
+        self.assertIn("family accounts (member)", queries)
+        self.assertIn("sub accounts (admin)", queries)
+
+    def test_full_scans_and_unexpected_sorts_are_reported(self):
+        by_amount = FundRequest.objects.filter(
+            requested_by=self.member_id
+        ).order_by("amount")
+        queries = {
+            "scan": check_query_plans.HotQuery(
+                Transaction.objects.filter(details="Deposit")
+            ),
+            "sort": check_query_plans.HotQuery(by_amount),
+            "allowed sort": check_query_plans.HotQuery(
+                by_amount, may_sort=True
+            ),
+        }
+        plans = check_query_plans.explain(queries)
+
+        self.assertEqual(
+            check_query_plans.get_failures(queries, plans), ["scan", "sort"]
+        )
+
+    def test_command_checks_the_hot_queries(self):
+        stdout = StringIO()
+        call_command("check_query_plans", stdout=stdout)
+
+        self.assertIn("query plans use an index", stdout.getvalue())
+
+
+class TransactionListQueryTests(
+    FamilyAccountMixin, StubAuthServiceMixin, TestCase
+):
+    """
+    The transaction list takes the same number of queries whatever the size
+    of its page, with page numbers or a cursor.
+    """
+
+    sub_account_balance = 10
+
+    def setUp(self):
+        super().setUp()
+        for _ in range(12):
+            create_transfer(
+                user_id=self.user["id"],
+                source=self.family_account,
+                destination=self.sub_account,
+                amount=1,
+            )
+
+    def test_page_numbers(self):
+        self.assert_list_queries(
+            "/api/v1/transactions/", 2, key="transactions"
+        )
+
+    def test_cursor(self):
+        self.assert_list_queries(
+            "/api/v1/transactions/",
+            1,
+            key="transactions",
+            pagination="cursor",
+        )
+
+
+class TransactionSparseFieldsTests(
+    FamilyAccountMixin, StubAuthServiceMixin, TestCase
+):
+    def setUp(self):
+        super().setUp()
+        self.transaction = create_transfer(
+            user_id=self.user["id"],
+            source=self.family_account,
+            destination=self.sub_account,
+            amount=5,
+        )
+
+    def list(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/v1/transactions/", data=params)
+        self.assertEqual(response.status_code, 200)
+        # The transactions that funded the accounts are listed after it
+        transaction = response.json()["transactions"][0]
+        return transaction, queries[-1]["sql"]
+
+    def test_fields(self):
+        transaction, sql = self.list(fields="id,amount,unknown")
+
+        self.assertEqual(set(transaction), {"id", "amount"})
+        # The columns and joins of the fields left out aren't loaded
+        self.assertNotIn("JOIN", sql)
+        self.assertNotIn('"details"', sql)
+
+    def test_exclude(self):
+        transaction, sql = self.list(
+            exclude="details,sub_destination_account,family_source_account"
+        )
+
+        self.assertNotIn("details", transaction)
+        self.assertNotIn("sub_destination_account", transaction)
+        self.assertNotIn("family_source_account", transaction)
+        self.assertEqual(transaction["amount"], "5.00")
+        self.assertIsNone(transaction["sub_source_account"])
+        self.assertNotIn('"details"', sql)
+        self.assertNotIn('"sub_destination_account_id"', sql)
+        self.assertNotIn('"family_source_account_id"', sql)
+
+    def test_fields_and_exclude(self):
+        transaction, _ = self.list(fields="id,amount,details", exclude="id")
+
+        self.assertEqual(set(transaction), {"amount", "details"})
+
+    def test_writes_render_every_field(self):
+        response = self.client.put(
+            f"/api/v1/transactions/{self.transaction.pk}/?fields=id",
+            data={"details": "Pocket money"},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        transaction = response.json()["transaction"]
+        self.assertEqual(transaction["details"], "Pocket money")
+        self.assertEqual(
+            transaction["sub_destination_account"]["id"],
+            str(self.sub_account.pk),
+        )
+
+
+class TransactionUpdateTests(
+    FamilyAccountMixin, StubAuthServiceMixin, TestCase
+):
+    def setUp(self):
+        super().setUp()
+        self.transaction = create_transfer(
+            user_id=self.user["id"],
+            source=self.family_account,
+            destination=self.sub_account,
+            amount=5,
+        )
+
+    def test_update_cannot_change_the_funds_moved(self):
+        response = self.client.put(
+            f"/api/v1/transactions/{self.transaction.pk}/",
+            data={
+                "amount": "999.00",
+                "transaction_type": "savings",
+                "transaction_direction": "sub_account_to_family_account",
+                "sub_source_account_id": str(self.sub_account.pk),
+                "family_destination_account_id": str(self.family_account.pk),
+                "details": "Pocket money",
+            },
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.details, "Pocket money")
+        self.assertEqual(self.transaction.amount, Decimal(5))
+        self.assertEqual(
+            self.transaction.transaction_direction,
+            "family_account_to_sub_account",
+        )
+        self.assertEqual(self.transaction.sub_source_account_id, None)
+        self.family_account.refresh_from_db()
+        self.sub_account.refresh_from_db()
+        self.assertEqual(self.family_account.balance, Decimal(95))
+        self.assertEqual(self.sub_account.balance, Decimal(5))
+
+    def test_successful_transaction_cannot_be_deleted(self):
+        response = self.client.delete(
+            f"/api/v1/transactions/{self.transaction.pk}/"
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(
+            Transaction.objects.filter(pk=self.transaction.pk).exists()
+        )
+
+
+class BulkTransactionTests(FamilyAccountMixin, StubAuthServiceMixin, TestCase):
+    def make_item(self, amount):
+        return {
+            "amount": str(amount),
+            "transaction_type": "transfers",
+            "transaction_direction": "family_account_to_sub_account",
+            "family_source_account_id": str(self.family_account.pk),
+            "sub_destination_account_id": str(self.sub_account.pk),
+            "details": "Payout",
+        }
+
+    def send(self, amounts, *, mode):
+        return self.client.post(
+            "/api/v1/transactions/bulk/",
+            data={
+                "transactions": [self.make_item(a) for a in amounts],
+                "mode": mode,
+            },
+            content_type="application/json",
+        )
+
+    def assert_balances(self, family_account, sub_account):
+        self.family_account.refresh_from_db()
+        self.sub_account.refresh_from_db()
+        self.assertEqual(
+            (self.family_account.balance, self.sub_account.balance),
+            (family_account, sub_account),
+        )
+
+    def test_all_or_nothing_creates_every_transaction(self):
+        response = self.send([10, 20], mode="all_or_nothing")
+
+        self.assertEqual(response.status_code, 201)
+        self.assert_balances(70, 30)
+        self.assertEqual(
+            Transaction.objects.filter(details="Payout").count(), 2
+        )
+
+    def test_all_or_nothing_creates_nothing_if_one_fails(self):
+        response = self.send([10, 500, 20], mode="all_or_nothing")
+
+        self.assertEqual(response.status_code, 400)
+        results = response.json()["errors"]["results"]
+        self.assertEqual(
+            [result["status"] for result in results],
+            ["skipped", "failed", "skipped"],
+        )
+        self.assert_balances(100, 0)
+        self.assertFalse(Transaction.objects.filter(details="Payout"))
+
+    def test_best_effort_skips_the_failed_transactions(self):
+        response = self.send([10, 500, 20], mode="best_effort")
+
+        self.assertEqual(response.status_code, 207)
+        data = response.json()["transaction"]
+        self.assertEqual((data["created"], data["failed"]), (2, 1))
+        self.assertEqual(
+            [result["status"] for result in data["results"]],
+            ["created", "failed", "created"],
+        )
+        self.assert_balances(70, 30)
+        self.assertEqual(
+            LedgerEntry.objects.filter(
+                transaction__details="Payout"
+            ).count(),
+            4,
+        )
+
+
+@override_settings(TRANSACTIONS_EXPORT_CHUNK_SIZE=2)
+class TransactionExportTests(
+    FamilyAccountMixin, StubAuthServiceMixin, TestCase
+):
+    sub_account_balance = 10
+
+    def setUp(self):
+        super().setUp()
+        for details in ("Lunch", "=HYPERLINK(evil)", "Bus"):
+            create_transfer(
+                user_id=self.user["id"],
+                source=self.family_account,
+                destination=self.sub_account,
+                amount=1,
+                details=details,
+            )
+        # Someone else's transactions are never exported
+        create_family_account(owner_id=uuid.uuid4(), balance=50)
+
+    def export(self, **params):
+        response = self.client.get(
+            "/api/v1/transactions/export/", data=params
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        return response, chunks
+
+    def test_csv_is_streamed_in_chunks(self):
+        response, chunks = self.export(file_format="csv")
+
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn("transactions.csv", response["Content-Disposition"])
+        # Five rows, two per chunk, and the header
+        self.assertEqual(len(chunks), 3)
+        rows = list(csv.reader(io.StringIO("".join(chunks))))
+        self.assertEqual(tuple(rows[0]), export.FIELDS)
+        details = [row[export.FIELDS.index("details")] for row in rows[1:]]
+        self.assertEqual(
+            sorted(details),
+            sorted(
+                ["Deposit", "Allowance", "Lunch", "'=HYPERLINK(evil)", "Bus"]
+            ),
+        )
+
+    def test_ndjson_is_filtered_by_account(self):
+        response, chunks = self.export(
+            file_format="ndjson", account_id=str(self.sub_account.pk)
+        )
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in "".join(chunks).splitlines()]
+        self.assertEqual(
+            {line["id"] for line in lines},
+            {
+                str(pk)
+                for pk in Transaction.objects.filter(
+                    sub_destination_account=self.sub_account
+                ).values_list("pk", flat=True)
+            },
+        )
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(set(lines[0]), set(export.FIELDS))
+        # Values are not escaped for spreadsheets in NDJSON
+        self.assertIn(
+            "=HYPERLINK(evil)", {line["details"] for line in lines}
+        )
+
+    def test_invalid_date_range_is_rejected(self):
+        response = self.client.get(
+            "/api/v1/transactions/export/",
+            data={
+                "created_after": "2026-02-01T00:00:00Z",
+                "created_before": "2026-01-01T00:00:00Z",
+            },
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+class SpendingRollupTests(FamilyAccountMixin, StubAuthServiceMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.family_group = self.family_account.family_group
+        self.member_token, self.member = self.auth_service.add_user()
+        FamilyMembership.objects.create(
+            user_id=self.member["id"], family_group=self.family_group
+        )
+        for amount in (10, 5):
+            create_transfer(
+                user_id=self.user["id"],
+                source=self.family_account,
+                destination=self.sub_account,
+                amount=amount,
+            )
+        create_transfer(
+            user_id=self.member["id"],
+            source=self.sub_account,
+            destination=self.family_account,
+            amount=3,
+        )
+
+    def get_rollups(self):
+        return set(
+            SpendingRollup.objects.values_list(
+                "user_id", "transaction_direction", "total", "count"
+            )
+        )
+
+    def test_transactions_are_added_to_their_rollups(self):
+        owner_id = uuid.UUID(self.user["id"])
+        member_id = uuid.UUID(self.member["id"])
+
+        self.assertEqual(
+            self.get_rollups(),
+            {
+                (owner_id, "bank_to_family_account", Decimal(100), 1),
+                (owner_id, "family_account_to_sub_account", Decimal(15), 2),
+                (member_id, "sub_account_to_family_account", Decimal(3), 1),
+            },
+        )
+        self.assertEqual(
+            set(SpendingRollup.objects.values_list("family_group", "month")),
+            {(self.family_group.pk, rollups.get_month(timezone.now()))},
+        )
+
+    def test_rebuild_matches_the_recorded_rollups(self):
+        recorded = self.get_rollups()
+        SpendingRollup.objects.update(total=0, count=0)
+
+        self.assertEqual(rollups.rebuild(chunk_size=2), 3)
+        self.assertEqual(self.get_rollups(), recorded)
+
+    def get_summary(self, token=None, **params):
+        headers = {"Authorization": token} if token else {}
+        return self.client.get(
+            "/api/v1/spending-rollups/",
+            data={"family_group_id": str(self.family_group.pk), **params},
+            headers=headers,
+        )
+
+    def test_summary_is_read_from_the_rollups(self):
+        response = self.get_summary()
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["spending_rollups"]
+        self.assertEqual(
+            {
+                (row["transaction_direction"], row["total"], row["count"])
+                for row in data
+            },
+            {
+                ("bank_to_family_account", "100.00", 1),
+                ("family_account_to_sub_account", "15.00", 2),
+                ("sub_account_to_family_account", "3.00", 1),
+            },
+        )
+
+    def test_members_only_get_their_own_totals_by_member(self):
+        owner = self.get_summary(by_member="true")
+        member = self.get_summary(self.member_token, by_member="true")
+
+        self.assertEqual(
+            {row["user_id"] for row in owner.json()["spending_rollups"]},
+            {self.user["id"], self.member["id"]},
+        )
+        self.assertEqual(
+            {row["user_id"] for row in member.json()["spending_rollups"]},
+            {self.member["id"]},
+        )
+
+    def test_summary_of_another_family_group_is_not_found(self):
+        self.authenticate()
+
+        self.assertEqual(self.get_summary().status_code, 404)
+
+
+class SettlementTests(FamilyAccountMixin, TestCase):
+    sub_account_balance = 40
+
+    def create_external(self, direction, amount, **accounts):
+        return Transaction.objects.create(
+            user_id=self.user_id,
+            amount=amount,
+            transaction_type="transfers",
+            transaction_direction=direction,
+            details="External",
+            **accounts,
+        )
+
+    def assert_balances(self, family_account, sub_account):
+        self.family_account.refresh_from_db()
+        self.sub_account.refresh_from_db()
+        self.assertEqual(
+            (self.family_account.balance, self.sub_account.balance),
+            (family_account, sub_account),
+        )
+
+    def test_every_deferred_direction_moves_funds(self):
+        self.assertLessEqual(
+            set(settlement.EXTERNAL_DIRECTIONS), set(transfers.TRANSFER_FIELDS)
+        )
+
+    def test_pending_transactions_are_settled_by_the_worker(self):
+        with self.settings(TRANSACTIONS_ASYNC_SETTLEMENT=True):
+            pending = [
+                self.create_external(
+                    "bank_to_sub_account",
+                    5,
+                    sub_destination_account=self.sub_account,
+                ),
+                self.create_external(
+                    "sub_account_to_bank",
+                    10,
+                    sub_source_account=self.sub_account,
+                ),
+                self.create_external(
+                    "family_account_to_bank",
+                    20,
+                    family_source_account=self.family_account,
+                ),
+                self.create_external(
+                    "mobile_wallet_to_family_account",
+                    7,
+                    family_destination_account=self.family_account,
+                ),
+                # More than the sub account will hold
+                self.create_external(
+                    "sub_account_to_bank",
+                    500,
+                    sub_source_account=self.sub_account,
+                ),
+            ]
+        self.assertEqual(
+            {t.transaction_status for t in pending},
+            {TransactionStatusEnum.PENDING},
+        )
+        self.assert_balances(60, 40)
+
+        results = [settlement.settle_batch(batch_size=2) for _ in range(4)]
+
+        self.assertEqual(results, [(2, 0), (2, 0), (0, 1), (0, 0)])
+
+        statuses = dict(
+            Transaction.objects.filter(details="External").values_list(
+                "pk", "transaction_status"
+            )
+        )
+        self.assertEqual(
+            [statuses[t.pk] for t in pending],
+            [TransactionStatusEnum.SUCCESSFUL] * 4
+            + [TransactionStatusEnum.FAILED],
+        )
+        self.assert_balances(60 - 20 + 7, 40 + 5 - 10)
+        self.assertEqual(
+            LedgerEntry.objects.filter(transaction__in=pending[:4]).count(),
+            8,
+        )
+        self.assertFalse(
+            LedgerEntry.objects.filter(transaction=pending[4]).exists()
+        )
+        self.assertEqual(
+            ledger.get_balance(account_id=self.sub_account.pk), 35
+        )
+
+
+@skipUnlessDBFeature("has_select_for_update_skip_locked")
+@override_settings(TRANSACTIONS_ASYNC_SETTLEMENT=True)
+class SettlementQueueTests(TransactionTestCase):
+    """Runs on databases with row locks, e.g. PostgreSQL, not SQLite."""
+
+    def test_workers_claim_different_transactions(self):
+        user_id = uuid.uuid4()
+        with self.settings(TRANSACTIONS_ASYNC_SETTLEMENT=False):
+            family_account = create_family_account(
+                owner_id=user_id, balance=100
+            )
+        for _ in range(4):
+            Transaction.objects.create(
+                user_id=user_id,
+                amount=1,
+                transaction_type="transfers",
+                transaction_direction="family_account_to_bank",
+                family_source_account=family_account,
+                details="External",
+            )
+        claimed = threading.Event()
+        release = threading.Event()
+        first = []
+
+        def claim_and_hold():
+            try:
+                with transaction.atomic():
+                    first.extend(settlement.claim(batch_size=2))
+                    claimed.set()
+                    release.wait(timeout=10)
+            finally:
+                connection.close()
+
+        worker = threading.Thread(target=claim_and_hold)
+        worker.start()
+        try:
+            self.assertTrue(claimed.wait(timeout=10))
+            with transaction.atomic():
+                second = settlement.claim(batch_size=4)
+        finally:
+            release.set()
+            worker.join()
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 2)
+        self.assertFalse({t.pk for t in first} & {t.pk for t in second})
+
+
+@override_settings(TRANSFER_MAX_RETRIES=100)
+class TransferStressTests(TransactionTestCase):
+    """
+    Runs transfers between the same accounts from many threads at once, in
+    both directions. On PostgreSQL and MySQL they contend for row locks; on
+    SQLite, which locks tables, most of them are aborted and retried. A
+    transfer that still fails fails as a whole, so the balances must match
+    the transfers that were saved.
+    """
+
+    threads = 8
+    transfers_per_thread = 25
+    initial_balance = Decimal(1000)
+
+    def test_concurrent_transfers_lose_no_updates(self):
+        user_id = uuid.uuid4()
+        family_account = create_family_account(
+            owner_id=user_id, balance=3 * self.initial_balance
+        )
+        sub_accounts = [
+            create_sub_account(
+                family_account=family_account,
+                owner_id=user_id,
+                balance=self.initial_balance,
+                name=f"Sub {i}",
+            )
+            for i in range(2)
+        ]
+        routes = [
+            (sub_accounts[0], sub_accounts[1]),
+            (sub_accounts[1], sub_accounts[0]),
+            (family_account, sub_accounts[0]),
+            (sub_accounts[1], family_account),
+        ]
+        barrier = threading.Barrier(self.threads)
+        aborted = []
+        errors = []
+
+        def transfer(thread):
+            try:
+                barrier.wait()
+                for i in range(self.transfers_per_thread):
+                    source, destination = routes[(thread + i) % len(routes)]
+                    try:
+                        create_transfer(
+                            user_id=user_id,
+                            source=source,
+                            destination=destination,
+                            amount=Decimal(thread + 1),
+                        )
+                    except OperationalError:
+                        aborted.append(thread)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=transfer, args=(thread,))
+            for thread in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        # Every transfer that didn't raise was saved. SQLite can also raise
+        # once a transfer is committed, when its accounts are reloaded.
+        saved = Transaction.objects.filter(details="Transfer")
+        self.assertGreaterEqual(
+            saved.count(),
+            self.threads * self.transfers_per_thread - len(aborted),
+        )
+        self.assertTrue(
+            all(
+                t.transaction_status == TransactionStatusEnum.SUCCESSFUL
+                for t in saved
+            )
+        )
+        self.assertEqual(
+            LedgerEntry.objects.filter(transaction__in=saved).count(),
+            2 * saved.count(),
+        )
+
+        expected = {
+            account.pk: self.initial_balance
+            for account in [family_account, *sub_accounts]
+        }
+        for t in saved:
+            source = t.sub_source_account_id or t.family_source_account_id
+            destination = (
+                t.sub_destination_account_id or t.family_destination_account_id
+            )
+            expected[source] -= t.amount
+            expected[destination] += t.amount
+
+        balances = {
+            family_account.pk: FamilyAccount.objects.get(
+                pk=family_account.pk
+            ).balance,
+            **dict(SubAccount.objects.values_list("pk", "balance")),
+        }
+        self.assertEqual(balances, expected)
+        self.assertEqual(sum(balances.values()), 3 * self.initial_balance)
@@ -0,0 +1,244 @@
+"""
+This module defines the transfer engine, which moves the funds of a
+transaction between accounts.
+
+Every transfer runs in a single database transaction. The accounts it
+touches are locked with `SELECT ... FOR UPDATE` in a fixed order (by table,
+then by primary key), so two transfers between the same accounts in
+opposite directions wait for each other instead of deadlocking. The source
+account is debited with a single conditional `UPDATE`, which only succeeds
+if the balance covers the amount, and the destination account is credited
+with an `F()` expression, so no balance is ever read into Python and
+written back. A debit and a credit entry are appended to the ledger (see
+`transactions.ledger`), and the aggregates of the family accounts involved
+are updated (see `accounts.aggregates`), in the same database transaction.
+Transfers aborted by a serialization failure or a deadlock are retried up
+to `TRANSFER_MAX_RETRIES` times.
+
+Example usage:
+
+```python
+
+from transactions import transfers
+
+# Move the funds and insert the transaction in the same database transaction
+transfers.execute(transaction, save=lambda: transaction.save_base())
+```
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from collections import defaultdict
+from decimal import Decimal
+from typing import Callable, Iterable, NamedTuple, TypeVar
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import (
+    OperationalError,
+    connection,
+    models,
+    transaction as db_transaction,
+)
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+import transactions.models as md
+from accounts import aggregates, models as accounts_models
+from transactions import ledger, rollups
+
+# The source and destination account fields of each transaction direction
+# (see `TransactionDirectionEnum`) that moves funds. The bank or mobile
+# wallet side of external transfers is not held in an account.
+TRANSFER_FIELDS = {
+    "sub_account_to_sub_account": (
+        "sub_source_account",
+        "sub_destination_account",
+    ),
+    "sub_account_to_family_account": (
+        "sub_source_account",
+        "family_destination_account",
+    ),
+    "family_account_to_sub_account": (
+        "family_source_account",
+        "sub_destination_account",
+    ),
+    "family_account_to_family_account": (
+        "family_source_account",
+        "family_destination_account",
+    ),
+    "bank_to_sub_account": (None, "sub_destination_account"),
+    "sub_account_to_bank": ("sub_source_account", None),
+    "bank_to_family_account": (None, "family_destination_account"),
+    "family_account_to_bank": ("family_source_account", None),
+    "mobile_wallet_to_family_account": (None, "family_destination_account"),
+}
+
+INSUFFICIENT_BALANCE_ERRORS = {
+    accounts_models.SubAccount: _("Not enough balance in source sub account."),
+    accounts_models.FamilyAccount: _(
+        "Not enough balance in source family account."
+    ),
+}
+
+# SQLSTATE codes (PostgreSQL) and error numbers (MySQL) of transactions
+# aborted by a serialization failure, a deadlock or a lock wait timeout
+RETRYABLE_SQLSTATES = ("40001", "40P01")
+RETRYABLE_MYSQL_ERRORS = (1205, 1213)
+# SQLite locks the whole database (or, with a shared cache, the tables a
+# transaction reads) instead of rows
+RETRYABLE_SQLITE_ERRORS = ("database is locked", "database table is locked")
+
+RETRY_BACKOFF = 0.05
+
+T = TypeVar("T")
+
+
+class Entry(NamedTuple):
+    """A change of the balance of an account."""
+
+    model: type[models.Model]
+    pk: object
+    amount: Decimal
+
+    @property
+    def lock_key(self) -> tuple[str, str]:
+        """Return the key accounts are locked in the order of."""
+        return self.model._meta.db_table, str(self.pk)
+
+
+def get_entries(transaction: md.Transaction) -> list[Entry]:
+    """
+    Return the balance changes of a transaction in lock order. Debits have
+    a negative amount.
+    """
+    source, destination = TRANSFER_FIELDS.get(
+        transaction.transaction_direction, (None, None)
+    )
+    entries = []
+    for field, amount in (
+        (source, -transaction.amount),
+        (destination, transaction.amount),
+    ):
+        if field is None:
+            continue
+        model = md.Transaction._meta.get_field(field).related_model
+        pk = getattr(transaction, f"{field}_id")
+        entries.append(Entry(model=model, pk=pk, amount=Decimal(amount)))
+
+    return sorted(entries, key=lambda entry: entry.lock_key)
+
+
+def lock(entries: Iterable[Entry]) -> dict[tuple[type, object], Decimal]:
+    """
+    Lock the accounts of many entries at once, in lock order. Must run
+    inside a database transaction. Returns the balances of the accounts
+    that exist, keyed by model and primary key.
+    """
+    pks = defaultdict(set)
+    for entry in entries:
+        pks[entry.model].add(entry.pk)
+
+    balances = {}
+    for model in sorted(pks, key=lambda model: model._meta.db_table):
+        locked = (
+            model.objects.select_for_update()
+            .filter(pk__in=pks[model])
+            .order_by("pk")
+            .values_list("pk", "balance")
+        )
+        balances.update(((model, pk), balance) for pk, balance in locked)
+    return balances
+
+
+def apply(transaction: md.Transaction) -> None:
+    """
+    Move the funds of a transaction and write its ledger entries. Must run
+    inside a database transaction; raises `ValidationError` if the source
+    account does not have enough balance.
+    """
+    if transaction.amount <= 0:
+        raise ValidationError(_("Amount must be greater than zero."))
+
+    entries = get_entries(transaction)
+    for entry in entries:
+        locked = entry.model.objects.select_for_update().filter(pk=entry.pk)
+        if not locked.values_list("pk", flat=True):
+            raise ValidationError(_("Account does not exist."))
+
+    now = timezone.now()
+    for entry in entries:
+        accounts = entry.model.objects.filter(pk=entry.pk)
+        if entry.amount < 0:
+            accounts = accounts.filter(balance__gte=-entry.amount)
+        if not accounts.update(
+            balance=F("balance") + entry.amount, updated_at=now
+        ):
+            raise ValidationError(INSUFFICIENT_BALANCE_ERRORS[entry.model])
+
+    aggregates.record(entries, at=now)
+    ledger.record(transaction, entries, created_at=now)
+
+
+def is_retryable(error: OperationalError) -> bool:
+    """Return whether a database error aborted a transaction to be retried."""
+    cause = error.__cause__
+    if getattr(cause, "pgcode", None) in RETRYABLE_SQLSTATES:
+        return True
+    args = getattr(cause, "args", None)
+    if args and args[0] in RETRYABLE_MYSQL_ERRORS:
+        return True
+    return any(message in str(error) for message in RETRYABLE_SQLITE_ERRORS)
+
+
+def run_with_retries(func: Callable[[], T]) -> T:
+    """
+    Run `func` in a database transaction, running it again when the
+    database aborts the transaction to be retried.
+
+    Retrying is only possible when no database transaction is open yet;
+    inside one, the error is raised to the caller.
+    """
+    attempts = settings.TRANSFER_MAX_RETRIES + 1
+    for attempt in range(attempts):
+        try:
+            with db_transaction.atomic():
+                return func()
+        except OperationalError as e:
+            if (
+                attempt == attempts - 1
+                or connection.in_atomic_block
+                or not is_retryable(e)
+            ):
+                raise
+            time.sleep(RETRY_BACKOFF * 2**attempt * random.random())
+
+
+def execute(transaction: md.Transaction, *, save: Callable[[], None]) -> None:
+    """
+    Move the funds of a transaction, save it with `save` and add it to its
+    spending rollups, atomically, retrying the transfer when the database
+    aborts it.
+    """
+
+    def transfer():
+        apply(transaction)
+        save()
+        rollups.record([transaction.pk])
+
+    run_with_retries(transfer)
+    refresh_accounts(transaction)
+
+
+def refresh_accounts(transaction: md.Transaction) -> None:
+    """Reload the balances of the accounts cached on a transaction."""
+    for field in TRANSFER_FIELDS.get(transaction.transaction_direction, ()):
+        if field and md.Transaction._meta.get_field(field).is_cached(
+            transaction
+        ):
+            account = getattr(transaction, field)
+            if account is not None:
+                account.refresh_from_db(fields=["balance", "updated_at"])
@@ -8,5 +8,10 @@ router.register(
     viewset=views.TransactionViewSet,
     basename="transaction",
 )
+router.register(
+    prefix="spending-rollups",
+    viewset=views.SpendingRollupViewSet,
+    basename="spending-rollups",
+)
 
 urlpatterns = router.urls
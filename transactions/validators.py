@@ -7,6 +7,10 @@ import transactions.models as md
 
 
 class ValidateTransactionData:
+    """
+    Validates the accounts set on a transaction for its direction. Funds
+    are moved by the transfer engine in `transactions.transfers`.
+    """
 
     def __init__(self, transaction: md.Transaction) -> None:
         # verify that fund request id is set for fund request transactions
@@ -26,8 +30,17 @@ class ValidateTransactionData:
                 self._validate_family_account_to_sub_account(transaction)
             case md.TransactionDirectionEnum.FAMILY_ACCOUNT_TO_FAMILY_ACCOUNT:
                 self._validate_family_account_to_family_account(transaction)
-            case md.TransactionDirectionEnum.BANK_TO_FAMILY_ACCOUNT:
+            case md.TransactionDirectionEnum.BANK_TO_SUB_ACCOUNT:
+                self._validate_bank_to_sub_account(transaction)
+            case md.TransactionDirectionEnum.SUB_ACCOUNT_TO_BANK:
+                self._validate_sub_account_to_bank(transaction)
+            case (
+                md.TransactionDirectionEnum.BANK_TO_FAMILY_ACCOUNT
+                | md.TransactionDirectionEnum.MOBILE_WALLET_TO_FAMILY_ACCOUNT
+            ):
                 self._validate_bank_to_family_account(transaction)
+            case md.TransactionDirectionEnum.FAMILY_ACCOUNT_TO_BANK:
+                self._validate_family_account_to_bank(transaction)
 
     @staticmethod
     def _validate_fund_request_id(transaction: md.Transaction) -> None:
@@ -48,10 +61,6 @@ class ValidateTransactionData:
         transaction: md.Transaction,
     ) -> None:
         """Validate sub_account_to_sub_account transaction."""
-        if transaction.sub_destination_account.balance < transaction.amount:
-            raise ValidationError(
-                _("Not enough balance in source sub account.")
-            )
         if not (
             transaction.sub_source_account
             and transaction.sub_destination_account
@@ -63,7 +72,7 @@ class ValidateTransactionData:
                 )
             )
         if (
-            transaction.sub_source_account
+            transaction.sub_source_account_id
             == transaction.sub_destination_account_id
         ):
             raise ValidationError(
@@ -84,13 +93,6 @@ class ValidateTransactionData:
                 )
             )
 
-        # update the balance in the database once everything checks out well
-        transaction.sub_source_account.balance -= transaction.amount
-        transaction.sub_destination_account.balance += transaction.amount
-
-        transaction.sub_source_account.save()
-        transaction.sub_destination_account.save()
-
     @staticmethod
     def _validate_sub_account_to_family_account(
         transaction: md.Transaction,
@@ -107,12 +109,6 @@ class ValidateTransactionData:
                 )
             )
 
-        transaction.sub_source_account.balance -= transaction.amount
-        transaction.family_destination_account.balance += transaction.amount
-
-        transaction.sub_source_account.save()
-        transaction.family_destination_account.save()
-
     @staticmethod
     def _validate_family_account_to_sub_account(
         transaction: md.Transaction,
@@ -138,26 +134,12 @@ class ValidateTransactionData:
                     "cannot be the same."
                 )
             )
-        if transaction.family_source_account.balance < transaction.amount:
-            raise ValidationError(
-                _("Not enough balance in source family account.")
-            )
-
-        transaction.family_source_account.balance -= transaction.amount
-        transaction.sub_destination_account.balance += transaction.amount
-
-        transaction.family_source_account.save()
-        transaction.sub_destination_account.save()
 
     @staticmethod
     def _validate_family_account_to_family_account(
         transaction: md.Transaction,
     ) -> None:
         """Validate family_account_to_family_account transaction."""
-        if transaction.family_source_account.balance < transaction.amount:
-            raise ValidationError(
-                _("Not enough balance in source family account.")
-            )
         if not (
             transaction.family_source_account
             and transaction.family_destination_account
@@ -190,12 +172,6 @@ class ValidateTransactionData:
                 )
             )
 
-        transaction.family_source_account.balance -= transaction.amount
-        transaction.family_destination_account.balance += transaction.amount
-
-        transaction.family_source_account.save()
-        transaction.family_destination_account.save()
-
     @staticmethod
     def _validate_bank_to_family_account(
         transaction: md.Transaction
@@ -206,5 +182,22 @@ class ValidateTransactionData:
                 _("Destination family account must be set.")
             )
 
-        transaction.family_destination_account.balance += transaction.amount
-        transaction.family_destination_account.save()
+    @staticmethod
+    def _validate_bank_to_sub_account(transaction: md.Transaction) -> None:
+        """Validate bank_to_sub_account transaction."""
+        if not transaction.sub_destination_account_id:
+            raise ValidationError(_("Destination sub account must be set."))
+
+    @staticmethod
+    def _validate_sub_account_to_bank(transaction: md.Transaction) -> None:
+        """Validate sub_account_to_bank transaction."""
+        if not transaction.sub_source_account_id:
+            raise ValidationError(_("Source sub account must be set."))
+
+    @staticmethod
+    def _validate_family_account_to_bank(
+        transaction: md.Transaction
+    ) -> None:
+        """Validate family_account_to_bank transaction."""
+        if not transaction.family_source_account_id:
+            raise ValidationError(_("Source family account must be set."))
@@ -2,21 +2,34 @@
 This module defines all the views (endpoints) for working with transactions.
 """
 
+from django.db.models import Q, Sum
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import (
+    OpenApiRequest,
     OpenApiResponse,
     extend_schema,
 )
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
-from famtrust import permissions
+from famtrust import permissions, utils
+from family_memberships.models import FamilyGroup
+from famtrust.query_plans import QueryPlanMixin
+from idempotency.mixins import IdempotentViewMixin
 from transactions import (
+    bulk,
+    export,
     models,
     serializers,
 )
 
 
 @extend_schema(tags=["Transactions"])
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(
+    IdempotentViewMixin, QueryPlanMixin, viewsets.ModelViewSet
+):
     """A collection of endpoints for Transaction operations."""
 
     http_method_names = ("get", "post", "put", "delete")
@@ -47,8 +60,16 @@ class TransactionViewSet(viewsets.ModelViewSet):
         purpose of this endpoint is to create new transactions.
 
         Everyone who is authenticated can create a new transaction.
+        Transactions left pending for a settlement worker are answered with
+        `202 Accepted`.
         """
-        return super().create(request, *args, **kwargs)
+        response = super().create(request, *args, **kwargs)
+        if (
+            response.data.get("transaction_status")
+            == models.TransactionStatusEnum.PENDING
+        ):
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
 
     @extend_schema(
         summary="Retrieve a list of transactions",
@@ -98,6 +119,8 @@ class TransactionViewSet(viewsets.ModelViewSet):
         purpose of this endpoint is to update an existing transaction.
 
         Everyone who is authenticated can update an existing transaction.
+        Only its details can be changed: the amount, type, direction,
+        accounts and fund request of a transaction are read-only.
         """
         return super().update(request, *args, **kwargs)
 
@@ -114,6 +137,197 @@ class TransactionViewSet(viewsets.ModelViewSet):
         This endpoint is only accessible to authenticated users. The sole
         purpose of this endpoint is to delete an existing transaction.
 
-        Everyone who is authenticated can delete an existing transaction.
+        Everyone who is authenticated can delete an existing transaction,
+        unless it is successful: its funds have moved, so it stays on
+        record.
         """
         return super().destroy(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        if (
+            instance.transaction_status
+            == models.TransactionStatusEnum.SUCCESSFUL
+        ):
+            raise utils.HTTPException(
+                detail=_("Successful transactions cannot be deleted"),
+                code="conflict",
+                status_code=status.HTTP_409_CONFLICT,
+            )
+        super().perform_destroy(instance)
+
+    @extend_schema(
+        summary="Create transactions in bulk",
+        request=OpenApiRequest(
+            request=serializers.BulkTransactionSerializer,
+        ),
+        responses={
+            status.HTTP_201_CREATED: OpenApiResponse(
+                response=serializers.BulkTransactionResponseSerializer,
+                description="All the transactions were created",
+            ),
+            status.HTTP_207_MULTI_STATUS: OpenApiResponse(
+                response=serializers.BulkTransactionResponseSerializer,
+                description="Some of the transactions were created",
+            ),
+            status.HTTP_400_BAD_REQUEST: OpenApiResponse(
+                response=serializers.BulkTransactionResponseSerializer,
+                description="None of the transactions were created",
+            ),
+        },
+    )
+    @action(methods=["POST"], detail=False, url_path="bulk")
+    def bulk(self, request, *args, **kwargs):
+        """Create transactions in bulk.
+
+        This endpoint is only accessible to authenticated users. It accepts
+        up to `TRANSACTIONS_BULK_MAX_SIZE` transactions, e.g. for family
+        payouts or bank statement imports, and returns the result of every
+        transaction in the order they were sent.
+
+        In `all_or_nothing` mode (the default), either every transaction is
+        created or none of them is. In `best_effort` mode, every transaction
+        that can be created is created.
+        """
+        serializer = serializers.BulkTransactionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk.ingest(
+            serializer.validated_data["transactions"],
+            user_id=request.ft_user.id,
+            best_effort=serializer.validated_data["mode"] == "best_effort",
+        )
+
+        created = sum(result["status"] == bulk.CREATED for result in results)
+        data = serializers.BulkTransactionResponseSerializer(
+            {
+                "created": created,
+                "failed": len(results) - created,
+                "results": results,
+            }
+        ).data
+        if created == len(results):
+            return Response({"data": data}, status=status.HTTP_201_CREATED)
+        if created:
+            return Response(
+                {"data": data}, status=status.HTTP_207_MULTI_STATUS
+            )
+        return Response(data, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(
+        summary="Export transactions",
+        parameters=[serializers.TransactionExportSerializer],
+        responses={
+            (status.HTTP_200_OK, "text/csv"): OpenApiResponse(
+                response=OpenApiTypes.STR,
+                description="Transactions exported as CSV",
+            ),
+            (status.HTTP_200_OK, "application/x-ndjson"): OpenApiResponse(
+                response=OpenApiTypes.STR,
+                description="Transactions exported as NDJSON",
+            ),
+        },
+    )
+    @action(methods=["GET"], detail=False, url_path="export")
+    def export(self, request, *args, **kwargs):
+        """Export transactions.
+
+        This endpoint is only accessible to authenticated users. It streams
+        the full transaction history of the user as a CSV or NDJSON file,
+        optionally limited to a date range or to the transactions from or
+        to an account.
+        """
+        serializer = serializers.TransactionExportSerializer(
+            data=request.query_params
+        )
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if "created_after" in params:
+            queryset = queryset.filter(created_at__gte=params["created_after"])
+        if "created_before" in params:
+            queryset = queryset.filter(created_at__lt=params["created_before"])
+        if "account_id" in params:
+            account_id = params["account_id"]
+            queryset = queryset.filter(
+                Q(sub_source_account_id=account_id)
+                | Q(sub_destination_account_id=account_id)
+                | Q(family_source_account_id=account_id)
+                | Q(family_destination_account_id=account_id)
+            )
+        return export.get_response(
+            queryset, file_format=params["file_format"]
+        )
+
+
+@extend_schema(tags=["Transactions"])
+class SpendingRollupViewSet(viewsets.GenericViewSet):
+    """A collection of endpoints for the spending summaries of families."""
+
+    serializer_class = serializers.SpendingRollupSerializer
+    permission_classes = [permissions.IsAuthenticatedWithUserService]
+    filter_backends = ()
+    pagination_class = None
+
+    def get_queryset(self):
+        """
+        Return the monthly totals of a family group the current user owns or
+        belongs to, from its spending rollups.
+        """
+        user = self.request.ft_user
+        params = serializers.SpendingRollupQuerySerializer(
+            data=self.request.query_params
+        )
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+
+        family_group = FamilyGroup.objects.filter(
+            Q(owner_id=user.id) | Q(members__user_id=user.id),
+            pk=params["family_group_id"],
+        ).first()
+        if family_group is None:
+            raise utils.HTTPException(
+                detail=_("Family group not found"),
+                code="not_found",
+                status_code=status.HTTP_404_NOT_FOUND,
+            )
+
+        queryset = models.SpendingRollup.objects.filter(
+            family_group=family_group
+        )
+        if "month_from" in params:
+            queryset = queryset.filter(
+                month__gte=params["month_from"].replace(day=1)
+            )
+        if "month_to" in params:
+            queryset = queryset.filter(month__lte=params["month_to"])
+
+        fields = ["month", "transaction_type", "transaction_direction"]
+        if params["by_member"]:
+            fields.append("user_id")
+            if family_group.owner_id != user.id:
+                queryset = queryset.filter(user_id=user.id)
+        return (
+            queryset.values(*fields)
+            .annotate(total=Sum("total"), count=Sum("count"))
+            .order_by("-month", *fields[1:])
+        )
+
+    @extend_schema(
+        summary="Retrieve the monthly spending of a family group",
+        parameters=[serializers.SpendingRollupQuerySerializer],
+        responses=OpenApiResponse(
+            response=serializers.SpendingRollupSerializer(many=True),
+            description="Spending summary retrieved successfully",
+        ),
+    )
+    def list(self, request, *args, **kwargs):
+        """Retrieve the monthly spending of a family group.
+
+        This endpoint is only accessible to authenticated users who own or
+        belong to the family group. It returns the total amount and number
+        of the successful transactions made from or to the accounts of the
+        family group, by month, transaction type and direction, and
+        optionally by member.
+        """
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return Response({"data": serializer.data})